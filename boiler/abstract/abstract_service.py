@@ -1,16 +1,69 @@
 import logging
-from flask import current_app
-from boiler.feature.orm import db
+from copy import copy
+from flask import current_app, abort
+from sqlalchemy import inspect, tuple_, func, Integer
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.util import identity_key
+from boiler.feature.orm import db, use_shard
+from boiler.abstract.unit_of_work import in_unit_of_work, commit_session
+
+
+# collection base queries by service and loading profile
+query_templates = dict()
+
+
+def chunked(items, size):
+    """
+    Chunked
+    Splits a sequence into lists of at most given size.
+
+    :param items:           iterable, items to split
+    :param size:            int, chunk size
+    :return:                generator of lists
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
 class AbstractService:
     """
     Abstract service
     Base class for services that encapsulates common model operations.
     Extend your concrete services from this class and define __model__
+
+    Optionally set __entity_cache__ to a boiler.cache.EntityCache instance
+    to serve get, get_or_404 and get_multiple from cache. Cached entities
+    are invalidated when the service commits changes to them.
+
+    Services can declare named loading profiles that reads of a service
+    returned by with_profile() apply. A profile is either a dictionary of
+    strategies to attribute names (dotted for nested relationships), or a
+    list of sqlalchemy loader options:
+
+        __loading_profiles__ = dict(
+            api=dict(selectin=['roles', 'posts.tags'], joined=['profile']),
+            list=dict(load_only=['id', 'email']),
+        )
+
+        service.with_profile('api').find(active=True)
+
+    Services of models marked with __sharded__ work within a shard:
+
+        with service.shard(tenant_id):
+            service.find(tenant_id=tenant_id)
     """
     __model__ = None
     __create_validator__ = None
     __persist_validator__ = None
+    __entity_cache__ = None
+    __loading_profiles__ = dict()
+    loading_profile = None
 
     def log(self, message, level=None):
         """ Write a message to log """
@@ -34,15 +87,73 @@ class AbstractService:
         err = 'Object {} is not of type {}'
         raise ValueError(err.format(model, self.__model__))
 
+    def are_instances(self, models):
+        """
+        Are instances?
+        Checks all provided objects are instances of this service's model
+        in a single pass before any of them is persisted.
+
+        :param models:          list, objects to check
+        :return:                bool
+        """
+        for model in models:
+            if not isinstance(model, self.__model__):
+                return self.is_instance(model)
+
+        return True
+
     def commit(self):
         """
         Commit
         Commits orm transaction. Used mostly for bulk operations when
-        flush is of to commit multiple items at once.
+        flush is of to commit multiple items at once. Notifies caches
+        about changes tracked since last commit. Within a unit of work
+        only flushes the session, leaving commit to the unit of work.
+
+        :return:                None
+        """
+        if in_unit_of_work():
+            db.session.flush()
+            return
+
+        commit_session(self)
+
+    def with_profile(self, profile):
+        """
+        With profile
+        Returns a copy of service that applies a loading profile to find,
+        first, get_multiple and collection. Profile is not passed along with
+        filters, so it never shadows a column of the same name.
+
+        :param profile:         str, loading profile name
+        :return:                AbstractService
+        """
+        self.loading_options(profile)
+        service = copy(self)
+        service.loading_profile = profile
+        return service
 
+    def shard(self, shard_key):
+        """
+        Shard
+        Returns context manager that routes sharded models to the shard of
+        given key (see boiler.feature.orm.use_shard).
+
+        :param shard_key:       int or str, shard key (like tenant id)
+        :return:                context manager
+        """
+        return use_shard(shard_key)
+
+    def track_change(self, model):
+        """
+        Track change
+        Remembers a changed model (instance or class for bulk changes) to
+        notify caches once transaction is committed.
+
+        :param model:           object, model instance or class
         :return:                None
         """
-        db.session.commit()
+        db.session.info.setdefault('boiler_changes', []).append(model)
 
     def new(self, **kwargs):
         """
@@ -79,8 +190,9 @@ class AbstractService:
         """
         self.is_instance(model)
         db.session.add(model)
+        self.track_change(model)
         if commit:
-            db.session.commit()
+            self.commit()
 
         return model
 
@@ -96,11 +208,449 @@ class AbstractService:
         """
         self.is_instance(model)
         db.session.delete(model)
+        self.track_change(model)
         if commit:
-            db.session.commit()
+            self.commit()
 
         return model
 
+    def create_many(self, items, chunk_size=1000, commit=True):
+        """
+        Create many
+        Instantiates models from a list of dictionaries and persists them
+        with executemany-style bulk inserts, one statement and one commit
+        per chunk. Created models are not added to session. If the backend
+        can return primary keys from bulk inserts, returns a list of primary
+        keys, otherwise returns None.
+
+        :param items:           list, dictionaries of data for each model
+        :param chunk_size:      int, models per insert statement
+        :param commit:          bool, commit after each chunk?
+        :return:                list or None, primary keys
+        """
+        mapper = inspect(self.__model__)
+        dialect = db.session().get_bind(mapper=mapper).dialect
+        return_ids = dialect.insert_executemany_returning
+        ids = [] if return_ids else None
+        for chunk in chunked(items, chunk_size):
+            models = [self.new(**data) for data in chunk]
+            for rows in self._insert_rows(mapper, models):
+                insert = mapper.local_table.insert()
+                if return_ids:
+                    insert = insert.returning(*mapper.primary_key)
+                result = db.session.execute(
+                    insert,
+                    rows,
+                    bind_arguments=dict(mapper=mapper)
+                )
+                if return_ids:
+                    ids.extend(self._result_ids(result))
+
+            self.track_change(self.__model__)
+            if commit:
+                self.commit()
+
+        return ids
+
+    def save_many(self, models, chunk_size=1000, commit=True):
+        """
+        Save many
+        Puts models into unit of work in chunks, flushing and optionally
+        committing once per chunk. Model types are validated upfront, so
+        nothing is persisted if any of them is invalid.
+
+        :param models:          list, models to persist
+        :param chunk_size:      int, models per flush
+        :param commit:          bool, commit after each chunk?
+        :return:                list, saved models
+        """
+        models = list(models)
+        self.are_instances(models)
+        for chunk in chunked(models, chunk_size):
+            db.session.add_all(chunk)
+            for model in chunk:
+                self.track_change(model)
+            if commit:
+                self.commit()
+            else:
+                db.session.flush()
+
+        return models
+
+    def delete_many(self, models, chunk_size=1000, commit=True):
+        """
+        Delete many
+        Puts models for deletion into unit of work in chunks, flushing and
+        optionally committing once per chunk. Model types are validated
+        upfront, so nothing is deleted if any of them is invalid.
+
+        :param models:          list, models to delete
+        :param chunk_size:      int, models per flush
+        :param commit:          bool, commit after each chunk?
+        :return:                list, deleted models
+        """
+        models = list(models)
+        self.are_instances(models)
+        for chunk in chunked(models, chunk_size):
+            for model in chunk:
+                db.session.delete(model)
+                self.track_change(model)
+            if commit:
+                self.commit()
+            else:
+                db.session.flush()
+
+        return models
+
+    def upsert(self, data, conflict_columns=None, update_columns=None,
+               commit=True):
+        """
+        Upsert
+        Inserts a row of provided data, or updates existing row if it
+        conflicts on given columns, in a single statement.
+
+        :param data:            dict, column values of the row
+        :param conflict_columns: list, unique columns, primary key by default
+        :param update_columns:  list, columns to update on conflict
+        :param commit:          bool, commit transaction?
+        :return:                int, number of affected rows
+        """
+        return self.upsert_many(
+            [data],
+            conflict_columns=conflict_columns,
+            update_columns=update_columns,
+            commit=commit
+        )
+
+    def upsert_many(self, items, conflict_columns=None, update_columns=None,
+                    chunk_size=1000, commit=True):
+        """
+        Upsert many
+        Inserts rows from a list of dictionaries, updating rows that
+        conflict on given columns. Compiles to native upsert of the
+        database (ON CONFLICT on SQLite and PostgreSQL, ON DUPLICATE KEY on
+        MySQL) with one executemany statement per chunk. Conflict columns
+        must have a unique constraint, MySQL ignores them and checks all
+        unique keys instead. By default all provided columns other than
+        conflict ones get updated.
+
+        Dictionaries are keyed by column attribute or column names and are
+        written as they are, without creating models, so model constructors
+        and setters do not apply. Rows are written with core statements, so
+        models already loaded into session are not refreshed.
+
+        :param items:           list, dictionaries of column values
+        :param conflict_columns: list, unique columns, primary key by default
+        :param update_columns:  list, columns to update on conflict
+        :param chunk_size:      int, models per statement
+        :param commit:          bool, commit after each chunk?
+        :return:                int, number of affected rows
+        """
+        mapper = inspect(self.__model__)
+        dialect = db.session().get_bind(mapper=mapper).dialect.name
+        if conflict_columns is None:
+            conflict = [column.key for column in mapper.primary_key]
+        else:
+            conflict = self._column_keys(mapper, conflict_columns)
+        if update_columns is not None:
+            update_columns = self._column_keys(mapper, update_columns)
+
+        affected = 0
+        for chunk in chunked(items, chunk_size):
+            for rows in self._upsert_rows(mapper, chunk):
+                update = update_columns
+                if update is None:
+                    update = [key for key in rows[0] if key not in conflict]
+                statement = self._upsert_statement(
+                    dialect,
+                    mapper.local_table,
+                    conflict,
+                    update
+                )
+                result = db.session.execute(
+                    statement,
+                    rows,
+                    bind_arguments=dict(mapper=mapper)
+                )
+                affected += max(result.rowcount, 0)
+
+            self.track_change(self.__model__)
+            if commit:
+                self.commit()
+
+        return affected
+
+    def _upsert_statement(self, dialect, table, conflict, update):
+        """
+        Upsert statement
+        Builds native insert-or-update statement for the dialect.
+
+        :param dialect:         str, dialect name
+        :param table:           sqlalchemy.Table, table to insert into
+        :param conflict:        list, conflict column keys
+        :param update:          list, column keys to update
+        :return:                sqlalchemy insert statement
+        """
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            statement = insert(table)
+            if not update:
+                return statement.on_conflict_do_nothing(
+                    index_elements=conflict
+                )
+            values = {key: statement.excluded[key] for key in update}
+            return statement.on_conflict_do_update(
+                index_elements=conflict,
+                set_=values
+            )
+
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            statement = insert(table)
+            keys = update or conflict
+            values = {key: statement.inserted[key] for key in keys}
+            return statement.on_duplicate_key_update(values)
+
+        err = 'Native upsert is not supported for {} dialect'
+        raise ValueError(err.format(dialect))
+
+    def update_where(self, values, chunk_size=None, commit=True,
+                     all_rows=False, **criteria):
+        """
+        Update where
+        Updates all rows matching criteria with a single set-based update
+        statement, without loading them. Models already loaded into session
+        are updated in place. For huge tables pass a chunk size to update
+        in primary key ranges, one statement and one commit per range.
+        Updating without criteria requires all_rows to be set.
+
+        :param values:          dict, attribute names and values to set
+        :param chunk_size:      int, primary key range per statement
+        :param commit:          bool, commit after each statement?
+        :param all_rows:        bool, allow updating whole table
+        :param criteria:        kwargs, attribute values to filter by
+        :return:                int, number of affected rows
+        """
+        if not values:
+            err = 'Update requires values to set'
+            raise ValueError(err)
+
+        return self._where(values, chunk_size, commit, all_rows, criteria)
+
+    def delete_where(self, chunk_size=None, commit=True, all_rows=False,
+                     **criteria):
+        """
+        Delete where
+        Deletes all rows matching criteria with a single set-based delete
+        statement, without loading them. Matching models loaded into
+        session are removed from it. For huge tables pass a chunk size to
+        delete in primary key ranges, one statement and one commit per
+        range. Deleting without criteria requires all_rows to be set.
+
+        :param chunk_size:      int, primary key range per statement
+        :param commit:          bool, commit after each statement?
+        :param all_rows:        bool, allow deleting whole table
+        :param criteria:        kwargs, attribute values to filter by
+        :return:                int, number of affected rows
+        """
+        return self._where(None, chunk_size, commit, all_rows, criteria)
+
+    def _where(self, values, chunk_size, commit, all_rows, criteria):
+        """ Run set-based update (or delete if no values) by criteria """
+        if not criteria and not all_rows:
+            err = 'No criteria given, pass all_rows=True to affect every '
+            err += 'row of {}'
+            raise ValueError(err.format(self.__model__))
+
+        query = self.__model__.query.filter_by(**criteria)
+        queries = [query]
+        if chunk_size is not None:
+            queries = self._primary_key_ranges(query, chunk_size)
+
+        affected = 0
+        for chunk in queries:
+            if values is None:
+                affected += chunk.delete(synchronize_session='evaluate')
+            else:
+                affected += chunk.update(
+                    values,
+                    synchronize_session='evaluate'
+                )
+
+            self.track_change(self.__model__)
+            if commit:
+                self.commit()
+
+        return affected
+
+    def _primary_key_ranges(self, query, size):
+        """
+        Primary key ranges
+        Splits query into queries over consecutive ranges of integer
+        primary key between its lowest and highest matching values.
+
+        :param query:           sqlalchemy.orm.Query
+        :param size:            int, range size
+        :return:                generator of queries
+        """
+        mapper = inspect(self.__model__)
+        columns = mapper.primary_key
+        if len(columns) != 1:
+            err = 'Chunking by primary key range requires a single-column '
+            err += 'primary key, got composite key on {}'
+            raise ValueError(err.format(self.__model__))
+        if not isinstance(columns[0].type, Integer):
+            err = 'Chunking by primary key range requires an integer '
+            err += 'primary key, got {} on {}'
+            raise ValueError(err.format(columns[0].type, self.__model__))
+
+        # mapped attribute, so that session can evaluate the criteria
+        prop = mapper.get_property_by_column(columns[0])
+        key = getattr(self.__model__, prop.key)
+        low, high = query.with_entities(func.min(key), func.max(key)).one()
+        if low is None:
+            return
+
+        while low <= high:
+            yield query.filter(key >= low, key < low + size)
+            low += size
+
+    def _column_keys(self, mapper, names):
+        """ Convert attribute or column names to table column keys """
+        keys = []
+        for name in names:
+            name = getattr(name, 'key', name)
+            if name in mapper.column_attrs:
+                keys.append(mapper.column_attrs[name].columns[0].key)
+            elif name in mapper.local_table.c:
+                keys.append(name)
+            else:
+                err = 'Model {} has no column {}'
+                raise ValueError(err.format(self.__model__, name))
+        return keys
+
+    def _primary_key(self, mapper, model):
+        """ Get primary key of model, scalar unless composite """
+        key = mapper.primary_key_from_instance(model)
+        return key[0] if len(key) == 1 else tuple(key)
+
+    def _insert_rows(self, mapper, models):
+        """
+        Insert rows
+        Converts models to column values for bulk inserts. Rows are grouped
+        by the set of columns they set, so that each group can go in a single
+        executemany call and columns left unset still get their defaults.
+        """
+        if len(mapper.tables) > 1:
+            err = 'Bulk inserts are not supported for models mapped to '
+            err += 'multiple tables: {}'
+            raise ValueError(err.format(self.__model__))
+
+        groups = dict()
+        for model in models:
+            values = inspect(model).dict
+            row = dict()
+            for prop in mapper.column_attrs:
+                if prop.key in values:
+                    row[prop.columns[0].key] = values[prop.key]
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        return list(groups.values())
+
+    def _upsert_rows(self, mapper, items):
+        """
+        Upsert rows
+        Converts dictionaries keyed by attribute or column names to rows of
+        table column values, grouped by the set of columns they set.
+        """
+        if len(mapper.tables) > 1:
+            err = 'Bulk inserts are not supported for models mapped to '
+            err += 'multiple tables: {}'
+            raise ValueError(err.format(self.__model__))
+
+        groups = dict()
+        for data in items:
+            keys = self._column_keys(mapper, data.keys())
+            row = dict(zip(keys, data.values()))
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        return list(groups.values())
+
+    def _result_ids(self, result):
+        """ Get primary keys from insert result, scalar unless composite """
+        return [row[0] if len(row) == 1 else tuple(row) for row in result]
+
+    def loading_options(self, profile=None):
+        """
+        Loading options
+        Returns sqlalchemy loader options of a named loading profile.
+
+        :param profile:         str, profile name
+        :return:                list
+        """
+        if profile is None:
+            return []
+
+        if profile not in self.__loading_profiles__:
+            err = 'Loading profile [{}] is not defined in {}'
+            raise ValueError(err.format(profile, type(self).__name__))
+
+        declared = self.__loading_profiles__[profile]
+        if not isinstance(declared, dict):
+            return list(declared)
+
+        options = []
+        model = self.__model__
+        for strategy, names in declared.items():
+            if strategy == 'load_only':
+                columns = [getattr(model, name) for name in names]
+                options.append(load_only(*columns))
+                continue
+
+            if strategy not in ('selectin', 'joined', 'subquery'):
+                err = 'Unknown loading strategy [{}] in profile [{}]'
+                raise ValueError(err.format(strategy, profile))
+            for name in names:
+                options.append(self._relationship_loader(strategy, name))
+
+        return options
+
+    def _relationship_loader(self, strategy, path):
+        """ Create loader option for a dotted relationship path """
+        from sqlalchemy import orm
+        method = strategy + 'load'
+        option = None
+        model = self.__model__
+        for name in path.split('.'):
+            attribute = getattr(model, name)
+            if option is None:
+                option = getattr(orm, method)(attribute)
+            else:
+                option = getattr(option, method)(attribute)
+            model = attribute.property.mapper.class_
+
+        return option
+
+    def query(self, profile=None):
+        """
+        Query
+        Returns model query for reads with options of a loading profile
+        (or the one service was set up with) applied. Reads are routed to
+        read replicas if app has any, unless session already wrote something.
+
+        :param profile:         str, loading profile name
+        :return:                sqlalchemy.orm.Query
+        """
+        query = self.__model__.query.execution_options(boiler_replica=True)
+        options = self.loading_options(profile or self.loading_profile)
+        if options:
+            query = query.options(*options)
+
+        return query
+
     def get(self, id):
         """
         Get
@@ -109,7 +659,17 @@ class AbstractService:
         :param id:              int, entity id
         :return:                object or None
         """
-        return self.__model__.query.get(id)
+        cache = self.__entity_cache__
+        if cache is None:
+            return self.query().get(id)
+
+        entity = cache.get(db.session(), self.__model__, id)
+        if entity is None:
+            entity = self.query().get(id)
+            if entity is not None:
+                cache.set(entity)
+
+        return entity
 
     def get_or_404(self, id):
         """
@@ -120,19 +680,161 @@ class AbstractService:
         :param id:              int, entity id
         :return:                object
         """
-        return self.__model__.query.get_or_404(id)
+        if self.__entity_cache__ is None:
+            return self.query().get_or_404(id)
+
+        entity = self.get(id)
+        if entity is None:
+            abort(404)
+
+        return entity
+
+    def get_multiple(self, ids, chunk_size=500, mark_missing=False,
+                     profile=None):
+        """
+        Get multiple
+        Returns entities found by a list of ids, in the order of ids. Ids
+        are converted to primary key types and deduplicated. Entities
+        already loaded into session (or present in entity cache) are used
+        as is, while the rest is fetched in chunks to keep IN clauses within
+        database parameter limits.
+        Entities that were not found are skipped, or replaced with None if
+        mark_missing is set. Loading profile only applies to entities that
+        are fetched from the database.
+
+        :param ids:             list, entity ids
+        :param chunk_size:      int, max ids per query
+        :param mark_missing:    bool, put None in place of missing entities
+        :param profile:         str, loading profile name
+        :return:                list
+        """
+        model = self.__model__
+        mapper = inspect(model)
+        ids = [self._normalize_id(mapper, id) for id in ids]
+        ids = list(dict.fromkeys(ids))
+        session = db.session()
+        cache = self.__entity_cache__
+
+        found = dict()
+        missing = []
+        for id in ids:
+            entity = self._loaded_entity(session, id)
+            if entity is None and cache is not None:
+                entity = cache.get(session, model, id)
+            if entity is None:
+                missing.append(id)
+            else:
+                found[id] = entity
+
+        columns = mapper.primary_key
+        key = columns[0] if len(columns) == 1 else tuple_(*columns)
+        query = self.query(profile)
+        for chunk in chunked(missing, chunk_size):
+            for entity in query.filter(key.in_(chunk)).all():
+                found[self._primary_key(mapper, entity)] = entity
+                if cache is not None:
+                    cache.set(entity)
+
+        if mark_missing:
+            return [found.get(id) for id in ids]
+        return [found[id] for id in ids if id in found]
+
+    def _normalize_id(self, mapper, id):
+        """
+        Normalize id
+        Converts id values to python types of primary key columns, so that
+        ids coming from requests as strings match primary keys of entities.
+        Values that can not be converted are left as is.
+        """
+        columns = mapper.primary_key
+        values = id if isinstance(id, tuple) else (id,)
+        if len(values) != len(columns):
+            return id
+
+        normalized = []
+        for column, value in zip(columns, values):
+            try:
+                python_type = column.type.python_type
+                if value is not None and not isinstance(value, python_type):
+                    value = python_type(value)
+            except (NotImplementedError, TypeError, ValueError):
+                pass
+            normalized.append(value)
+
+        return normalized[0] if len(columns) == 1 else tuple(normalized)
 
-    def get_multiple(self, ids):
-        m = self.__model__
-        query = m.query.filter(m.id.in_(ids))
-        return query.all()
+    def _loaded_entity(self, session, id):
+        """ Get entity from session identity map unless expired """
+        identity = id if isinstance(id, tuple) else (id,)
+        key = identity_key(self.__model__, identity)
+        entity = session.identity_map.get(key)
+        if entity is None or inspect(entity).expired_attributes:
+            return None
+        return entity
 
     def find(self, **kwargs):
-        return self.__model__.query.filter_by(**kwargs).all()
+        return self.query().filter_by(**kwargs).all()
 
     def first(self, **kwargs):
-        return self.__model__.query.filter_by(**kwargs).first()
+        return self.query().filter_by(**kwargs).first()
+
+    def collection(
+        self,
+        page=None,
+        per_page=None,
+        serialized=None,
+        **kwargs):
+        """
+        Collection
+        Returns a page of models filtered by given arguments, ordered by
+        primary key. Pass a serialize function to get an api collection.
+
+        Base query of each loading profile is built once and reused, only
+        filters are applied per call. Filter values are rendered as bound
+        parameters, so repeated filter shapes hit sqlalchemy compiled
+        statement cache and skip compilation.
+
+        :param page:            int, page to fetch
+        :param per_page:        int, items per page
+        :param serialized:      callable, serialize function
+        :param kwargs:          varargs, filters
+        :return:                PaginatedCollection or ApiCollection
+        """
+        from boiler.collections import PaginatedCollection, ApiCollection
+
+        template = self.collection_template(self.loading_profile)
+        query = template.with_session(db.session())
+        if kwargs:
+            query = query.filter_by(**kwargs)
+
+        options = dict(page=page or 1, per_page=per_page or 10)
+        if serialized is None:
+            return PaginatedCollection(query, **options)
+
+        return ApiCollection(query, serialize_function=serialized, **options)
+
+    def collection_template(self, profile=None):
+        """
+        Collection template
+        Returns session-less base query of collections for a loading
+        profile, ordered by primary key, building it on first use.
+
+        :param profile:         str, loading profile name
+        :return:                sqlalchemy.orm.Query
+        """
+        key = (type(self), profile)
+        template = query_templates.get(key)
+        if template is not None:
+            return template
+
+        model = self.__model__
+        template = model.query_class(model)
+        template = template.execution_options(boiler_replica=True)
+        options = self.loading_options(profile)
+        if options:
+            template = template.options(*options)
 
-    def collection(self, page=None, per_page=None, serialized=None, **kwargs):
-        pass
+        template = template.order_by(*inspect(model).primary_key)
+        query_templates[key] = template
+        return template
 
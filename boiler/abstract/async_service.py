@@ -0,0 +1,252 @@
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from flask import current_app, abort
+from sqlalchemy import select
+from boiler.feature.orm import get_async_engine
+from boiler.abstract.events import changes_committed
+
+# async session of current task
+current_session = ContextVar('boiler_async_session', default=None)
+
+
+@asynccontextmanager
+async def async_session_scope(engine=None):
+    """
+    Async session scope
+    Opens an async session that services will use within the scope, and
+    closes it on exit. Nested scopes reuse the outer session.
+
+        async with async_session_scope():
+            user = await service.get(123)
+
+    :param engine: sqlalchemy.ext.asyncio.AsyncEngine, defaults to app engine
+    :return: sqlalchemy.ext.asyncio.AsyncSession
+    """
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    session = current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    engine = engine or get_async_engine()
+    session = AsyncSession(engine, autoflush=False, expire_on_commit=False)
+    token = current_session.set(session)
+    try:
+        yield session
+    finally:
+        current_session.reset(token)
+        await session.close()
+
+
+class AsyncAbstractService:
+    """
+    Async abstract service
+    Async counterpart of abstract service for use in async views. Works on
+    an asyncio session of current scope (see async_session_scope), or opens
+    a scope for the duration of a single call if there is none. Note that
+    instances returned from a temporary scope are detached, so do all your
+    work within an explicit scope when you need to modify and save them.
+
+    Relationships are not loaded lazily in async mode, use eager loading
+    options in your queries instead.
+    """
+    __model__ = None
+
+    def log(self, message, level=None):
+        """ Write a message to log """
+        if level is None:
+            level = logging.INFO
+
+        current_app.logger.log(msg=message, level=level)
+
+    def is_instance(self, model):
+        """
+        Is instance?
+        Checks if provided object is instance of this service's model.
+
+        :param model:           object
+        :return:                bool
+        """
+        result = isinstance(model, self.__model__)
+        if result is True:
+            return True
+
+        err = 'Object {} is not of type {}'
+        raise ValueError(err.format(model, self.__model__))
+
+    async def commit(self):
+        """
+        Commit
+        Commits orm transaction of current scope and notifies caches about
+        changes tracked since last commit.
+
+        :return:                None
+        """
+        async with async_session_scope() as session:
+            await session.commit()
+            changes = session.sync_session.info.pop('boiler_changes', None)
+            if changes:
+                changes_committed.send(self, changes=changes)
+
+    def track_change(self, session, model):
+        """
+        Track change
+        Remembers a changed model to notify caches once transaction is
+        committed.
+
+        :param session:         sqlalchemy.ext.asyncio.AsyncSession
+        :param model:           object, model instance or class
+        :return:                None
+        """
+        info = session.sync_session.info
+        info.setdefault('boiler_changes', []).append(model)
+
+    def new(self, **kwargs):
+        """
+        New
+        Returns a new unsaved instance of model, populated from the
+        provided arguments.
+
+        :param kwargs:          varargs, data to populate with
+        :return:                object, fresh unsaved model
+        """
+        return self.__model__(**kwargs)
+
+    async def create(self, **kwargs):
+        """
+        Create
+        Instantiates and persists new model populated from provided
+        arguments
+
+        :param kwargs:          varargs, data to populate with
+        :return:                object, persisted new instance of model
+        """
+        model = self.new(**kwargs)
+        return await self.save(model)
+
+    async def save(self, model, commit=True):
+        """
+        Save
+        Puts model into unit of work for persistence. Can optionally
+        commit transaction. Returns persisted model as a result.
+
+        :param model:           object, model to persist
+        :param commit:          bool, commit transaction?
+        :return:                object, saved model
+        """
+        self.is_instance(model)
+        async with async_session_scope() as session:
+            session.add(model)
+            self.track_change(session, model)
+            if commit:
+                await self.commit()
+            else:
+                await session.flush()
+
+        return model
+
+    async def delete(self, model, commit=True):
+        """
+        Delete
+        Puts model for deletion into unit of work and optionally commits
+        transaction. Detached models are merged into session first.
+
+        :param model:           object, model to delete
+        :param commit:          bool, commit?
+        :return:                object, deleted model
+        """
+        self.is_instance(model)
+        async with async_session_scope() as session:
+            if model not in session:
+                model = await session.merge(model, load=False)
+            await session.delete(model)
+            self.track_change(session, model)
+            if commit:
+                await self.commit()
+            else:
+                await session.flush()
+
+        return model
+
+    async def get(self, id):
+        """
+        Get
+        Returns single entity found by id, or None if not found
+
+        :param id:              int, entity id
+        :return:                object or None
+        """
+        async with async_session_scope() as session:
+            return await session.get(self.__model__, id)
+
+    async def get_or_404(self, id):
+        """
+        Get or 404
+        Returns single entity found by its unique id, or raises
+        htp 404 exception if nothing is found.
+
+        :param id:              int, entity id
+        :return:                object
+        """
+        entity = await self.get(id)
+        if entity is None:
+            abort(404)
+
+        return entity
+
+    async def find(self, **kwargs):
+        statement = select(self.__model__).filter_by(**kwargs)
+        async with async_session_scope() as session:
+            result = await session.execute(statement)
+            return result.scalars().all()
+
+    async def first(self, **kwargs):
+        statement = select(self.__model__).filter_by(**kwargs).limit(1)
+        async with async_session_scope() as session:
+            result = await session.execute(statement)
+            return result.scalars().first()
+
+    async def collection(
+        self,
+        page=1,
+        per_page=10,
+        serialized=None,
+        **kwargs):
+        """
+        Collection
+        Returns a page of models filtered by given arguments as an
+        awaited async collection. Pass a serialize function to get an
+        api collection instead.
+
+        :param page:            int, page to fetch
+        :param per_page:        int, items per page
+        :param serialized:      callable, serialize function
+        :param kwargs:          varargs, filters
+        :return:                AsyncPaginatedCollection
+        """
+        from boiler.collections.async_collection import (
+            AsyncPaginatedCollection,
+            AsyncApiCollection
+        )
+
+        model = self.__model__
+        statement = select(model).filter_by(**kwargs)
+        statement = statement.order_by(*model.__table__.primary_key)
+        options = dict(page=page, per_page=per_page)
+        async with async_session_scope() as session:
+            if serialized is None:
+                collection = AsyncPaginatedCollection(
+                    session,
+                    statement,
+                    **options
+                )
+            else:
+                collection = AsyncApiCollection(
+                    session,
+                    statement,
+                    serialize_function=serialized,
+                    **options
+                )
+            return await collection
@@ -0,0 +1,12 @@
+from boiler.events import Namespace
+
+"""
+Service events
+Signals sent by services about changes to data. Caches and other
+integrations connect to these to stay in sync with the database.
+"""
+
+events = Namespace()
+
+# sent after commit, with changes=[model instances or model classes]
+changes_committed = events.signal('changes_committed')
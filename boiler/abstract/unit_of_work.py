@@ -0,0 +1,128 @@
+from contextlib import ContextDecorator
+from boiler.feature.orm import db
+from boiler.abstract.events import changes_committed
+
+
+def in_unit_of_work():
+    """
+    In unit of work?
+    Checks whether current session is within a unit of work.
+
+    :return: bool
+    """
+    return db.session.info.get('boiler_uow_depth', 0) > 0
+
+
+def commit_session(sender=None):
+    """
+    Commit session
+    Commits current session and notifies caches about changes tracked
+    since last commit.
+
+    :param sender: object, who commits
+    :return: None
+    """
+    db.session.commit()
+    changes = db.session.info.pop('boiler_changes', None)
+    if changes:
+        changes_committed.send(sender, changes=changes)
+
+
+def rollback_session():
+    """
+    Rollback session
+    Rolls back current session and forgets tracked changes.
+
+    :return: None
+    """
+    db.session.rollback()
+    db.session.info.pop('boiler_changes', None)
+
+
+class UnitOfWork(ContextDecorator):
+    """
+    Unit of work
+    Coalesces service commits into a single transaction. Within a unit of
+    work every commit made by a service only flushes the session, and the
+    transaction is committed once on exit, or rolled back if an exception
+    occurs. Can be used as a context manager or a decorator:
+
+        with UnitOfWork():
+            users.save(user)
+            profiles.save(profile)
+
+        @UnitOfWork()
+        def register(): ...
+
+    Units of work can be nested, in which case only the outermost one
+    commits. If a nested unit fails, the whole transaction is rolled back
+    on exit, even if the exception was handled in between.
+
+    To wrap every request in a unit of work set UNIT_OF_WORK_PER_REQUEST
+    in your config.
+    """
+    def __enter__(self):
+        info = db.session.info
+        info['boiler_uow_depth'] = info.get('boiler_uow_depth', 0) + 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        info = db.session.info
+        depth = info.get('boiler_uow_depth', 1) - 1
+        if exc_type is not None:
+            info['boiler_uow_failed'] = True
+
+        if depth > 0:
+            info['boiler_uow_depth'] = depth
+            return False
+
+        info.pop('boiler_uow_depth', None)
+        failed = info.pop('boiler_uow_failed', False)
+        if failed:
+            rollback_session()
+            return False
+
+        try:
+            commit_session(self)
+        except Exception:
+            rollback_session()
+            raise
+
+        return False
+
+
+def unit_of_work_per_request(app):
+    """
+    Unit of work per request
+    Wraps every request of the app into a unit of work. Transaction is
+    committed before response is sent for successful responses, and rolled
+    back for error responses or unhandled exceptions.
+
+    :param app: flask.Flask
+    :return: None
+    """
+    def begin():
+        UnitOfWork().__enter__()
+
+    def finish(response):
+        if not in_unit_of_work():
+            return response
+
+        if response.status_code >= 400:
+            db.session.info['boiler_uow_failed'] = True
+        db.session.info['boiler_uow_depth'] = 1
+        UnitOfWork().__exit__(None, None, None)
+        return response
+
+    def end(exception=None):
+        if not in_unit_of_work():
+            return
+
+        # response was never finished, roll back
+        db.session.info['boiler_uow_depth'] = 1
+        db.session.info['boiler_uow_failed'] = True
+        UnitOfWork().__exit__(None, None, None)
+
+    app.before_request(begin)
+    app.after_request(finish)
+    app.teardown_request(end)
@@ -8,6 +8,10 @@ app = bootstrap.create_app(name=flask_app, config=bootstrap.get_config())
 # enable features
 bootstrap.add_routing(app)
 # bootstrap.add_orm(app)
+# bootstrap.add_fork_hooks(app)
 # bootstrap.add_logging(app)
 # bootstrap.add_mail(app)
 # bootstrap.add_localization(app)
+
+# init deferred features before workers fork (with DEFERRED_INIT)
+# bootstrap.init_deferred(app)
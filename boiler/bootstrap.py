@@ -1,19 +1,22 @@
 import os
 from os import path
+from threading import RLock
+from collections import OrderedDict
 from flask import Flask
 from flask import g
 from flask import request
+from flask import appcontext_pushed
 from werkzeug.utils import import_string
 from werkzeug.utils import ImportStringError
-from jinja2 import ChoiceLoader, FileSystemLoader
-from flask_wtf import CSRFProtect
 
 from boiler.config import DefaultConfig
 from boiler.timer import restart_timer
-from boiler.errors import register_error_handler
-from boiler.jinja import functions as jinja_functions
+from boiler.timer.startup_profiler import profiler, profiled
 from boiler import exceptions as x
 
+# events deferred features init on
+deferred_triggers = ('context', 'request')
+
 
 def get_config():
     """
@@ -95,6 +98,7 @@ def test_import_name(name):
         raise x.BootstrapException(err.format(name))
 
 
+@profiled
 def create_app(name, config=None, flask_params=None):
     """
     Create app
@@ -104,6 +108,10 @@ def create_app(name, config=None, flask_params=None):
 
     Note: application name should be its fully qualified __name__, something
     like project.api.app. This is how we fetch routing settings.
+
+    With DEFERRED_INIT enabled, csrf protection, error handlers, templates
+    and features added with add_* toggles only import and set themselves
+    up on first use (see defer).
     """
     # check import name
     test_import_name(name)
@@ -126,30 +134,28 @@ def create_app(name, config=None, flask_params=None):
         flask_params['static_folder'] = config.get('FLASK_STATIC_PATH')
 
     # create an app with default config
-    app = Flask(**flask_params)
-    app.config.from_object(DefaultConfig())
+    with profiler.phase('flask'):
+        app = Flask(**flask_params)
+        app.config.from_object(DefaultConfig())
 
-    # apply custom config
-    if config:
-        app.config.from_object(config)
+        # apply custom config
+        if config:
+            app.config.from_object(config)
+
+    # init deferred features on first use
+    if app.config.get('DEFERRED_INIT'):
+        appcontext_pushed.connect(init_on_app_context, app)
+        app.before_first_request(lambda: init_deferred(app, 'request'))
 
     # enable csrf protection
-    CSRFProtect(app)
+    defer(app, 'csrf', 'boiler.bootstrap.init_csrf', 'request')
 
     # register error handler
-    register_error_handler(app)
+    handlers = 'boiler.errors.register_error_handler'
+    defer(app, 'error_handlers', handlers, 'request')
 
     # use kernel templates
-    kernel_templates_path = path.realpath(path.dirname(__file__)+'/templates')
-    fallback_loader = FileSystemLoader([kernel_templates_path])
-    custom_loader = ChoiceLoader([app.jinja_loader, fallback_loader])
-    app.jinja_loader = custom_loader
-
-    # register custom jinja functions
-    app.jinja_env.globals.update(dict(
-        asset=jinja_functions.asset,
-        dev_proxy=jinja_functions.dev_proxy
-    ))
+    defer(app, 'jinja', 'boiler.bootstrap.init_templates')
 
     # time restarts?
     if app.config.get('TIME_RESTARTS'):
@@ -165,41 +171,242 @@ def create_app(name, config=None, flask_params=None):
 
     return app
 
+
+def init_csrf(app):
+    """ Enable csrf protection """
+    from flask_wtf import CSRFProtect
+    CSRFProtect(app)
+
+
+def init_templates(app):
+    """ Fall back to kernel templates and register jinja functions """
+    from jinja2 import ChoiceLoader, FileSystemLoader
+    from boiler.jinja import functions as jinja_functions
+
+    kernel_path = path.realpath(path.dirname(__file__) + '/templates')
+    fallback_loader = FileSystemLoader([kernel_path])
+    custom_loader = ChoiceLoader([app.jinja_loader, fallback_loader])
+    app.jinja_loader = custom_loader
+
+    # register custom jinja functions
+    app.jinja_env.globals.update(dict(
+        asset=jinja_functions.asset,
+        dev_proxy=jinja_functions.dev_proxy
+    ))
+
+# ------------------------------------------------------------------------------
+# Deferred init
+# ------------------------------------------------------------------------------
+
+
+def defer(app, name, init, trigger='context'):
+    """
+    Defer
+    Runs feature init right away, or, if app has DEFERRED_INIT enabled,
+    registers it to run on first use of the feature: 'context' features
+    init when app context is first pushed (by a request, cli command or
+    a job), and 'request' features right before first request. Init can
+    be an import string, so that feature modules are imported on use too.
+
+    :param app: flask.Flask
+    :param name: str, feature name
+    :param init: callable or str, function that takes app
+    :param trigger: str, 'context' or 'request'
+    :return: None
+    """
+    if trigger not in deferred_triggers:
+        err = 'Unknown deferred init trigger [{}] of feature [{}]'
+        raise x.BootstrapException(err.format(trigger, name))
+
+    if not app.config.get('DEFERRED_INIT'):
+        run_init(app, name, init)
+        return
+
+    deferred = app.extensions.setdefault('boiler_deferred', dict(
+        pending=OrderedDict(),
+        running=set(),
+        ready=set(),
+        lock=RLock()
+    ))
+    deferred['ready'].discard(trigger)
+    deferred['pending'][name] = (init, trigger)
+
+
+def init_deferred(app, trigger=None):
+    """
+    Init deferred
+    Initializes features that are still waiting for first use. Call it
+    without trigger to force eager init of everything, for example in a
+    preloading master process before workers fork.
+
+    Features stay pending until their init finishes, and a trigger is only
+    marked ready once none of its features are pending, so that other
+    threads wait for init in progress instead of using a half-ready app.
+
+    :param app: flask.Flask
+    :param trigger: str, only init features of this trigger
+    :return: list, names of initialized features
+    """
+    deferred = app.extensions.get('boiler_deferred')
+    triggers = deferred_triggers if trigger is None else (trigger,)
+    if not deferred or deferred['ready'].issuperset(triggers):
+        return []
+
+    done = []
+    with deferred['lock']:
+        pending = deferred['pending']
+        running = deferred['running']
+        for name, (init, init_trigger) in list(pending.items()):
+            if init_trigger not in triggers or name in running:
+                continue
+
+            # nested calls (init pushing app context) may have run it
+            if name not in pending:
+                continue
+
+            running.add(name)
+            try:
+                run_init(app, name, init)
+            finally:
+                running.discard(name)
+            if pending.pop(name, None) is not None:
+                done.append(name)
+
+        waiting = set(init_trigger for _, init_trigger in pending.values())
+        deferred['ready'] = set(deferred_triggers) - waiting
+
+    return done
+
+
+def init_on_app_context(app, **extra):
+    """ Init context features when app context is first pushed """
+    init_deferred(app, 'context')
+
+
+def run_init(app, name, init):
+    """ Run feature init, importing it if necessary """
+    with profiler.phase(name):
+        if isinstance(init, str):
+            init = import_string(init)
+        init(app)
+
 # ------------------------------------------------------------------------------
 # Feature toggles
 # ------------------------------------------------------------------------------
 
 
+@profiled
 def add_routing(app):
     """ Add routing and lazy-views feature """
-    from boiler.feature.routing import routing_feature
-    routing_feature(app)
+    defer(app, 'routing', 'boiler.feature.routing.routing_feature')
 
 
+@profiled
 def add_mail(app):
     """ Add mailing functionality """
-    from boiler.feature.mail import mail_feature
-    mail_feature(app)
+    defer(app, 'mail', 'boiler.feature.mail.mail_feature')
 
 
+@profiled
 def add_orm(app):
     """ Add SQLAlchemy ORM integration """
-    from boiler.feature.orm import orm_feature
-    orm_feature(app)
+    defer(app, 'orm', 'boiler.feature.orm.orm_feature')
 
 
+@profiled
 def add_logging(app):
     """ Add logging functionality """
-    from boiler.feature.logging import logging_feature
-    logging_feature(app)
+    defer(app, 'logging', 'boiler.feature.logging.logging_feature')
+
+
+@profiled
+def add_query_log(app):
+    """ Add slow query log and per-statement stats """
+    defer(app, 'query_log', 'boiler.feature.query_log.query_log_feature')
 
 
+@profiled
 def add_localization(app):
     """ Enable support for localization and translations"""
-    from boiler.feature.localization import localization_feature
-    localization_feature(app)
+    init = 'boiler.feature.localization.localization_feature'
+    defer(app, 'localization', init)
+
+
+@profiled
+def add_fork_hooks(app):
+    """
+    Add fork hooks
+    Registers post_fork() to run in every worker forked from a process that
+    loaded the app: with uwsgi postfork decorator when running under uwsgi
+    (without lazy-apps), or with os.register_at_fork otherwise (gunicorn
+    with preload, multiprocessing and custom prefork servers). Servers can
+    also call post_fork(app) from their own post-fork hooks instead.
+
+    :param app: flask.Flask
+    :return: None
+    """
+    def after_fork():
+        post_fork(app)
+
+    try:
+        import uwsgidecorators
+        uwsgidecorators.postfork(after_fork)
+    except ImportError:
+        os.register_at_fork(after_in_child=after_fork)
 
 
+def post_fork(app, warm=None):
+    """
+    Post fork
+    Prepares database engines in a freshly forked worker. Pools inherited
+    from parent are replaced without closing their connections (those are
+    still used by the parent), then optionally warms a number of
+    connections per engine so that first requests of the worker do not
+    pay for connection setup. Logs and returns how long it all took.
+
+    :param app: flask.Flask
+    :param warm: int, connections to warm, defaults to DB_POOL_WARM
+    :return: dict, report
+    """
+    import time
+    from boiler.feature.orm import app_engines
+
+    start = time.perf_counter()
+    warm = app.config.get('DB_POOL_WARM', 0) if warm is None else warm
+    engines = []
+    if 'sqlalchemy' in app.extensions:
+        with app.app_context():
+            engines = app_engines(app)
+
+    warmed = 0
+    for engine in engines:
+        engine.dispose(close=False)
+        connections = []
+        try:
+            for _ in range(warm):
+                connections.append(engine.connect())
+        except Exception as error:
+            url = engine.url.render_as_string(hide_password=True)
+            msg = 'Failed to warm connections of {} after fork: {}'
+            app.logger.warning(msg.format(url, error))
+        finally:
+            warmed += len(connections)
+            for connection in connections:
+                connection.close()
+
+    report = dict(
+        pid=os.getpid(),
+        engines=len(engines),
+        warmed=warmed,
+        seconds=round(time.perf_counter() - start, 4)
+    )
+
+    msg = 'Worker {pid} disposed {engines} engine(s) and warmed {warmed} '
+    msg += 'connection(s) in {seconds}s'
+    app.logger.info(msg.format(**report))
+    app.extensions['boiler_post_fork'] = report
+    return report
+
 
 
 
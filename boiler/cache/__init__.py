@@ -0,0 +1,3 @@
+from .backends import MemoryBackend, RedisBackend
+from .result_cache import ResultCache
+from .entity_cache import EntityCache
@@ -0,0 +1,124 @@
+import time
+import pickle
+from collections import OrderedDict
+from threading import Lock
+
+
+class MemoryBackend:
+    """
+    Memory backend
+    In-process cache storage with least-recently-used eviction and optional
+    per-key expiration. Thread-safe, but not shared between processes, so
+    every uwsgi worker will get its own copy.
+    """
+    def __init__(self, max_size=1024):
+        """
+        Initialise backend
+
+        :param max_size: int, maximum number of keys to keep
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Get
+        Returns value stored under key or None if missing or expired.
+
+        :param key: str, cache key
+        :return: object or None
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Set
+        Stores value under key, evicting least recently used keys if
+        the backend is full.
+
+        :param key: str, cache key
+        :param value: object, value to store
+        :param ttl: int, seconds to keep value for, None for no expiration
+        :return: None
+        """
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """ Remove key from cache """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """ Remove everything from cache """
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """
+    Redis backend
+    Shared cache storage on top of a redis client you provide (redis-py or
+    anything with compatible get/set/delete/scan_iter methods). Values are
+    pickled and expiration and eviction is left to redis.
+    """
+    def __init__(self, client, prefix='boiler:cache:'):
+        """
+        Initialise backend
+
+        :param client: redis.Redis, configured client
+        :param prefix: str, namespace for keys
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        """
+        Get
+        Returns value stored under key or None if missing or expired.
+
+        :param key: str, cache key
+        :return: object or None
+        """
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """
+        Set
+        Stores value under key with optional expiration.
+
+        :param key: str, cache key
+        :param value: object, value to store
+        :param ttl: int, seconds to keep value for, None for no expiration
+        :return: None
+        """
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        """ Remove key from cache """
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        """ Remove every key in our namespace """
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
@@ -0,0 +1,132 @@
+import pickle
+from uuid import uuid4
+from weakref import WeakSet
+from sqlalchemy import inspect
+from sqlalchemy.orm.util import identity_key
+from boiler.abstract.events import changes_committed
+from boiler.cache.backends import MemoryBackend
+
+# live caches to invalidate on commits
+caches = WeakSet()
+
+
+class EntityCache:
+    """
+    Entity cache
+    Read-through cache of model instances by primary key, to be used by
+    services (see AbstractService.__entity_cache__). Entities are stored
+    pickled and merged into current session when read back. An entity is
+    invalidated when a service commits changes to it, and bulk changes
+    invalidate all cached entities of the model.
+
+    Instances already present in session identity map always take
+    precedence over cached snapshots.
+    """
+    def __init__(self, backend=None, ttl=300):
+        """
+        Initialise cache
+
+        :param backend: object, storage backend, in-memory LRU by default
+        :param ttl: int, seconds to keep entities for
+        """
+        self.backend = backend or MemoryBackend(max_size=10000)
+        self.ttl = ttl
+        caches.add(self)
+
+    def key(self, model_class, identity):
+        """
+        Key
+        Generates cache key for an entity identity.
+
+        :param model_class: class, model class
+        :param identity: tuple, primary key values
+        :return: str
+        """
+        name = '{}.{}'.format(model_class.__module__, model_class.__name__)
+        generation = self.generation(name)
+        return 'entity:{}:{}:{}'.format(name, generation, repr(identity))
+
+    def generation(self, name):
+        """ Get generation token of a model, creating one if missing """
+        key = 'generation:' + name
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = uuid4().hex
+            self.backend.set(key, generation)
+        return generation
+
+    def get(self, session, model_class, id):
+        """
+        Get
+        Returns entity from session identity map or from cache, merging
+        it into session. Returns None on cache miss.
+
+        :param session: sqlalchemy.orm.Session
+        :param model_class: class, model class
+        :param id: primary key value or tuple of values
+        :return: object or None
+        """
+        identity = id if isinstance(id, tuple) else (id,)
+        key = identity_key(model_class, identity)
+        instance = session.identity_map.get(key)
+        if instance is not None:
+            return instance
+
+        payload = self.backend.get(self.key(model_class, identity))
+        if payload is None:
+            return None
+
+        return session.merge(pickle.loads(payload), load=False)
+
+    def set(self, instance):
+        """
+        Set
+        Puts a snapshot of persistent entity into cache. Entities that
+        are modified or have expired attributes are skipped.
+
+        :param instance: object, persistent model instance
+        :return: None
+        """
+        state = inspect(instance)
+        identity = state.identity
+        if identity is None or state.modified or state.expired_attributes:
+            return
+
+        key = self.key(type(instance), identity)
+        self.backend.set(key, pickle.dumps(instance), ttl=self.ttl)
+
+    def invalidate(self, model):
+        """
+        Invalidate
+        Drops cached entity for a model instance, or all cached entities
+        if given a model class.
+
+        :param model: object, model instance or class
+        :return: None
+        """
+        if isinstance(model, type):
+            name = '{}.{}'.format(model.__module__, model.__name__)
+            self.backend.set('generation:' + name, uuid4().hex)
+            return
+
+        identity = inspect(model).identity
+        if identity is not None:
+            self.backend.delete(self.key(type(model), identity))
+
+    def clear(self):
+        """ Drop everything from cache backend """
+        self.backend.clear()
+
+
+def invalidate_committed(sender, changes=None, **kwargs):
+    """
+    Invalidate committed
+    Receiver of service commit events, drops changed entities from all
+    live entity caches.
+    """
+    for cache in list(caches):
+        for model in changes or []:
+            cache.invalidate(model)
+
+
+changes_committed.connect(invalidate_committed)
@@ -0,0 +1,198 @@
+import pickle
+from uuid import uuid4
+from weakref import WeakSet
+from sqlalchemy import inspect, Table
+from sqlalchemy.orm.state import InstanceState
+from sqlalchemy.sql.util import find_tables
+from boiler.abstract.events import changes_committed
+from boiler.cache.backends import MemoryBackend
+from boiler.collections.fingerprint import query_fingerprint
+
+# live caches to invalidate on commits
+caches = WeakSet()
+
+
+def query_tables(query):
+    """
+    Query tables
+    Returns sorted names of every table query reads from, including joins
+    and subqueries.
+
+    :param query: sqlalchemy.orm.Query or select statement
+    :return: list
+    """
+    statement = getattr(query, 'statement', query)
+    tables = find_tables(statement, include_joins=True)
+    return sorted(set(t.fullname for t in tables if isinstance(t, Table)))
+
+
+def model_tables(model):
+    """
+    Model tables
+    Returns names of tables given model class or instance is mapped to.
+
+    :param model: object, model class or instance
+    :return: list
+    """
+    model_class = model if isinstance(model, type) else type(model)
+    return [table.fullname for table in inspect(model_class).tables]
+
+
+class ResultCache:
+    """
+    Result cache
+    Caches query results keyed by compiled statement and bound parameters.
+    Every key also includes a generation token of each table query reads
+    from. Invalidating a table replaces its token, so all results that
+    depend on it become unreachable at once, and will eventually be evicted
+    by the backend. Caches are invalidated automatically when services
+    commit changes to their models.
+
+    Results are stored pickled, so cached model instances are snapshots.
+    When read back, they get merged into current session without hitting
+    the database.
+    """
+    def __init__(self, backend=None, ttl=60):
+        """
+        Initialise cache
+
+        :param backend: object, storage backend, in-memory LRU by default
+        :param ttl: int, seconds to keep results for
+        """
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        caches.add(self)
+
+    def key(self, query, *extra):
+        """
+        Key
+        Generates cache key for a query.
+
+        :param query: sqlalchemy.orm.Query
+        :param extra: args, additional values to mix into key
+        :return: str
+        """
+        tables = query_tables(query)
+        generations = [self.generation(table) for table in tables]
+        return 'result:' + query_fingerprint(query, generations, *extra)
+
+    def generation(self, table):
+        """
+        Generation
+        Returns current generation token of a table. A missing token (never
+        set or evicted) is replaced with a fresh one, so results cached
+        before can never be reached again.
+
+        :param table: str, table name
+        :return: str
+        """
+        key = 'generation:' + table
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = uuid4().hex
+            self.backend.set(key, generation)
+        return generation
+
+    def invalidate(self, *tables):
+        """
+        Invalidate
+        Drops cached results that depend on any of given tables.
+
+        :param tables: args, table names
+        :return: None
+        """
+        for table in tables:
+            self.backend.set('generation:' + table, uuid4().hex)
+
+    def invalidate_model(self, model):
+        """
+        Invalidate model
+        Drops cached results that depend on tables of given model.
+
+        :param model: object, model class or instance
+        :return: None
+        """
+        self.invalidate(*model_tables(model))
+
+    def clear(self):
+        """ Drop everything from cache backend """
+        self.backend.clear()
+
+    def get_or_set(self, query, creator, *extra):
+        """
+        Get or set
+        Returns cached result for query, or calls creator to produce one
+        and caches it.
+
+        :param query: sqlalchemy.orm.Query
+        :param creator: callable, produces result on cache miss
+        :param extra: args, additional values to mix into key
+        :return: object
+        """
+        key = self.key(query, *extra)
+        payload = self.backend.get(key)
+        if payload is not None:
+            return self.load(query.session, payload)
+
+        result = creator()
+        self.backend.set(key, pickle.dumps(result), ttl=self.ttl)
+        return result
+
+    def all(self, query):
+        """
+        All
+        Cached equivalent of query.all()
+
+        :param query: sqlalchemy.orm.Query
+        :return: list
+        """
+        return self.get_or_set(query, query.all)
+
+    def load(self, session, payload):
+        """
+        Load
+        Unpickles cached result and merges model instances into session.
+
+        :param session: sqlalchemy.orm.Session
+        :param payload: bytes, pickled result
+        :return: object
+        """
+        result = pickle.loads(payload)
+        if isinstance(result, list):
+            return [self._merge(session, item) for item in result]
+        return self._merge(session, result)
+
+    def _merge(self, session, item):
+        """
+        Merge model instance into session, leave other values as is.
+        Instances already in session identity map are returned as they are,
+        so that cached snapshots do not overwrite unflushed changes.
+        """
+        if isinstance(item, tuple):
+            return tuple(self._merge(session, value) for value in item)
+
+        state = inspect(item, raiseerr=False)
+        if not isinstance(state, InstanceState):
+            return item
+
+        instance = session.identity_map.get(state.key)
+        if instance is not None:
+            return instance
+        return session.merge(item, load=False)
+
+
+def invalidate_committed(sender, changes=None, **kwargs):
+    """
+    Invalidate committed
+    Receiver of service commit events, invalidates all live caches for
+    tables of changed models.
+    """
+    tables = set()
+    for model in changes or []:
+        tables.update(model_tables(model))
+
+    for cache in list(caches):
+        cache.invalidate(*tables)
+
+
+changes_committed.connect(invalidate_committed)
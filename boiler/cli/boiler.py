@@ -243,3 +243,76 @@ def install_dependencies(feature=None):
     echo(green('DONE\n'))
 
 
+
+
+# -----------------------------------------------------------------------------
+# Profile app startup
+# -----------------------------------------------------------------------------
+
+@cli.command(name='startup-profile')
+@click.option('--app', 'flask_app', default=None, help='App package, defaults to FLASK_APP')
+@click.option('--runs', '-r', default=3, help='Startups to take median timings of')
+@click.option('--save/--no-save', default=True, help='Save report to compare with later runs?')
+def startup_profile(flask_app=None, runs=3, save=True):
+    """ Profile app startup: wall and import time per bootstrap phase """
+    import json
+    import subprocess
+    from boiler.timer import startup_profiler
+
+    echo(green('\nStartup profile:'))
+    echo(green('-' * 40))
+
+    flask_app = flask_app or os.getenv('FLASK_APP')
+    if not flask_app:
+        echo(red('FLASK_APP undefined. Have you created a .env file?\n'))
+        return
+
+    # every run starts in a fresh process to pay for all imports
+    reports = []
+    command = [sys.executable, '-m', 'boiler.timer.startup_profiler']
+    for _ in range(max(runs, 1)):
+        try:
+            output = subprocess.check_output(command + [flask_app])
+        except subprocess.CalledProcessError:
+            echo(red('App failed to start, see error above\n'))
+            return
+        lines = output.decode().strip().splitlines()
+        reports.append(json.loads(lines[-1]))
+
+    report = startup_profiler.aggregate(reports)
+    path = os.path.join(os.getcwd(), 'var', 'data', 'startup-profiles')
+    previous = startup_profiler.last_report(path)
+    if previous:
+        startup_profiler.compare(report, previous)
+
+    row = '{:<44} {:>9} {:>9} {:>7} {:>9}'
+    echo(yellow(row.format('phase', 'wall ms', 'import ms', 'modules', 'delta')))
+    for phase in report['phases']:
+        name = '  ' * phase['depth'] + phase['path'].split(' > ')[-1]
+        echo(row.format(
+            name[:44],
+            '{:.1f}'.format(phase['wall_ms']),
+            '{:.1f}'.format(phase['import_ms']),
+            phase['modules'],
+            format_delta(phase.get('delta_ms'))
+        ))
+
+    echo(green(row.format(
+        'total ({} runs)'.format(report['runs']),
+        '{:.1f}'.format(report['wall_ms']),
+        '{:.1f}'.format(report['import_ms']),
+        report['modules'],
+        format_delta(report.get('delta_ms'))
+    )))
+
+    if save:
+        filename = startup_profiler.save_report(report, path)
+        echo(yellow('\nSaved to: ') + filename)
+    echo()
+
+
+def format_delta(delta):
+    """ Format timing difference to previous run """
+    if delta is None:
+        return '-'
+    return '{:+.1f}'.format(delta)
@@ -1,3 +1,4 @@
+import os
 import click
 from alembic import command as alembic_command
 from alembic.util import CommandError
@@ -7,13 +8,16 @@ from boiler.feature.orm import db
 from boiler import bootstrap
 
 
-def get_config():
+def get_config(bind=None):
     """
     Prepare and return alembic config
     These configurations used to live in alembic config initialiser, but that
     just tight coupling. Ideally we should move that to userspace and find a
     way to pass these into alembic commands.
 
+    Migrations of a named bind live in a subdirectory of migrations path
+    named after the bind, and all shards share 'shards' subdirectory.
+
     @todo: think about it
     """
     from boiler.migrations.config import MigrationsConfig
@@ -25,29 +29,73 @@ def get_config():
         metadata='SQLAlchemy metadata'
     )
 
+    if bind is None:
+        bind = selected_bind()
+    if bind == 'all':
+        msg = 'This command runs for a single bind, select one with --bind'
+        raise Exception(msg)
+
     app = bootstrap.get_app()
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    shards = app.config.get('SQLALCHEMY_SHARDS') or []
     params = dict()
     params['path'] = app.config.get(map['path'], 'migrations')
     params['db_url'] = app.config.get(map['db_url'])
     params['metadata'] = db.metadata
 
+    if bind is not None:
+        map['db_url'] = 'SQLALCHEMY_BINDS[{}]'.format(bind)
+        params['db_url'] = binds.get(bind)
+        folder = 'shards' if bind in shards else bind
+        params['path'] = os.path.join(params['path'], folder)
+
     for param, value in params.items():
         if not value:
             msg = 'Configuration error: [{}] is undefined'
             raise Exception(msg.format(map[param]))
 
-    config = MigrationsConfig(**params)
+    # limit autogenerate to tables of the bind
+    tables = None
+    if binds or shards:
+        with app.app_context():
+            tables = [table.name for table in db.get_tables_for_bind(bind)]
+
+    config = MigrationsConfig(bind=bind, tables=tables, **params)
     return config
 
 
+def get_configs():
+    """
+    Get alembic configs of selected bind, or of main database and every
+    bind (including shards) if all binds are selected.
+    """
+    if selected_bind() != 'all':
+        yield get_config()
+        return
+
+    app = bootstrap.get_app()
+    binds = [None] + list(app.config.get('SQLALCHEMY_BINDS') or ())
+    for bind in binds:
+        click.echo(green('Bind: {}'.format(bind or 'default')))
+        yield get_config(bind)
+
+
+def selected_bind():
+    """ Get bind selected with --bind option """
+    context = click.get_current_context(silent=True)
+    return context.meta.get('boiler_db_bind') if context else None
+
+
 # -----------------------------------------------------------------------------
 # Group setup
 # -----------------------------------------------------------------------------
 
 
 @click.group(help=yellow('Database management commands'))
-def cli():
-    pass
+@click.option('--bind', '-b', type=str, default=None, help='Database bind to run command for, "all" for main database and every bind')
+@click.pass_context
+def cli(context, bind):
+    context.meta['boiler_db_bind'] = bind
 
 
 # -----------------------------------------------------------------------------
@@ -134,12 +182,13 @@ def merge(revision, branch_label, message, list_revisions=''):
 @click.option('--revision', type=str, default='head', help='Revision id')
 def up(tag, sql, revision):
     """ Upgrade to revision """
-    alembic_command.upgrade(
-        config=get_config(),
-        revision=revision,
-        sql=sql,
-        tag=tag
-    )
+    for config in get_configs():
+        alembic_command.upgrade(
+            config=config,
+            revision=revision,
+            sql=sql,
+            tag=tag
+        )
 
 
 @cli.command(name='down')
@@ -148,12 +197,13 @@ def up(tag, sql, revision):
 @click.option('--revision', type=str, default='-1', help='Revision id')
 def down(tag, sql, revision):
     """ Downgrade to revision """
-    alembic_command.downgrade(
-        config=get_config(),
-        revision=revision,
-        sql=sql,
-        tag=tag
-    )
+    for config in get_configs():
+        alembic_command.downgrade(
+            config=config,
+            revision=revision,
+            sql=sql,
+            tag=tag
+        )
 
 
 @cli.command(name='show')
@@ -204,10 +254,11 @@ def branches(verbose):
 @click.option('--verbose', '-v', type=bool, is_flag=True, default=False, help='Use more verbose output')
 def current(verbose):
     """ Display current revision """
-    alembic_command.current(
-        config=get_config(),
-        verbose=verbose
-    )
+    for config in get_configs():
+        alembic_command.current(
+            config=config,
+            verbose=verbose
+        )
 
 
 @cli.command()
@@ -216,10 +267,89 @@ def current(verbose):
 @click.option('--revision', type=str, default='head', help='Revision id')
 def stamp(revision, sql, tag):
     """ Stamp db to given revision without migrating """
-    alembic_command.stamp(
-        config=get_config(),
-        revision=revision,
-        sql=sql,
-        tag=tag
-    )
+    for config in get_configs():
+        alembic_command.stamp(
+            config=config,
+            revision=revision,
+            sql=sql,
+            tag=tag
+        )
+
+
+
+@cli.command(name='pool')
+@click.option('--max-age', type=int, default=60, help='Skip process snapshots older than this many seconds')
+def pool(max_age):
+    """ Show connection pool statistics """
+    from boiler.feature.orm import app_engines
+    from boiler.feature.pool_metrics import read_pool_stats, pool_stats
 
+    app = bootstrap.get_app()
+    path = app.config.get('DB_POOL_STATS_PATH')
+    if path:
+        snapshots = read_pool_stats(path, max_age=max_age)
+    else:
+        msg = 'DB_POOL_STATS_PATH is not set, showing this process only'
+        click.echo(yellow(msg))
+        with app.app_context():
+            snapshots = [pool_stats(engine) for engine in app_engines(app)]
+
+    snapshots = [stats for stats in snapshots if stats]
+    if not snapshots:
+        click.echo(red('No pool statistics found'))
+        return
+
+    for stats in snapshots:
+        click.echo(green('\nProcess {} ({} on {}):'.format(
+            stats['pid'],
+            stats['pool'],
+            stats['url']
+        )))
+        click.echo(green('-' * 40))
+        for name in ('size', 'checked_in', 'checked_out', 'overflow',
+                     'checkouts', 'timeouts', 'wait_avg_ms', 'wait_max_ms'):
+            click.echo(yellow(name + ': ') + str(stats[name]))
+
+        click.echo(yellow('wait_histogram:'))
+        for bucket, count in stats['wait_histogram'].items():
+            click.echo('  {:>9} {}'.format(bucket, count))
+
+    click.echo()
+
+
+@cli.command(name='queries')
+@click.option('--max-age', type=int, default=300, help='Skip process snapshots older than this many seconds')
+@click.option('--limit', '-l', type=int, default=20, help='Number of statements to show')
+@click.option('--sort', type=click.Choice(['p95', 'p50', 'count', 'total']), default='p95', help='Sort statements by')
+def queries(max_age, limit, sort):
+    """ Show per-statement query stats """
+    from boiler.feature.query_log import read_query_stats
+
+    app = bootstrap.get_app()
+    path = app.config.get('QUERY_LOG_STATS_PATH')
+    if not path:
+        click.echo(red('QUERY_LOG_STATS_PATH is not set'))
+        return
+
+    stats = read_query_stats(path, max_age=max_age)
+    if not stats:
+        click.echo(red('No query statistics found'))
+        return
+
+    key = sort if sort == 'count' else sort + '_ms'
+    stats = sorted(stats, key=lambda entry: entry[key], reverse=True)
+    click.echo(green('\n{:>8} {:>10} {:>10} {:>10} {:>12}  {}'.format(
+        'count', 'p50 ms', 'p95 ms', 'max ms', 'total ms', 'statement'
+    )))
+    click.echo(green('-' * 80))
+    for entry in stats[:limit]:
+        click.echo('{:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>12.1f}  {}'.format(
+            entry['count'],
+            entry['p50_ms'],
+            entry['p95_ms'],
+            entry['max_ms'],
+            entry['total_ms'],
+            yellow('[{}] '.format(entry['key'])) + entry['sql']
+        ))
+
+    click.echo()
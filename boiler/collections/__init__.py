@@ -1,3 +1,6 @@
+from .base_collection import BaseCollection
 from .paginated_collection import PaginatedCollection
-from .api_collection import ApiCollection
+from .api_collection import SerializedCollection, ApiCollection
 from .pagination import paginate
+from .counters import ExactCount, CappedCount, EstimatedCount, CachedCount
+from .async_collection import AsyncPaginatedCollection, AsyncApiCollection
@@ -1,35 +1,224 @@
 from json import dumps
+from flask import Response, request, stream_with_context
+from sqlalchemy import func
 from boiler.collections import PaginatedCollection
+from boiler.collections.base_collection import BaseCollection
+from boiler.collections.fingerprint import query_fingerprint
 
 
-class ApiCollection(PaginatedCollection):
+class SerializedCollection(BaseCollection):
     """
-    API Collection
-    Works the same way as a paginated collection, but also applies
-    serializer to each item. Useful in API responses.
+    Serialized collection
+    Applies serializer to items of a collection page. Mix it in front of a
+    concrete collection to get serialized iteration, dictionary and json
+    representations of its pages.
+
+    Instead of per-item serialize function you can pass a batch serializer
+    (serialize_many) that receives all items of the page in one call and
+    returns a list of serialized items, which allows to bulk-load related
+    data. Serialized items are memoized per page.
     """
-    def __init__(self, query, *_, serialize_function, **kwargs):
+    def __init__(
+        self,
+        *args,
+        serialize_function=None,
+        serialize_many=None,
+        **kwargs):
+        if not serialize_function and not serialize_many:
+            err = 'Api collection requires either a serialize_function '
+            err += 'or serialize_many to be provided'
+            raise ValueError(err)
+
         self.serializer = serialize_function
-        super().__init__(query, **kwargs)
+        self.batch_serializer = serialize_many
+        self._serialized = None
+        super().__init__(*args, **kwargs)
 
     def __iter__(self):
         """ Performs generator-based iteration through page items """
+        offset = 0
+        serialized = self.serialized_items()
+        while offset < len(serialized):
+            item = serialized[offset]
+            offset += 1
+            yield item
+
+    def _memoized(self):
+        """ Get memoized serialized items unless page changed since """
+        if self._serialized is None or self._serialized[0] is not self.items:
+            return None
+        return self._serialized[1]
+
+    def serialize(self):
+        """
+        Serialize
+        Generates serialized items of current page one by one without
+        memoizing them. Uses memoized items if the page was already
+        serialized.
+
+        :return: generator
+        """
+        if self._memoized() is not None or self.batch_serializer:
+            for item in self.serialized_items():
+                yield item
+            return
+
         offset = 0
         while offset < len(self.items):
             item = self.items[offset]
             offset += 1
             yield self.serializer(item)
 
+    def serialized_items(self):
+        """
+        Serialized items
+        Returns a list of serialized items of current page. Serializes the
+        page once with batch serializer if available or item by item
+        otherwise, and memoizes the result until page changes.
+
+        :return: list
+        """
+        serialized = self._memoized()
+        if serialized is not None:
+            return serialized
+
+        if self.batch_serializer:
+            serialized = list(self.batch_serializer(list(self.items)))
+        else:
+            serialized = [self.serializer(item) for item in self.items]
+
+        if len(serialized) != len(self.items):
+            err = 'Batch serializer returned {} items for a page of {}'
+            raise ValueError(err.format(len(serialized), len(self.items)))
+
+        self._serialized = (self.items, serialized)
+        return serialized
+
     def dict(self):
         """ Returns current collection as a dictionary """
         collection = super().dict()
-        serialized_items = []
-        for item in collection['items']:
-            serialized_items.append(self.serializer(item))
-
-        collection['items'] = serialized_items
+        collection['items'] = list(self.serialized_items())
         return collection
 
     def json(self):
         """ Returns a json representation of collection """
-        return dumps(self.dict())
\ No newline at end of file
+        return dumps(self.dict())
+
+    def stream(self):
+        """
+        Stream
+        Generates json representation of collection in chunks, serializing
+        one item at a time. Unlike json() never holds the whole serialized
+        page in memory, which keeps memory flat on large pages.
+
+        :return: generator of str
+        """
+        collection = super().dict()
+        del collection['items']
+        head = dumps(collection)
+        yield head[:-1] + ', "items": ['
+
+        for index, item in enumerate(self.serialize()):
+            yield (', ' if index else '') + dumps(item)
+
+        yield ']}'
+
+    def stream_response(self, status=200, headers=None):
+        """
+        Stream response
+        Returns flask response that streams json representation of
+        collection to the client as it is being generated. Keeps request
+        context around while streaming so serializers can still lazy-load.
+
+        :param status: int, response status code
+        :param headers: dict, additional response headers
+        :return: flask.Response
+        """
+        return Response(
+            stream_with_context(self.stream()),
+            status=status,
+            headers=headers,
+            mimetype='application/json'
+        )
+
+
+class ApiCollection(SerializedCollection, PaginatedCollection):
+    """
+    API Collection
+    Works the same way as a paginated collection, but also applies
+    serializer to each item (see SerializedCollection). Useful in API
+    responses.
+
+    For polled endpoints use conditional_response() that computes a cheap
+    fingerprint of the collection and answers conditional requests with
+    304 Not Modified before fetching or serializing any items. It requires
+    a version column (like updated-at timestamp), otherwise in-place
+    updates of rows would be answered with stale 304 responses.
+    """
+    @classmethod
+    def fingerprint(cls, query, *_, version_column=None, **kwargs):
+        """
+        Fingerprint
+        Computes an etag for a collection without fetching its items. Mixes
+        query SQL and parameters, pagination settings and an aggregate of
+        matching rows: their count and, if given, maximum value of version
+        column (like updated-at timestamp or row version). Without version
+        column in-place updates of rows are not detected.
+
+        :param query: sqlalchemy.orm.Query
+        :param _: args, ignored
+        :param version_column: column, max of which changes on updates
+        :param kwargs: collection parameters
+        :return: str
+        """
+        aggregates = [func.count()]
+        if version_column is not None:
+            aggregates.append(func.max(version_column))
+
+        stats = query.order_by(None).with_entities(*aggregates).one()
+        params = [kwargs.get(name) for name in cls.fingerprint_params]
+        keyset = [str(column) for column in kwargs.get('keyset') or []]
+        return query_fingerprint(query, params, keyset, tuple(stats))
+
+    fingerprint_params = ('page', 'per_page', 'pagination_range', 'cursor')
+
+    @classmethod
+    def conditional_response(
+        cls,
+        query,
+        *_,
+        version_column,
+        stream=False,
+        **kwargs):
+        """
+        Conditional response
+        Returns a flask response for collection with an etag set. If request
+        has a matching If-None-Match header responds with 304 Not Modified
+        without creating the collection, so items are never hydrated or
+        serialized. Must be called within request context.
+
+        Version column is required: count of rows alone does not change
+        when rows are updated in place, so clients would keep getting
+        304 responses for stale data.
+
+        :param query: sqlalchemy.orm.Query
+        :param _: args, ignored
+        :param version_column: column, max of which changes on updates
+        :param stream: bool, stream response body
+        :param kwargs: collection parameters
+        :return: flask.Response
+        """
+        etag = cls.fingerprint(query, version_column=version_column, **kwargs)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        collection = cls(query, **kwargs)
+        if stream:
+            response = collection.stream_response()
+        else:
+            response = Response(collection.json(), mimetype='application/json')
+
+        response.set_etag(etag)
+        return response
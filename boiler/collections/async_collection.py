@@ -0,0 +1,124 @@
+from math import ceil
+from sqlalchemy import func, select
+from boiler.collections.base_collection import BaseCollection
+from boiler.collections.api_collection import SerializedCollection
+
+
+class AsyncPaginatedCollection(BaseCollection):
+    """
+    Async paginated collection
+    Works the same way as a paginated collection, but executes queries on
+    an asyncio session. Accepts a select statement instead of a query and
+    must be awaited to fetch the first page:
+
+        collection = await AsyncPaginatedCollection(session, select(User))
+
+    Only offset pagination is supported in async mode. Columnar export and
+    streaming of all items need a sync query and are only available on
+    sync collections.
+    """
+    def __init__(
+        self,
+        session,
+        statement,
+        *_,
+        page=1,
+        per_page=10,
+        pagination_range=5):
+        """
+        Initialise collection
+        Creates an instance of collection. Nothing is fetched until
+        collection is awaited.
+
+        :param session: sqlalchemy.ext.asyncio.AsyncSession
+        :param statement: sqlalchemy select statement
+        :param _: args, ignored
+        :param page: int, page to fetch
+        :param per_page: int, items per page
+        :param pagination_range: int, number of pages in pagination
+        """
+        self.session = session
+        super().__init__(
+            statement,
+            page=page,
+            per_page=per_page,
+            pagination_range=pagination_range
+        )
+
+    def __await__(self):
+        """ Fetch totals and first page when awaited """
+        return self.load().__await__()
+
+    async def load(self):
+        """
+        Load
+        Counts total items and fetches current page.
+
+        :return: AsyncPaginatedCollection
+        """
+        statement = select(func.count()).select_from(
+            self._query.order_by(None).subquery()
+        )
+        self.total_items = (await self.session.execute(statement)).scalar()
+        self.total_pages = ceil(self.total_items / self.per_page)
+        self.items = await self.fetch_items()
+        self.pagination = self.paginate()
+        return self
+
+    async def fetch_items(self):
+        """
+        Fetch items
+        Performs a query to retrieve items based on current query and
+        pagination settings.
+        """
+        offset = self.per_page * (self.page - 1)
+        statement = self._query.limit(self.per_page).offset(offset)
+        result = await self.session.execute(statement)
+        if len(self._query.column_descriptions) == 1:
+            return result.scalars().all()
+        return result.all()
+
+    async def next_page(self):
+        """
+        Next page
+        Fetches next slice of items unless on last page in which case
+        does nothing
+        """
+        if self.is_last_page():
+            return False
+
+        self.page += 1
+        self.items = await self.fetch_items()
+        self.pagination = self.paginate()
+        return True
+
+    async def previous_page(self):
+        """
+        Previous page
+        Fetches previous slice of items unless on first page in which case
+        does nothing
+        """
+        if self.is_first_page():
+            return False
+
+        self.page -= 1
+        self.items = await self.fetch_items()
+        self.pagination = self.paginate()
+        return True
+
+
+class AsyncApiCollection(SerializedCollection, AsyncPaginatedCollection):
+    """
+    Async API collection
+    Async paginated collection that applies serializer to page items, the
+    same way API collection does.
+
+        collection = await AsyncApiCollection(
+            session,
+            select(User),
+            serialize_function=serializer
+        )
+
+    Fingerprints and conditional responses query the database
+    synchronously and are only available on sync API collection.
+    """
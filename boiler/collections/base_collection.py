@@ -0,0 +1,121 @@
+from boiler.collections.pagination import paginate
+
+
+class BaseCollection:
+    """
+    Base collection
+    Holds state of a page of items along with totals and pagination, and
+    everything that can be derived from it without querying the database.
+    Fetching is left to concrete collections, so that sync and async
+    collections can share page logic without inheriting each other's
+    fetching methods.
+    """
+    def __init__(
+        self,
+        query,
+        *_,
+        page=1,
+        per_page=10,
+        pagination_range=5):
+        """
+        Initialise collection
+        Sets up an empty page of collection. Nothing is fetched.
+
+        :param query: query or statement to fetch items with
+        :param _: args, ignored
+        :param page: int, page to fetch
+        :param per_page: int, items per page
+        :param pagination_range: int, number of pages in pagination
+        """
+        self._query = query
+        self.page = page
+        self.per_page = per_page
+        self.pagination_range = pagination_range
+        self.keyset = None
+        self.cursor = None
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.total_items = None
+        self.total_exact = True
+        self.total_pages = None
+        self.items = []
+        self.pagination = None
+
+    def __repr__(self):
+        """ Get  printable representation of collection """
+        data = 'page="{}" per_page="{}" total_items="{}" total_pages="{}" '
+        data += 'items="[...]"' if len(list(self.items)) > 0 else 'items="[]"'
+        class_name = self.__class__.__name__
+        printable = '<{} {}>'.format(class_name, data)
+        return printable.format(
+            self.page,
+            self.per_page,
+            self.total_items,
+            self.total_pages
+        )
+
+    def __iter__(self):
+        """ Performs generator-based iteration through page items """
+        offset = 0
+        while offset < len(self.items):
+            item = self.items[offset]
+            offset += 1
+            yield item
+
+    def paginate(self):
+        """
+        Paginate
+        Generates pagination links for current page. In keyset mode
+        links will also contain next and previous cursors.
+        """
+        cursors = None
+        if self.keyset:
+            cursors = dict(next=self.next_cursor, previous=self.previous_cursor)
+
+        pagination = paginate(
+            page=self.page,
+            total_pages=self.total_pages,
+            total_items=self.total_items,
+            slice_size=self.pagination_range,
+            cursors=cursors,
+            exact=self.total_exact
+        )
+        return pagination['pagination']
+
+    def dict(self):
+        """ Returns current collection as a dictionary """
+        collection = dict(
+            page=self.page,
+            per_page=self.per_page,
+            total_items=self.total_items,
+            total_pages=self.total_pages,
+            total_exact=self.total_exact,
+            pagination=self.pagination,
+            items=list(self.items)
+        )
+
+        if self.keyset:
+            collection['next_cursor'] = self.next_cursor
+            collection['previous_cursor'] = self.previous_cursor
+
+        return collection
+
+    def is_first_page(self):
+        """ Check if we are on the first page """
+        if self.keyset:
+            return self.previous_cursor is None
+        return self.page == 1
+
+    def is_last_page(self):
+        """ Checks if we are on the last page """
+        if self.keyset:
+            return self.next_cursor is None
+        if not self.total_exact:
+            return len(self.items) < self.per_page
+        return self.page == self.total_pages
+
+    @property
+    def total_label(self):
+        """ Printable total items, e.g. 10,000+ for inexact counts """
+        label = '{:,}'.format(self.total_items)
+        return label if self.total_exact else label + '+'
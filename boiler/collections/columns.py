@@ -0,0 +1,80 @@
+from array import array
+from sqlalchemy import types
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def column_typecode(column_type):
+    """
+    Column typecode
+    Maps SQLAlchemy column type to array typecode. Returns None for types
+    that have no fixed-width representation (strings, dates etc.)
+
+    :param column_type: sqlalchemy type instance
+    :return: str or None
+    """
+    if isinstance(column_type, types.Boolean):
+        return 'b'
+    if isinstance(column_type, types.Integer):
+        return 'q'
+    if isinstance(column_type, (types.Float, types.Numeric)):
+        return 'd'
+    return None
+
+
+def to_array(values, typecode):
+    """
+    To array
+    Converts a column of values to a contiguous typed array. Uses numpy
+    when installed and standard library array.array otherwise. Values that
+    can't be packed (strings, dates or integers with nulls) stay a numpy
+    object array or a plain list.
+
+    :param values: tuple, column values
+    :param typecode: str or None, array typecode
+    :return: numpy.ndarray, array.array or list
+    """
+    has_nulls = None in values
+    if numpy is not None:
+        if typecode == 'd':
+            return numpy.array(values, dtype='float64')
+        if typecode in ('b', 'q') and not has_nulls:
+            dtype = 'bool' if typecode == 'b' else 'int64'
+            return numpy.array(values, dtype=dtype)
+        if typecode is None and not has_nulls:
+            return numpy.array(values)
+        return numpy.array(values, dtype=object)
+
+    if typecode is None or has_nulls:
+        return list(values)
+    if typecode == 'd':
+        return array(typecode, (float(value) for value in values))
+    return array(typecode, values)
+
+
+def to_columns(query, reverse=False):
+    """
+    To columns
+    Executes column-projected query and returns its results transposed
+    into a dictionary of typed arrays, one per column, without building
+    model instances.
+
+    :param query: sqlalchemy.orm.Query, projected with columns
+    :param reverse: bool, reverse order of rows
+    :return: dict
+    """
+    descriptions = query.column_descriptions
+    rows = query.all()
+    if reverse:
+        rows.reverse()
+    data = list(zip(*rows)) if rows else [()] * len(descriptions)
+
+    columns = dict()
+    for description, values in zip(descriptions, data):
+        typecode = column_typecode(description['type'])
+        columns[description['name']] = to_array(values, typecode)
+
+    return columns
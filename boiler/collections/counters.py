@@ -0,0 +1,170 @@
+from sqlalchemy import func, inspect
+from boiler.collections.dialects import query_entity, query_bind
+
+
+def flat_count(query):
+    """
+    Flat count
+    Counts rows of a plain single-entity query as SELECT count(primary key)
+    with the same criteria, instead of wrapping the whole query into a
+    subquery the way query.count() does, which is cheaper to build and run.
+    Falls back to query.count() for anything that changes the number of
+    rows (distinct, grouping, limits) or selects from custom statements.
+
+    :param query: sqlalchemy.orm.Query
+    :return: int
+    """
+    entity = query_entity(query)
+    flat = entity is not None and not query._distinct
+    flat = flat and not query._group_by_clauses
+    flat = flat and not query._having_criteria and not query._from_obj
+    flat = flat and query._statement is None
+    flat = flat and query._limit_clause is None
+    flat = flat and query._offset_clause is None
+    if not flat:
+        return query.count()
+
+    # count mapped attribute, so that inheritance criteria are kept
+    mapper = inspect(entity)
+    prop = mapper.get_property_by_column(mapper.primary_key[0])
+    key = getattr(entity, prop.key)
+    return query.with_entities(func.count(key)).order_by(None).scalar()
+
+
+class ExactCount:
+    """
+    Exact count
+    Default counting strategy. Issues a full COUNT over the query every time
+    the collection is created.
+    """
+    def count(self, query):
+        """
+        Count
+        Returns a tuple of total items and a flag whether the number is exact.
+
+        :param query: sqlalchemy.orm.Query
+        :return: tuple, (total, exact)
+        """
+        return flat_count(query), True
+
+
+class CappedCount:
+    """
+    Capped count
+    Counts at most cap + 1 rows, so the database can stop scanning early. If
+    there are more rows than the cap, reports the cap and marks the total as
+    inexact, to be displayed as something like "10,000+".
+    """
+    def __init__(self, cap=10000):
+        self.cap = cap
+
+    def count(self, query):
+        """
+        Count
+        Returns a tuple of total items and a flag whether the number is exact.
+
+        :param query: sqlalchemy.orm.Query
+        :return: tuple, (total, exact)
+        """
+        total = query.order_by(None).limit(self.cap + 1).count()
+        if total > self.cap:
+            return self.cap, False
+
+        return total, True
+
+
+class EstimatedCount(CappedCount):
+    """
+    Estimated count
+    Asks the query planner for an estimated number of rows instead of
+    counting them. Small estimates are verified with a capped count, so
+    short lists still get exact totals. Planner statistics are only read on
+    PostgreSQL, other backends fall back to a capped count.
+    """
+    def count(self, query):
+        """
+        Count
+        Returns a tuple of total items and a flag whether the number is exact.
+
+        :param query: sqlalchemy.orm.Query
+        :return: tuple, (total, exact)
+        """
+        estimate = self.estimate(query)
+        if estimate is None or estimate <= self.cap:
+            return super().count(query)
+
+        return estimate, False
+
+    def estimate(self, query):
+        """
+        Estimate
+        Returns planner estimate of rows the query returns or None if
+        the backend does not support it or EXPLAIN fails. Query is compiled
+        with bound parameters, so that values are passed to the driver as
+        they are rather than rendered into SQL.
+
+        :param query: sqlalchemy.orm.Query
+        :return: int or None
+        """
+        query = query.order_by(None)
+        dialect = query_bind(query).dialect
+        if dialect.name != 'postgresql':
+            return None
+
+        compiled = query.statement.compile(dialect=dialect)
+        params = compiled.params
+        if compiled.positional:
+            params = tuple(params[name] for name in compiled.positiontup)
+
+        # savepoint keeps transaction usable if EXPLAIN fails
+        connection = query.session.connection()
+        sql = 'EXPLAIN (FORMAT JSON) ' + str(compiled)
+        try:
+            with connection.begin_nested():
+                plan = connection.exec_driver_sql(sql, params).scalar()
+        except Exception:
+            return None
+
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CachedCount:
+    """
+    Cached count
+    Wraps another counting strategy and remembers its results for a period
+    of time. Results are keyed by compiled SQL and bound parameters of the
+    query and are stored in a result cache, so they get invalidated when
+    services commit changes to counted models. Create one instance and
+    share it between requests.
+    """
+    def __init__(self, ttl=60, strategy=None, max_size=1024, cache=None):
+        """
+        Initialise counter
+
+        :param ttl: int, seconds to keep counts for
+        :param strategy: object, counting strategy to cache (exact default)
+        :param max_size: int, maximum number of cached counts
+        :param cache: boiler.cache.ResultCache, shared cache to use
+        """
+        from boiler.cache import ResultCache, MemoryBackend
+        self.strategy = strategy or ExactCount()
+        if cache is None:
+            cache = ResultCache(MemoryBackend(max_size=max_size), ttl=ttl)
+        self.cache = cache
+
+    def count(self, query):
+        """
+        Count
+        Returns a tuple of total items and a flag whether the number is exact.
+
+        :param query: sqlalchemy.orm.Query
+        :return: tuple, (total, exact)
+        """
+        strategy = type(self.strategy).__name__
+        settings = sorted(vars(self.strategy).items())
+        creator = lambda: self.strategy.count(query)
+        return self.cache.get_or_set(query, creator, strategy, settings)
+
+    def clear(self):
+        """ Forget all cached counts """
+        self.cache.clear()
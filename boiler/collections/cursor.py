@@ -0,0 +1,164 @@
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as BinasciiError
+from datetime import datetime, date
+from decimal import Decimal
+from uuid import UUID
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from boiler import exceptions as x
+
+
+def keyset_columns(order_by):
+    """
+    Keyset columns
+    Normalizes a list of ordering columns into a list of (column, descending)
+    tuples. Columns can be given as plain model attributes for ascending
+    order or wrapped in .desc()/.asc() for explicit direction.
+
+    :param order_by: list, ordering columns
+    :return: list
+    """
+    columns = []
+    for column in order_by:
+        descending = False
+        if isinstance(column, UnaryExpression):
+            descending = column.modifier == operators.desc_op
+            column = column.element
+        columns.append((column, descending))
+
+    if not columns:
+        err = 'Keyset pagination requires at least one ordering column'
+        raise x.BoilerException(err)
+
+    return columns
+
+
+def keyset_order(columns, reverse=False):
+    """
+    Keyset order
+    Returns order by clauses for keyset columns, optionally reversing
+    the direction to walk backwards.
+
+    :param columns: list, normalized keyset columns
+    :param reverse: bool, reverse direction
+    :return: list
+    """
+    clauses = []
+    for column, descending in columns:
+        if descending != reverse:
+            clauses.append(column.desc())
+        else:
+            clauses.append(column.asc())
+    return clauses
+
+
+def keyset_filter(columns, values, reverse=False):
+    """
+    Keyset filter
+    Builds a where clause that seeks past the row with given values in the
+    order defined by keyset columns. Expands to
+    (a > x) OR (a = x AND b > y) ... so that mixed directions work on
+    every backend.
+
+    :param columns: list, normalized keyset columns
+    :param values: list, values of the row to seek past
+    :param reverse: bool, seek backwards
+    :return: sqlalchemy clause
+    """
+    conditions = []
+    for index, (column, descending) in enumerate(columns):
+        equal = [c == v for (c, _), v in zip(columns[:index], values[:index])]
+        value = values[index]
+        if descending != reverse:
+            seek = column < value
+        else:
+            seek = column > value
+        conditions.append(and_(*equal, seek))
+
+    return or_(*conditions)
+
+
+def keyset_values(columns, item):
+    """
+    Keyset values
+    Extracts values of keyset columns from a query result item, which
+    can be either a model instance or a result row.
+
+    :param columns: list, normalized keyset columns
+    :param item: object, query result item
+    :return: list
+    """
+    values = []
+    for column, _ in columns:
+        values.append(getattr(item, column.key))
+    return values
+
+
+def _encode_value(value):
+    """ Encode a single value to json-friendly structure """
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'$dec': str(value)}
+    if isinstance(value, UUID):
+        return {'$uuid': str(value)}
+    return value
+
+
+def _decode_value(value):
+    """ Decode a single value from json-friendly structure """
+    if not isinstance(value, dict):
+        return value
+    if '$dt' in value:
+        return datetime.fromisoformat(value['$dt'])
+    if '$d' in value:
+        return date.fromisoformat(value['$d'])
+    if '$dec' in value:
+        return Decimal(value['$dec'])
+    if '$uuid' in value:
+        return UUID(value['$uuid'])
+
+    err = 'Unsupported value in cursor: {}'
+    raise x.InvalidCursor(err.format(value))
+
+
+def encode_cursor(values, direction='next'):
+    """
+    Encode cursor
+    Packs keyset values and walk direction into an opaque url-safe token.
+
+    :param values: list, keyset values
+    :param direction: str, 'next' or 'previous'
+    :return: str
+    """
+    payload = dict(d=direction, v=[_encode_value(v) for v in values])
+    data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode cursor
+    Unpacks an opaque cursor token into direction and keyset values. Raises
+    an InvalidCursor exception on malformed tokens.
+
+    :param cursor: str, cursor token
+    :return: tuple, (direction, values)
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(urlsafe_b64decode(padded.encode('ascii')))
+        direction = payload['d']
+        values = [_decode_value(v) for v in payload['v']]
+    except (ValueError, TypeError, KeyError, BinasciiError) as e:
+        err = 'Unable to decode pagination cursor: {}'
+        raise x.InvalidCursor(err.format(e))
+
+    if direction not in ('next', 'previous') or not isinstance(values, list):
+        raise x.InvalidCursor('Malformed pagination cursor')
+
+    return direction, values
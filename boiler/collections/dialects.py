@@ -0,0 +1,61 @@
+from sqlalchemy import inspect
+
+
+def query_entity(query):
+    """
+    Query entity
+    Returns mapped class of a single-entity query or None if the query
+    selects several entities or plain columns.
+
+    :param query: sqlalchemy.orm.Query
+    :return: class or None
+    """
+    descriptions = query.column_descriptions
+    if len(descriptions) != 1:
+        return None
+
+    entity = descriptions[0].get('entity')
+    if entity is None or descriptions[0].get('type') is not entity:
+        return None
+
+    return entity
+
+
+def query_bind(query):
+    """
+    Query bind
+    Returns the engine (or connection) query will be executed against,
+    taking mapper-level binds into account.
+
+    :param query: sqlalchemy.orm.Query
+    :return: sqlalchemy.engine.Engine
+    """
+    entity = query_entity(query)
+    mapper = inspect(entity) if entity is not None else None
+    return query.session.get_bind(mapper=mapper, clause=query.statement)
+
+
+def supports_window_functions(bind):
+    """
+    Supports window functions?
+    Checks whether database behind the bind can run window functions like
+    COUNT(*) OVER(). SQLite got them in 3.25, MySQL in 8.0 and MariaDB in
+    10.2. MySQL version is only known after first connection, so until then
+    we assume there's no support.
+
+    :param bind: sqlalchemy.engine.Engine or Connection
+    :return: bool
+    """
+    dialect = bind.dialect
+    if dialect.name == 'sqlite':
+        return dialect.dbapi.sqlite_version_info >= (3, 25, 0)
+
+    if dialect.name == 'mysql':
+        version = dialect.server_version_info
+        if not version:
+            return False
+        if getattr(dialect, 'is_mariadb', False):
+            return version >= (10, 2)
+        return version >= (8, 0)
+
+    return True
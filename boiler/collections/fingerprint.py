@@ -0,0 +1,25 @@
+from hashlib import sha1
+
+
+def query_fingerprint(query, *extra):
+    """
+    Query fingerprint
+    Returns a stable hash of a query built from its compiled SQL and bound
+    parameters. Two queries of the same shape with the same parameters
+    produce the same fingerprint, which makes it suitable as a cache key.
+    Any extra values are mixed into the hash as well.
+
+    :param query: sqlalchemy.orm.Query or select statement
+    :param extra: args, additional values to hash
+    :return: str
+    """
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile()
+    params = sorted(compiled.params.items())
+
+    digest = sha1(str(compiled).encode('utf-8'))
+    digest.update(repr(params).encode('utf-8'))
+    for value in extra:
+        digest.update(repr(value).encode('utf-8'))
+
+    return digest.hexdigest()
@@ -1,17 +1,56 @@
 from math import ceil
-from boiler.collections.pagination import paginate
+from sqlalchemy import inspect, func
+from sqlalchemy.orm.state import InstanceState
+from boiler.collections.base_collection import BaseCollection
+from boiler.collections.counters import ExactCount, CachedCount
+from boiler.collections.dialects import query_entity, query_bind
+from boiler.collections.dialects import supports_window_functions
+from boiler.collections.columns import to_columns
+from boiler.collections.cursor import keyset_columns, keyset_order
+from boiler.collections.cursor import keyset_filter, keyset_values
+from boiler.collections.cursor import encode_cursor, decode_cursor
+from boiler import exceptions as x
 from pprint import pprint as pp
 
 
-class PaginatedCollection:
+class PaginatedCollection(BaseCollection):
     """
     Paginated collection
     Accepts an SQLAlchemy query object on initialization along with some
     pagination settings and then allows you to iterate over itself in a
     paginated manner: iterate over items in current page then call next_page()
     to fetch next slice of data.
+
+    When given a list of keyset columns the collection switches to keyset
+    (seek) pagination: instead of skipping rows with an offset it filters
+    past the last seen row and exposes opaque next/previous cursors. Keyset
+    columns must uniquely identify a row, so end the list with a primary key.
+
+    Totals are computed by a pluggable counting strategy (see
+    boiler.collections.counters), which allows to cache or cap expensive
+    counts on big tables. Capped or estimated totals are marked as inexact.
+
+    With window_count enabled collection gets total and page items in a
+    single round trip by adding a COUNT(*) OVER() column to the page query.
+    This only applies to single-entity offset pagination without DISTINCT
+    or limits on backends that support window functions, otherwise it
+    falls back to two queries.
+
+    Pass a boiler.cache.ResultCache to cache page items and totals. Cached
+    results are invalidated when services commit changes to their models.
     """
-    def __init__(self, query, *_, page=1, per_page=10, pagination_range=5):
+    def __init__(
+        self,
+        query,
+        *_,
+        page=1,
+        per_page=10,
+        pagination_range=5,
+        keyset=None,
+        cursor=None,
+        counter=None,
+        window_count=False,
+        cache=None):
         """
         Initialise collection
         Creates an instance of collection. Requires an query object to
@@ -24,44 +63,34 @@ class PaginatedCollection:
         :param page: int, page to fetch
         :param per_page: int, items per page
         :param pagination_range: int, number of pages in pagination
+        :param keyset: list, ordering columns to enable keyset pagination
+        :param cursor: str, keyset cursor token to fetch page for
+        :param counter: object, counting strategy, defaults to exact count
+        :param window_count: bool, count and fetch page in one query
+        :param cache: boiler.cache.ResultCache, cache results in this cache
         """
-        self._query = query
-        self.page = page
-        self.per_page = per_page
-        self.total_items = self._query.count()
-        self.total_pages = ceil(self.total_items / per_page)
-
-        # paginate
-        self.pagination = paginate(
+        super().__init__(
+            query,
             page=page,
-            total_pages=self.total_pages,
-            total_items=self.total_items,
-            slice_size=pagination_range
-        )['pagination']
+            per_page=per_page,
+            pagination_range=pagination_range
+        )
+        self.keyset = keyset_columns(keyset) if keyset else None
+        self.cursor = cursor
+        self.cache = cache
+        if counter is None and cache is not None:
+            counter = CachedCount(cache=cache)
+        self.counter = counter or ExactCount()
+        self.window_count = window_count and self._can_window_count()
+        if not self.window_count:
+            self.total_items, self.total_exact = self.counter.count(query)
 
         # fetch items
         self.items = self.fetch_items()
+        self.total_pages = ceil(self.total_items / per_page)
 
-    def __repr__(self):
-        """ Get  printable representation of collection """
-        data = 'page="{}" per_page="{}" total_items="{}" total_pages="{}" '
-        data += 'items="[...]"' if len(list(self.items)) > 0 else 'items="[]"'
-        class_name = self.__class__.__name__
-        printable = '<{} {}>'.format(class_name, data)
-        return printable.format(
-            self.page,
-            self.per_page,
-            self.total_items,
-            self.total_pages
-        )
-
-    def __iter__(self):
-        """ Performs generator-based iteration through page items """
-        offset = 0
-        while offset < len(self.items):
-            item = self.items[offset]
-            offset += 1
-            yield item
+        # paginate
+        self.pagination = self.paginate()
 
     def fetch_items(self):
         """
@@ -69,29 +98,201 @@ class PaginatedCollection:
         Performs a query to retrieve items based on current query and
         pagination settings.
         """
+        if self.keyset:
+            return self.fetch_keyset_items()
+        if self.window_count:
+            return self.fetch_window_items()
+
         offset = self.per_page * (self.page - 1)
-        items = self._query.limit(self.per_page).offset(offset).all()
+        items = self._all(self._query.limit(self.per_page).offset(offset))
         return items
 
-    def dict(self):
-        """ Returns current collection as a dictionary """
-        collection = dict(
-            page=self.page,
-            per_page=self.per_page,
-            total_items=self.total_items,
-            total_pages=self.total_pages,
-            pagination=self.pagination,
-            items=list(self.items)
-        )
-        return collection
+    def _all(self, query, rows=False):
+        """ Get all results of query (as tuples if rows), maybe cached """
+        fetch = query.all
+        if rows:
+            fetch = lambda: [tuple(row) for row in query.all()]
+        if self.cache is not None:
+            return self.cache.get_or_set(query, fetch)
+        return fetch()
 
-    def is_first_page(self):
-        """ Check if we are on the first page """
-        return self.page == 1
+    def fetch_window_items(self):
+        """
+        Fetch window items
+        Fetches page items along with a window count of total items in a
+        single query. Updates totals as a side effect. Out of range pages
+        have no rows to carry the count, so we count separately then.
+        """
+        offset = self.per_page * (self.page - 1)
+        total = func.count().over().label('boiler_total_items')
+        query = self._query.add_columns(total)
+        rows = self._all(query.limit(self.per_page).offset(offset), rows=True)
+        if rows:
+            self.total_items = rows[0][-1]
+            self.total_exact = True
+        else:
+            self.total_items, self.total_exact = self.counter.count(self._query)
+
+        self.total_pages = ceil(self.total_items / self.per_page)
+        return [row[0] for row in rows]
+
+    def _keyset_query(self, query):
+        """
+        Keyset query
+        Orders query by keyset columns and seeks past the row encoded in
+        current cursor. Returns the query along with decoded cursor values
+        and a flag whether we are walking backwards.
+        """
+        direction, values = 'next', None
+        if self.cursor:
+            direction, values = decode_cursor(self.cursor)
+            if len(values) != len(self.keyset):
+                err = 'Cursor does not match collection keyset columns'
+                raise x.InvalidCursor(err)
+
+        reverse = direction == 'previous'
+        order = keyset_order(self.keyset, reverse=reverse)
+        query = query.order_by(None).order_by(*order)
+        if values is not None:
+            seek = keyset_filter(self.keyset, values, reverse=reverse)
+            query = query.filter(seek)
+
+        return query, values, reverse
+
+    def _can_window_count(self):
+        """
+        Can window count?
+        Checks if window count can be used with this collection. Window
+        functions are evaluated before DISTINCT, limit and offset, so such
+        queries are counted separately.
+        """
+        query = self._query
+        if self.keyset or len(query.column_descriptions) != 1:
+            return False
+        if query._distinct or query._limit_clause is not None:
+            return False
+        if query._offset_clause is not None:
+            return False
+
+        return supports_window_functions(query_bind(self._query))
 
-    def is_last_page(self):
-        """ Checks if we are on the last page """
-        return self.page == self.total_pages
+    def fetch_keyset_items(self):
+        """
+        Fetch keyset items
+        Seeks past the row encoded in current cursor and fetches one extra
+        item to find out whether there is more data in the walk direction.
+        Updates next and previous cursors as a side effect.
+        """
+        query, values, reverse = self._keyset_query(self._query)
+        items = self._all(query.limit(self.per_page + 1))
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if reverse:
+            items.reverse()
+
+        self.next_cursor = None
+        self.previous_cursor = None
+        if not items:
+            return items
+
+        first = keyset_values(self.keyset, items[0])
+        last = keyset_values(self.keyset, items[-1])
+        if (reverse and has_more) or (not reverse and values is not None):
+            self.previous_cursor = encode_cursor(first, 'previous')
+        if (not reverse and has_more) or reverse:
+            self.next_cursor = encode_cursor(last, 'next')
+
+        return items
+
+    def to_columns(self, columns):
+        """
+        To columns
+        Fetches current page projected to given columns and returns it as
+        a dictionary of contiguous typed arrays keyed by column name: numpy
+        arrays when numpy is installed, array.array otherwise. Does not
+        build model instances, which makes it useful for analytics.
+
+        :param columns: list, columns or expressions to project
+        :return: dict
+        """
+        query = self._query.with_entities(*columns)
+        if not self.keyset:
+            offset = self.per_page * (self.page - 1)
+            return to_columns(query.limit(self.per_page).offset(offset))
+
+        query, _, reverse = self._keyset_query(query)
+        return to_columns(query.limit(self.per_page), reverse=reverse)
+
+    def iter_all(self, chunk_size=1000, expunge=True):
+        """
+        Iterate all
+        Streams every item of the underlying query regardless of current
+        page, keeping memory bounded. Uses server-side cursors where the
+        driver supports them, otherwise walks the query in keyset chunks
+        (by collection keyset or primary key). Yielded model instances are
+        expunged from session once consumed, so do not modify them expecting
+        changes to be persisted. Items of current page are left in session.
+
+        :param chunk_size: int, rows to fetch per round trip
+        :param expunge: bool, expunge instances from session as we go
+        :return: generator
+        """
+        dialect = query_bind(self._query).dialect
+        columns = self.keyset or self._primary_key_columns()
+        if dialect.supports_server_side_cursors or not columns:
+            items = self._iter_streamed(chunk_size)
+        else:
+            items = self._iter_keyset_chunks(columns, chunk_size)
+
+        session = self._query.session
+        page = set(id(item) for item in self.items)
+        for item in items:
+            yield item
+            if expunge and id(item) not in page:
+                state = inspect(item, raiseerr=False)
+                if isinstance(state, InstanceState) and item in session:
+                    session.expunge(item)
+
+    def _iter_streamed(self, chunk_size):
+        """ Iterate query results with server-side cursor """
+        query = self._query.execution_options(stream_results=True)
+        for item in query.yield_per(chunk_size):
+            yield item
+
+    def _iter_keyset_chunks(self, columns, chunk_size):
+        """ Iterate query results in keyset chunks """
+        order = keyset_order(columns)
+        query = self._query.order_by(None).order_by(*order)
+        values = None
+        while True:
+            chunk_query = query
+            if values is not None:
+                chunk_query = query.filter(keyset_filter(columns, values))
+
+            chunk = chunk_query.limit(chunk_size).all()
+            if not chunk:
+                return
+
+            values = keyset_values(columns, chunk[-1])
+            for item in chunk:
+                yield item
+
+            if len(chunk) < chunk_size:
+                return
+
+    def _primary_key_columns(self):
+        """ Get keyset columns for primary key of query entity """
+        entity = query_entity(self._query)
+        if entity is None:
+            return None
+
+        mapper = inspect(entity)
+        columns = []
+        for column in mapper.primary_key:
+            key = mapper.get_property_by_column(column).key
+            columns.append(getattr(entity, key))
+
+        return keyset_columns(columns)
 
     def next_page(self):
         """
@@ -102,8 +303,12 @@ class PaginatedCollection:
         if self.is_last_page():
             return False
 
+        if self.keyset:
+            self.cursor = self.next_cursor
+
         self.page += 1
         self.items = self.fetch_items()
+        self.pagination = self.paginate()
         return True
 
     def previous_page(self):
@@ -115,12 +320,10 @@ class PaginatedCollection:
         if self.is_first_page():
             return False
 
+        if self.keyset:
+            self.cursor = self.previous_cursor
+
         self.page -= 1
         self.items = self.fetch_items()
+        self.pagination = self.paginate()
         return True
-
-
-
-
-
-
@@ -1,7 +1,13 @@
 import math
 
 
-def paginate(page, total_items, total_pages, slice_size=5):
+def paginate(
+    page,
+    total_items,
+    total_pages,
+    slice_size=5,
+    cursors=None,
+    exact=True):
     """
     Paginate
     Does some maths to generate ranged pagination. Returns a dictionary
@@ -25,8 +31,23 @@ def paginate(page, total_items, total_pages, slice_size=5):
             }
 
         }
+
+    When cursors dictionary is passed (keyset pagination) only the links that
+    can be followed with a cursor are generated: first page, previous and
+    next pages along with their next_cursor and previous_cursor tokens.
+
+    When total is not exact (capped or estimated count) or total_pages is
+    unknown (None), total_pages is treated as a lower bound: there is no
+    last page link and next page is always available past the bound.
+
     :return: boiler.collections.paginated_collection.PaginatedCollection
     """
+    if cursors is not None:
+        return paginate_cursors(page, total_items, total_pages, cursors)
+
+    if total_pages is None or not exact:
+        return paginate_inexact(page, total_items, total_pages, slice_size)
+
     if slice_size > total_pages:
         slice_size = total_pages
 
@@ -105,4 +126,66 @@ def paginate(page, total_items, total_pages, slice_size=5):
         pagination=links
     )
 
-    return pagination
\ No newline at end of file
+    return pagination
+
+
+def paginate_inexact(page, total_items, total_pages, slice_size=5):
+    """
+    Paginate inexact
+    Generates pagination when total number of pages is unknown or is only
+    a lower bound. Builds regular pagination up to the bound and then
+    drops the last page link, keeping next page open-ended.
+
+    :param page: int, current page number
+    :param total_items: int or None, total number of items (lower bound)
+    :param total_pages: int or None, total number of pages (lower bound)
+    :param slice_size: int, number of pages in range
+    :return: dict
+    """
+    known_pages = max(total_pages or 0, page)
+    pagination = paginate(page, total_items, known_pages, slice_size)
+    links = pagination['pagination']
+    links['last'] = None
+    links['next'] = page + 1
+    if links['next_slice'] == known_pages:
+        links['next_slice'] = None
+
+    pagination['total_pages'] = total_pages
+    return pagination
+
+
+def paginate_cursors(page, total_items, total_pages, cursors):
+    """
+    Paginate cursors
+    Generates pagination for keyset collections. There are no random page
+    jumps in keyset mode, so only first, previous and next links are
+    available, each previous/next backed by a cursor token.
+
+    :param page: int, current page number
+    :param total_items: int, total number of items
+    :param total_pages: int, total number of pages
+    :param cursors: dict, with next and previous cursor tokens
+    :return: dict
+    """
+    next_cursor = cursors.get('next')
+    previous_cursor = cursors.get('previous')
+    links = dict(
+        first=1 if previous_cursor else None,
+        previous=max(page - 1, 1) if previous_cursor else None,
+        next=page + 1 if next_cursor else None,
+        last=None,
+        previous_slice=None,
+        next_slice=None,
+        pages=[page],
+        next_cursor=next_cursor,
+        previous_cursor=previous_cursor,
+    )
+
+    pagination = dict(
+        page=page,
+        total_pages=total_pages,
+        total_items=total_items,
+        pagination=links
+    )
+
+    return pagination
@@ -30,6 +30,10 @@ class DefaultConfig(Config):
     SECRET_KEY = os.getenv('APP_SECRET_KEY')
 
     TIME_RESTARTS = False
+
+    # set up features on first use (see bootstrap.defer)
+    DEFERRED_INIT = False
+
     TESTING = False
     DEBUG = False
     DEBUG_TB_ENABLED = False
@@ -58,6 +62,46 @@ class DefaultConfig(Config):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MIGRATIONS_PATH = os.path.join(os.getcwd(), 'migrations')
     SQLALCHEMY_DATABASE_URI = os.getenv('APP_DATABASE_URI')
+
+    # connection pool settings, None keeps driver defaults
+    DB_POOL_SIZE = None
+    DB_POOL_MAX_OVERFLOW = None
+    DB_POOL_TIMEOUT = None
+    DB_POOL_RECYCLE = None
+    DB_POOL_PRE_PING = None
+    DB_POOL_USE_LIFO = None
+
+    # connections to open in each worker after fork (see bootstrap.post_fork)
+    DB_POOL_WARM = 0
+
+    # pool metrics, optionally written by every process for cli to read
+    DB_POOL_METRICS = True
+    DB_POOL_STATS_PATH = None
+    DB_POOL_STATS_INTERVAL = 10
+
+    # named databases for models with __bind_key__, bind keys of shards
+    # that __sharded__ models are spread across and a shard router callable
+    # or import string, taking shard key and shards (see orm.route_shard)
+    SQLALCHEMY_BINDS = None
+    SQLALCHEMY_SHARDS = []
+    SQLALCHEMY_SHARD_ROUTER = None
+
+    # read replicas for services, seconds between replica health checks
+    SQLALCHEMY_REPLICA_URIS = [
+        uri for uri in os.getenv('APP_REPLICA_URIS', '').split(',') if uri
+    ]
+    SQLALCHEMY_REPLICA_HEALTH_INTERVAL = 30
+
+    # async services engine, derived from database uri if not set
+    SQLALCHEMY_ASYNC_DATABASE_URI = os.getenv('APP_ASYNC_DATABASE_URI')
+    SQLALCHEMY_ASYNC_ENGINE_OPTIONS = None
+
+    # commit once per request (see boiler.abstract.unit_of_work)
+    UNIT_OF_WORK_PER_REQUEST = False
+
+    # report N+1 queries: lazy loads per request to warn (or raise) after
+    ORM_LAZY_LOAD_THRESHOLD = None
+    ORM_LAZY_LOAD_RAISE = False
     TEST_DB_PATH = os.path.join(
         os.getcwd(), 'var', 'data', 'test-db', 'sqlite.db'
     )
@@ -76,6 +120,17 @@ class DefaultConfig(Config):
     ADMINS = ['you@domain']
     LOGGING_EMAIL_EXCEPTIONS_TO_ADMINS = False
 
+    # slow query log and statement stats (see bootstrap.add_query_log)
+    QUERY_LOG_PATH = os.path.join(
+        os.getcwd(), 'var', 'logs', 'slow-queries.log'
+    )
+    QUERY_LOG_SLOW_MS = 500
+    QUERY_LOG_DEDUPE_SECONDS = 60
+    QUERY_LOG_EXPLAIN = False
+    QUERY_LOG_SAMPLES = 500
+    QUERY_LOG_STATS_PATH = None
+    QUERY_LOG_STATS_INTERVAL = 10
+
     # localization (babel)
     DEFAULT_LOCALE = 'en_GB'
     DEFAULT_TIMEZONE = 'UTC'
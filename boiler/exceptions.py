@@ -8,4 +8,16 @@ class BootstrapException(BoilerException, RuntimeError):
     pass
 
 
+class InvalidCursor(BoilerException, ValueError):
+    """ Raised when a pagination cursor can not be decoded """
+    pass
+
+
+class LazyLoadException(BoilerException, RuntimeError):
+    """ Raised when lazy loads per request get past threshold """
+    pass
+
 
+class ShardingException(BoilerException, RuntimeError):
+    """ Raised when sharded models can not be routed to a shard """
+    pass
@@ -1,20 +1,544 @@
-from flask_sqlalchemy import SQLAlchemy
+import time
+import zlib
+from contextlib import contextmanager
+from itertools import count
+from threading import Lock
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm, text
+from werkzeug.utils import import_string
+from boiler import exceptions as x
 
-db = SQLAlchemy(session_options=dict(autoflush=False, autocommit=False))
+
+class RoutingSession(SignallingSession):
+    """
+    Routing session
+    Session that can send reads to replicas and sharded models to shards.
+    Statements are routed to a replica when flagged for it in bind
+    arguments (see route_reads), and the model is not bound to a separate
+    database with __bind_key__. Models with __sharded__ go to the shard
+    selected with use_shard.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, replica=False,
+                 **kwargs):
+        if bind is not None:
+            return bind
+
+        if self.app is not None and is_sharded(mapper):
+            shards = self.app.config.get('SQLALCHEMY_SHARDS')
+            if shards:
+                return db.get_engine(self.app, bind=self.current_shard(mapper))
+
+        if replica and self.app is not None:
+            table = getattr(mapper, 'persist_selectable', None)
+            bind_key = getattr(table, 'info', {}).get('bind_key')
+            replicas = self.app.extensions.get('boiler_replicas')
+            if bind_key is None and replicas is not None:
+                engine = replicas.engine()
+                if engine is not None:
+                    return engine
+
+        return super().get_bind(mapper, clause)
+
+    def current_shard(self, mapper):
+        """ Get bind key of selected shard """
+        shard = self.info.get('boiler_shard')
+        if shard is None:
+            err = 'No shard selected for sharded model {}. '
+            err += 'Select one with use_shard(shard_key).'
+            raise x.ShardingException(err.format(mapper.class_.__name__))
+
+        return shard
+
+
+class BoilerSQLAlchemy(SQLAlchemy):
+    """
+    Boiler SQLAlchemy
+    SQLAlchemy integration that uses routing session, configures engine
+    pools from DB_POOL_* settings and collects pool metrics. When shards
+    are configured, tables of sharded models are created on every shard
+    instead of main database.
+    """
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_pool_defaults(self, app, options):
+        """ Apply pool settings from config, unset ones are left out """
+        options = super().apply_pool_defaults(app, options)
+        options.update(get_pool_options(app))
+        return options
+
+    def create_engine(self, sa_url, engine_opts):
+        """ Create engine and start collecting its pool metrics """
+        from boiler.feature.pool_metrics import instrument_engine
+        engine = super().create_engine(sa_url, engine_opts)
+        app = self.get_app()
+        if app.config.get('DB_POOL_METRICS', True):
+            instrument_engine(
+                engine,
+                stats_path=app.config.get('DB_POOL_STATS_PATH'),
+                interval=app.config.get('DB_POOL_STATS_INTERVAL', 10)
+            )
+
+        return engine
+
+    def get_tables_for_bind(self, bind=None):
+        """ Get tables of a bind, putting sharded tables on shards """
+        tables = super().get_tables_for_bind(bind)
+        shards = self.get_app().config.get('SQLALCHEMY_SHARDS') or []
+        if not shards:
+            return tables
+
+        sharded = self.sharded_tables()
+        tables = [table for table in tables if table not in sharded]
+        if bind in shards:
+            tables.extend(sharded)
+
+        return tables
+
+    def sharded_tables(self):
+        """ Get tables of models marked with __sharded__ """
+        tables = []
+        for mapper in self.Model.registry.mappers:
+            table = mapper.local_table
+            if is_sharded(mapper) and table not in tables:
+                tables.append(table)
+
+        return tables
+
+
+db = BoilerSQLAlchemy(session_options=dict(autoflush=False, autocommit=False))
+
+# sync drivers mapped to their async counterparts
+async_drivers = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
 
 
 def orm_feature(app):
     """
     Enables SQLAlchemy integration feature for database connectivity
-    Please note, that at the moment there can only be one central database that
-    is used by boiler models, db cli and migrations.
-
-    Technically you can use another sqlalchemy instance in your app's userland
-    code, but you will have to manually bootstrap it and manage testing,
-    migrations and models yourself.
+    Boiler models use main database by default. Models can be put into a
+    separate database with __bind_key__ pointing to SQLALCHEMY_BINDS, and
+    models marked with __sharded__ are spread across binds listed in
+    SQLALCHEMY_SHARDS (see use_shard). Db cli and migrations run per bind
+    with 'boiler db --bind'.
 
     :param app:
     :param app_db: application-specific sqlalchemy instance
     :return: None
     """
     db.init_app(app)
+
+    if app.config.get('UNIT_OF_WORK_PER_REQUEST'):
+        from boiler.abstract.unit_of_work import unit_of_work_per_request
+        unit_of_work_per_request(app)
+
+    if app.config.get('ORM_LAZY_LOAD_THRESHOLD') is not None:
+        detect_lazy_loads()
+
+    if app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        init_replicas(app)
+
+
+# pool settings mapped to engine options
+pool_options = dict(
+    DB_POOL_SIZE='pool_size',
+    DB_POOL_MAX_OVERFLOW='max_overflow',
+    DB_POOL_TIMEOUT='pool_timeout',
+    DB_POOL_RECYCLE='pool_recycle',
+    DB_POOL_PRE_PING='pool_pre_ping',
+    DB_POOL_USE_LIFO='pool_use_lifo',
+)
+
+
+def get_pool_options(app):
+    """
+    Get pool options
+    Returns engine pool options from DB_POOL_* settings of the app. Settings
+    that are None are left out to keep driver defaults. Explicit options in
+    SQLALCHEMY_ENGINE_OPTIONS take precedence over these.
+
+    :param app: flask.Flask
+    :return: dict
+    """
+    options = dict()
+    for setting, option in pool_options.items():
+        value = app.config.get(setting)
+        if value is not None:
+            options[option] = value
+
+    return options
+
+
+def app_engines(app=None):
+    """
+    App engines
+    Returns all engines the app uses: main database, binds and read
+    replicas that were already created.
+
+    :param app: flask.Flask, defaults to current app
+    :return: list
+    """
+    app = db.get_app(app)
+    binds = [None] + list(app.config.get('SQLALCHEMY_BINDS') or ())
+    engines = [db.get_engine(app, bind=bind) for bind in binds]
+    replicas = app.extensions.get('boiler_replicas')
+    if replicas is not None:
+        engines.extend(replicas.engines.values())
+
+    return engines
+
+
+def pool_stats(app=None, bind=None):
+    """
+    Pool stats
+    Returns live connection pool statistics of app engine in current
+    process: pool size, checked out connections, overflow and checkout
+    wait time histogram.
+
+    :param app: flask.Flask, defaults to current app
+    :param bind: str, bind key, defaults to main database
+    :return: dict or None if engine is not instrumented
+    """
+    from boiler.feature import pool_metrics
+    return pool_metrics.pool_stats(db.get_engine(app, bind=bind))
+
+
+def is_sharded(mapper):
+    """
+    Is sharded?
+    Checks if mapped model is marked with __sharded__.
+
+    :param mapper: sqlalchemy.orm.Mapper or None
+    :return: bool
+    """
+    return bool(getattr(getattr(mapper, 'class_', None), '__sharded__', False))
+
+
+def route_shard(shard_key, shards):
+    """
+    Route shard
+    Default shard router: integer keys (like tenant ids) are spread over
+    shards by modulo, others by their crc32 checksum.
+
+    :param shard_key: int or str, shard key
+    :param shards: list, shard bind keys
+    :return: str, bind key
+    """
+    if isinstance(shard_key, int):
+        index = shard_key
+    else:
+        index = zlib.crc32(str(shard_key).encode())
+
+    return shards[index % len(shards)]
+
+
+def shard_for(shard_key, app=None):
+    """
+    Shard for
+    Returns bind key of the shard for a shard key, as resolved by
+    SQLALCHEMY_SHARD_ROUTER (a callable or import string), or by the
+    default router. Returns None if app has no shards.
+
+    :param shard_key: int or str, shard key
+    :param app: flask.Flask, defaults to current app
+    :return: str or None
+    """
+    app = db.get_app(app)
+    shards = app.config.get('SQLALCHEMY_SHARDS') or []
+    if not shards:
+        return None
+
+    router = app.config.get('SQLALCHEMY_SHARD_ROUTER') or route_shard
+    if isinstance(router, str):
+        router = import_string(router)
+
+    bind_key = router(shard_key, list(shards))
+    if bind_key not in shards:
+        err = 'Shard router returned [{}] for key [{}], which is not one '
+        err += 'of SQLALCHEMY_SHARDS'
+        raise x.ShardingException(err.format(bind_key, shard_key))
+
+    return bind_key
+
+
+@contextmanager
+def use_shard(shard_key):
+    """
+    Use shard
+    Context manager that routes sharded models of the session to the shard
+    of given key. Pending changes are flushed before switching shards and
+    on exit, so that they end up on the right shard. Shards are committed
+    together, but not atomically.
+
+    Identity map does not know about shards, so primary keys of sharded
+    models should be unique across shards.
+
+    :param shard_key: int or str, shard key (like tenant id)
+    :return: str, bind key of the shard
+    """
+    session = db.session()
+    bind_key = shard_for(shard_key)
+    previous = session.info.get('boiler_shard')
+    if previous != bind_key:
+        session.flush()
+
+    session.info['boiler_shard'] = bind_key
+    try:
+        yield bind_key
+        session.flush()
+    finally:
+        session.info['boiler_shard'] = previous
+
+
+def init_replicas(app):
+    """
+    Init replicas
+    Sets up read replicas from SQLALCHEMY_REPLICA_URIS. Service reads will
+    be routed to replicas, while writes and everything else stay on
+    primary database.
+
+    :param app: flask.Flask
+    :return: None
+    """
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS')
+    interval = app.config.get('SQLALCHEMY_REPLICA_HEALTH_INTERVAL', 30)
+    options = get_pool_options(app)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.extensions['boiler_replicas'] = ReplicaSet(uris, interval, **options)
+    if not event.contains(db.session, 'do_orm_execute', route_reads):
+        event.listen(db.session, 'do_orm_execute', route_reads)
+        event.listen(db.session, 'after_flush', track_writes)
+
+
+class ReplicaSet:
+    """
+    Replica set
+    Picks read replica engines round-robin. Each replica is checked with a
+    simple query at most once per health interval, and replicas that fail
+    the check or drop connections are skipped until next interval. Engines
+    are created lazily on first use.
+    """
+    def __init__(self, uris, health_interval=30, **engine_options):
+        """
+        Initialise replica set
+
+        :param uris: list, replica database uris
+        :param health_interval: int, seconds between health checks
+        :param engine_options: kwargs, options to create engines with
+        """
+        self.uris = list(uris)
+        self.health_interval = health_interval
+        self.engine_options = engine_options
+        self.engines = dict()
+        self.checked = dict()
+        self.down = dict()
+        self.counter = count()
+        self.lock = Lock()
+
+    def get_engine(self, index):
+        """ Get engine of a replica, creating it on first use """
+        from sqlalchemy import create_engine
+        with self.lock:
+            if index not in self.engines:
+                options = dict(pool_pre_ping=True)
+                options.update(self.engine_options)
+                engine = create_engine(self.uris[index], **options)
+                event.listen(engine, 'handle_error', self._on_error(index))
+                self.engines[index] = engine
+
+        return self.engines[index]
+
+    def engine(self):
+        """
+        Engine
+        Returns engine of next healthy replica, or None if all replicas
+        are down.
+
+        :return: sqlalchemy.engine.Engine or None
+        """
+        for _ in range(len(self.uris)):
+            index = next(self.counter) % len(self.uris)
+            if self.healthy(index):
+                return self.get_engine(index)
+
+        return None
+
+    def healthy(self, index):
+        """
+        Healthy?
+        Checks if replica is up, running a health check if it was not
+        checked within health interval.
+
+        :param index: int, replica index
+        :return: bool
+        """
+        now = time.monotonic()
+        if self.down.get(index, 0) > now:
+            return False
+
+        checked = self.checked.get(index)
+        if checked is not None and now - checked < self.health_interval:
+            return True
+
+        self.checked[index] = now
+        try:
+            with self.get_engine(index).connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception:
+            self.mark_down(index)
+            return False
+
+        self.down.pop(index, None)
+        return True
+
+    def mark_down(self, index):
+        """ Skip replica until next health check """
+        self.down[index] = time.monotonic() + self.health_interval
+
+    def _on_error(self, index):
+        """ Create engine error listener that marks replica down """
+        def handle_error(context):
+            if context.is_disconnect:
+                self.mark_down(index)
+        return handle_error
+
+
+def route_reads(orm_execute_state):
+    """
+    Route reads
+    Session execute listener that flags selects executed with boiler_replica
+    option to be routed to a replica. Once session writes anything, reads
+    stay on primary for the rest of the session (that is, the request), so
+    that they see those writes.
+
+    :param orm_execute_state: sqlalchemy.orm.ORMExecuteState
+    :return: None
+    """
+    session = orm_execute_state.session
+    if not orm_execute_state.is_select:
+        session.info['boiler_wrote'] = True
+        return
+
+    if session.info.get('boiler_wrote'):
+        return
+    if not orm_execute_state.execution_options.get('boiler_replica'):
+        return
+    if orm_execute_state.statement._for_update_arg is not None:
+        return
+
+    orm_execute_state.bind_arguments['replica'] = True
+
+
+def track_writes(session, flush_context):
+    """ Session flush listener that remembers session wrote something """
+    session.info['boiler_wrote'] = True
+
+
+def detect_lazy_loads():
+    """
+    Detect lazy loads
+    Starts counting relationship lazy loads of boiler session per request
+    (or app context) to catch N+1 query patterns. Once the count gets past
+    ORM_LAZY_LOAD_THRESHOLD a warning is logged, or an exception raised if
+    ORM_LAZY_LOAD_RAISE is set. Apps without a threshold are not affected.
+
+    :return: None
+    """
+    if not event.contains(db.session, 'do_orm_execute', count_lazy_load):
+        event.listen(db.session, 'do_orm_execute', count_lazy_load)
+
+
+def count_lazy_load(orm_execute_state):
+    """
+    Count lazy load
+    Session execute listener that counts lazy loads in current app context
+    and reports them once past threshold.
+
+    :param orm_execute_state: sqlalchemy.orm.ORMExecuteState
+    :return: None
+    """
+    if not orm_execute_state.is_select:
+        return
+
+    state = orm_execute_state.lazy_loaded_from
+    if state is None or not has_app_context():
+        return
+
+    threshold = current_app.config.get('ORM_LAZY_LOAD_THRESHOLD')
+    if threshold is None:
+        return
+
+    count = g.get('boiler_lazy_loads', 0) + 1
+    g.boiler_lazy_loads = count
+    if count <= threshold:
+        return
+
+    path = orm_execute_state.loader_strategy_path
+    attribute = path[-1] if path else None
+    err = 'Lazy load #{} of {} on {} exceeds threshold of {} per request. '
+    err += 'Consider eager loading with a loading profile.'
+    err = err.format(count, attribute, state.class_.__name__, threshold)
+    if current_app.config.get('ORM_LAZY_LOAD_RAISE'):
+        raise x.LazyLoadException(err)
+
+    if count == threshold + 1:
+        current_app.logger.warning(err)
+
+
+def get_async_database_uri(app):
+    """
+    Get async database URI
+    Returns SQLALCHEMY_ASYNC_DATABASE_URI if configured, otherwise derives
+    it from SQLALCHEMY_DATABASE_URI by swapping driver for an async one.
+
+    :param app: flask.Flask
+    :return: str
+    """
+    uri = app.config.get('SQLALCHEMY_ASYNC_DATABASE_URI')
+    if uri:
+        return uri
+
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    scheme, _, rest = uri.partition('://')
+    dialect = scheme.split('+')[0]
+    if not rest or dialect not in async_drivers:
+        err = 'Unable to derive async database URI from [{}]. '
+        err += 'Please set SQLALCHEMY_ASYNC_DATABASE_URI'
+        raise x.BootstrapException(err.format(scheme))
+
+    return async_drivers[dialect] + '://' + rest
+
+
+def get_async_engine(app=None):
+    """
+    Get async engine
+    Returns SQLAlchemy asyncio engine for the app, creating it on first use.
+    Flask runs every async view in its own event loop, and connections can
+    not be shared between loops, so by default the engine does not pool
+    connections. Pass pool settings in SQLALCHEMY_ASYNC_ENGINE_OPTIONS if
+    you run under an ASGI server with a single loop.
+
+    :param app: flask.Flask, defaults to current app
+    :return: sqlalchemy.ext.asyncio.AsyncEngine
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    app = app or current_app._get_current_object()
+    engine = app.extensions.get('boiler_async_engine')
+    if engine is not None:
+        return engine
+
+    options = dict(poolclass=NullPool)
+    options.update(app.config.get('SQLALCHEMY_ASYNC_ENGINE_OPTIONS') or {})
+    if app.config.get('SQLALCHEMY_ECHO'):
+        options.setdefault('echo', True)
+
+    engine = create_async_engine(get_async_database_uri(app), **options)
+    app.extensions['boiler_async_engine'] = engine
+    return engine
@@ -0,0 +1,193 @@
+import os
+import time
+from hashlib import sha1
+from threading import Lock
+from weakref import WeakKeyDictionary
+from sqlalchemy import event, exc
+from boiler.feature.snapshots import write_snapshot, read_snapshots
+
+# metrics of instrumented engines
+engines = WeakKeyDictionary()
+
+# upper bounds of checkout wait histogram buckets, in milliseconds
+wait_buckets = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    """
+    Pool metrics
+    Collects connection pool statistics of an engine: how many connections
+    are checked out, pool overflow, and how long checkouts had to wait for
+    a connection, as a histogram. Wait time is measured around pool
+    checkout, so it includes connecting when pool opens a new connection.
+
+    If stats path is set, process snapshots stats of the engine into a json
+    file there at most once per interval, so that stats of all worker
+    processes can be read from cli.
+    """
+    def __init__(self, engine, stats_path=None, interval=10):
+        """
+        Initialise metrics
+
+        :param engine: sqlalchemy.engine.Engine, engine to instrument
+        :param stats_path: str, directory to write snapshots to
+        :param interval: int, seconds between snapshots
+        """
+        self.engine = engine
+        self.stats_path = stats_path
+        self.interval = interval
+        self.lock = Lock()
+        self.written = 0
+        self.reset()
+        self.instrument()
+        event.listen(engine, 'engine_disposed', self.on_dispose)
+
+    def reset(self):
+        """ Reset counters """
+        with self.lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.histogram = [0] * (len(wait_buckets) + 1)
+
+    def instrument(self):
+        """ Wrap pool checkout to measure wait time """
+        pool = self.engine.pool
+        connect = pool.connect
+
+        def timed_connect():
+            start = time.perf_counter()
+            try:
+                return connect()
+            except exc.TimeoutError:
+                with self.lock:
+                    self.timeouts += 1
+                raise
+            finally:
+                self.observe(time.perf_counter() - start)
+
+        pool.connect = timed_connect
+        if not event.contains(pool, 'checkin', self.on_checkin):
+            event.listen(pool, 'checkin', self.on_checkin)
+
+    def on_dispose(self, connection):
+        """ Instrument new pool after engine disposes the old one """
+        self.instrument()
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        """ Write stats snapshot if it is due """
+        if self.stats_path and time.time() - self.written >= self.interval:
+            self.write()
+
+    def observe(self, seconds):
+        """
+        Observe
+        Records checkout wait time.
+
+        :param seconds: float, time spent waiting
+        :return: None
+        """
+        millis = seconds * 1000
+        bucket = len(wait_buckets)
+        for index, bound in enumerate(wait_buckets):
+            if millis <= bound:
+                bucket = index
+                break
+
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += millis
+            self.wait_max = max(self.wait_max, millis)
+            self.histogram[bucket] += 1
+
+    def stats(self):
+        """
+        Stats
+        Returns a dictionary of current pool statistics. Pool size figures
+        are None for pools that do not track them (like null pool).
+
+        :return: dict
+        """
+        pool = self.engine.pool
+        status = dict()
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            status[name] = method() if callable(method) else None
+
+        labels = ['<={}ms'.format(bound) for bound in wait_buckets]
+        labels.append('>{}ms'.format(wait_buckets[-1]))
+        with self.lock:
+            average = self.wait_total / self.checkouts if self.checkouts else 0
+            return dict(
+                pid=os.getpid(),
+                url=self.engine.url.render_as_string(hide_password=True),
+                pool=type(pool).__name__,
+                size=status['size'],
+                checked_in=status['checkedin'],
+                checked_out=status['checkedout'],
+                overflow=status['overflow'],
+                checkouts=self.checkouts,
+                timeouts=self.timeouts,
+                wait_avg_ms=round(average, 3),
+                wait_max_ms=round(self.wait_max, 3),
+                wait_histogram=dict(zip(labels, self.histogram)),
+            )
+
+    def write(self):
+        """
+        Write
+        Writes stats snapshot of this engine in this process into stats
+        path. Snapshots are keyed by engine url, so that engines of binds,
+        shards and replicas do not overwrite each other.
+
+        :return: None
+        """
+        self.written = time.time()
+        stats = self.stats()
+        stats['time'] = self.written
+        key = sha1(stats['url'].encode()).hexdigest()[:10]
+        write_snapshot(self.stats_path, 'pool', stats, key=key)
+
+
+def instrument_engine(engine, stats_path=None, interval=10):
+    """
+    Instrument engine
+    Starts collecting pool metrics of an engine.
+
+    :param engine: sqlalchemy.engine.Engine
+    :param stats_path: str, directory to write snapshots to
+    :param interval: int, seconds between snapshots
+    :return: PoolMetrics
+    """
+    metrics = engines.get(engine)
+    if metrics is None:
+        metrics = PoolMetrics(engine, stats_path, interval)
+        engines[engine] = metrics
+
+    return metrics
+
+
+def pool_stats(engine):
+    """
+    Pool stats
+    Returns pool statistics of an instrumented engine in current process.
+
+    :param engine: sqlalchemy.engine.Engine
+    :return: dict or None
+    """
+    metrics = engines.get(engine)
+    return metrics.stats() if metrics is not None else None
+
+
+def read_pool_stats(stats_path, max_age=None):
+    """
+    Read pool stats
+    Reads stats snapshots written by all processes, skipping those older
+    than max age, which most likely belong to processes that are gone.
+
+    :param stats_path: str, directory with snapshots
+    :param max_age: int, seconds, skip older snapshots
+    :return: list of dicts
+    """
+    return read_snapshots(stats_path, 'pool', max_age)
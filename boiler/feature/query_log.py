@@ -0,0 +1,327 @@
+import os
+import re
+import math
+import time
+import logging
+from hashlib import sha1
+from collections import deque
+from threading import Lock
+from logging.handlers import RotatingFileHandler
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from boiler.feature.snapshots import write_snapshot, read_snapshots
+
+# dedicated slow query log
+logger = logging.getLogger('boiler.slow_queries')
+
+# explain prefixes per dialect, plain EXPLAIN for others
+explain_prefixes = dict(sqlite='EXPLAIN QUERY PLAN ')
+
+
+def query_log_feature(app):
+    """
+    Query log feature
+    Times every statement executed by sqlalchemy engines within the app
+    and collects per-statement stats (count, p50, p95) grouped by normalized
+    SQL. Statements slower than QUERY_LOG_SLOW_MS go to a dedicated slow
+    query log, once per QUERY_LOG_DEDUPE_SECONDS for each normalized
+    statement, optionally with their EXPLAIN output (QUERY_LOG_EXPLAIN).
+
+    Set QUERY_LOG_STATS_PATH for every process to periodically write its
+    stats there, so they can be aggregated with 'boiler db queries'.
+
+    :param app: flask.Flask
+    :return: None
+    """
+    app.extensions['boiler_query_log'] = QueryStats(
+        samples=app.config.get('QUERY_LOG_SAMPLES', 500),
+        stats_path=app.config.get('QUERY_LOG_STATS_PATH'),
+        interval=app.config.get('QUERY_LOG_STATS_INTERVAL', 10)
+    )
+
+    logger.setLevel(logging.INFO)
+    path = app.config.get('QUERY_LOG_PATH')
+    if path and not app.testing:
+        files = [getattr(h, 'baseFilename', None) for h in logger.handlers]
+        if path not in files:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = RotatingFileHandler(
+                filename=path,
+                mode='a',
+                maxBytes=1024 * 1024 * 2,
+                backupCount=10
+            )
+            format = '%(asctime)s %(message)s'
+            handler.setFormatter(logging.Formatter(format))
+            logger.addHandler(handler)
+
+    if not event.contains(Engine, 'before_cursor_execute', before_execute):
+        event.listen(Engine, 'before_cursor_execute', before_execute)
+        event.listen(Engine, 'after_cursor_execute', after_execute)
+
+
+def normalize_sql(sql):
+    """
+    Normalize SQL
+    Replaces literals and bound parameters with placeholders, collapses
+    IN lists and whitespace, so that statements that only differ in values
+    are grouped together.
+
+    :param sql: str, statement
+    :return: str
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+', '?', sql)
+    sql = re.sub(r'\[POSTCOMPILE_\w+\]|__\[POSTCOMPILE_\w+\]', '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def percentile(values, percent):
+    """
+    Percentile
+    Returns nearest-rank percentile of values.
+
+    :param values: list, numbers
+    :param percent: int, percentile
+    :return: number or None
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = math.ceil(percent / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class QueryStats:
+    """
+    Query stats
+    Collects statement timings grouped by normalized SQL. Keeps a bounded
+    number of recent samples per statement to compute percentiles.
+    """
+    def __init__(self, samples=500, stats_path=None, interval=10):
+        """
+        Initialise stats
+
+        :param samples: int, timings to keep per statement
+        :param stats_path: str, directory to write snapshots to
+        :param interval: int, seconds between snapshots
+        """
+        self.samples = samples
+        self.stats_path = stats_path
+        self.interval = interval
+        self.lock = Lock()
+        self.statements = dict()
+        self.reported = dict()
+        self.written = time.time()
+
+    def record(self, sql, millis):
+        """
+        Record
+        Records statement timing.
+
+        :param sql: str, statement
+        :param millis: float, execution time
+        :return: tuple, (key, normalized sql)
+        """
+        normalized = normalize_sql(sql)
+        key = sha1(normalized.encode()).hexdigest()[:12]
+        with self.lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = dict(
+                    sql=normalized,
+                    count=0,
+                    total_ms=0.0,
+                    max_ms=0.0,
+                    samples=deque(maxlen=self.samples)
+                )
+                self.statements[key] = entry
+
+            entry['count'] += 1
+            entry['total_ms'] += millis
+            entry['max_ms'] = max(entry['max_ms'], millis)
+            entry['samples'].append(millis)
+
+        if self.stats_path and time.time() - self.written >= self.interval:
+            self.write()
+
+        return key, normalized
+
+    def report_due(self, key, dedupe):
+        """
+        Report due?
+        Checks if slow statement should be logged now, or was already
+        logged within dedupe interval. Returns number of occurrences since
+        last report if it is due, None otherwise.
+
+        :param key: str, statement key
+        :param dedupe: int, seconds between reports of a statement
+        :return: int or None
+        """
+        now = time.time()
+        with self.lock:
+            last, suppressed = self.reported.get(key, (None, 0))
+            if last is not None and now - last < dedupe:
+                self.reported[key] = (last, suppressed + 1)
+                return None
+
+            self.reported[key] = (now, 0)
+            return suppressed + 1
+
+    def snapshot(self):
+        """
+        Snapshot
+        Returns raw stats with samples, suitable for merging across
+        processes.
+
+        :return: dict
+        """
+        with self.lock:
+            statements = dict()
+            for key, entry in self.statements.items():
+                entry = dict(entry)
+                entry['samples'] = list(entry['samples'])
+                statements[key] = entry
+
+        return dict(pid=os.getpid(), time=time.time(), statements=statements)
+
+    def stats(self):
+        """
+        Stats
+        Returns per-statement stats of current process.
+
+        :return: list of dicts
+        """
+        return aggregate([self.snapshot()])
+
+    def write(self):
+        """
+        Write
+        Writes stats snapshot of this process into stats path.
+
+        :return: None
+        """
+        self.written = time.time()
+        write_snapshot(self.stats_path, 'queries', self.snapshot())
+
+
+def aggregate(snapshots):
+    """
+    Aggregate
+    Merges stats snapshots into per-statement stats, slowest p95 first.
+
+    :param snapshots: list, snapshots of QueryStats
+    :return: list of dicts
+    """
+    merged = dict()
+    for snapshot in snapshots:
+        for key, entry in snapshot['statements'].items():
+            target = merged.setdefault(key, dict(
+                key=key,
+                sql=entry['sql'],
+                count=0,
+                total_ms=0.0,
+                max_ms=0.0,
+                samples=[]
+            ))
+            target['count'] += entry['count']
+            target['total_ms'] += entry['total_ms']
+            target['max_ms'] = max(target['max_ms'], entry['max_ms'])
+            target['samples'].extend(entry['samples'])
+
+    stats = []
+    for entry in merged.values():
+        samples = entry.pop('samples')
+        entry['p50_ms'] = percentile(samples, 50)
+        entry['p95_ms'] = percentile(samples, 95)
+        stats.append(entry)
+
+    return sorted(stats, key=lambda entry: entry['p95_ms'], reverse=True)
+
+
+def read_query_stats(stats_path, max_age=None):
+    """
+    Read query stats
+    Reads and aggregates stats snapshots written by all processes,
+    skipping those older than max age.
+
+    :param stats_path: str, directory with snapshots
+    :param max_age: int, seconds, skip older snapshots
+    :return: list of dicts
+    """
+    return aggregate(read_snapshots(stats_path, 'queries', max_age))
+
+
+def explain(connection, statement, parameters):
+    """
+    Explain
+    Returns query plan of a statement as text. Runs within a savepoint of
+    the connection transaction, so that a failing EXPLAIN is rolled back
+    on its own and does not abort the transaction of the request (like it
+    would on PostgreSQL).
+
+    :param connection: sqlalchemy.engine.Connection
+    :param statement: str, statement as sent to database
+    :param parameters: tuple or dict, statement parameters
+    :return: str
+    """
+    prefix = explain_prefixes.get(connection.dialect.name, 'EXPLAIN ')
+    connection.info['boiler_explaining'] = True
+    try:
+        with connection.begin_nested():
+            sql = prefix + statement
+            rows = connection.exec_driver_sql(sql, parameters).fetchall()
+    except Exception as error:
+        return 'EXPLAIN failed: {}'.format(error)
+    finally:
+        connection.info.pop('boiler_explaining', None)
+
+    return '\n'.join(' | '.join(str(value) for value in row) for row in rows)
+
+
+def before_execute(conn, cursor, statement, parameters, context, executemany):
+    """ Remember statement start time """
+    starts = conn.info.setdefault('boiler_query_start', [])
+    starts.append(time.perf_counter())
+
+
+def after_execute(conn, cursor, statement, parameters, context, executemany):
+    """ Record statement time and log it if slow """
+    starts = conn.info.get('boiler_query_start')
+    if not starts:
+        return
+
+    millis = (time.perf_counter() - starts.pop()) * 1000
+    if conn.info.get('boiler_explaining') or not has_app_context():
+        return
+
+    stats = current_app.extensions.get('boiler_query_log')
+    if stats is None:
+        return
+
+    key, normalized = stats.record(statement, millis)
+    config = current_app.config
+    if millis < config.get('QUERY_LOG_SLOW_MS', 500):
+        return
+
+    dedupe = config.get('QUERY_LOG_DEDUPE_SECONDS', 60)
+    occurrences = stats.report_due(key, dedupe)
+    if occurrences is None:
+        return
+
+    message = 'Slow query {:.1f}ms [{}] x{}: {}'
+    message = message.format(millis, key, occurrences, normalized)
+    # results of streamed statements are still pending on the connection
+    select = normalized.lower().startswith(('select', 'with'))
+    streamed = context is not None and context.execution_options.get(
+        'stream_results'
+    )
+    explainable = select and not executemany and not streamed
+    if config.get('QUERY_LOG_EXPLAIN') and explainable:
+        message += '\n' + explain(conn, statement, parameters)
+
+    logger.info(message)
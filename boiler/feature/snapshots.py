@@ -0,0 +1,62 @@
+import os
+import json
+import time
+
+
+def write_snapshot(path, prefix, data, key=None):
+    """
+    Write snapshot
+    Atomically writes stats snapshot of current process into a json file
+    named after prefix and process id, so that stats of all worker
+    processes can be read from cli. Processes that write several snapshots
+    of the same kind (like one per engine) tell them apart with a key.
+
+    :param path: str, directory to write snapshot to
+    :param prefix: str, snapshot file name prefix, like 'pool'
+    :param data: dict, json-serializable snapshot
+    :param key: str, snapshot key within process
+    :return: str, snapshot file path
+    """
+    os.makedirs(path, exist_ok=True)
+    name = '{}-{}'.format(prefix, os.getpid())
+    if key is not None:
+        name += '-' + key
+    name += '.json'
+    filename = os.path.join(path, name)
+    temp = filename + '.tmp'
+    with open(temp, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp, filename)
+    return filename
+
+
+def read_snapshots(path, prefix, max_age=None):
+    """
+    Read snapshots
+    Reads snapshots with given prefix written by all processes, skipping
+    unreadable ones and those older than max age, which most likely belong
+    to processes that are gone. Snapshots must have a 'time' key.
+
+    :param path: str, directory with snapshots
+    :param prefix: str, snapshot file name prefix
+    :param max_age: int, seconds, skip older snapshots
+    :return: list of dicts
+    """
+    if not path or not os.path.isdir(path):
+        return []
+
+    snapshots = []
+    now = time.time()
+    for name in sorted(os.listdir(path)):
+        if not name.startswith(prefix + '-') or not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(path, name)) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        if max_age is not None and now - snapshot.get('time', 0) > max_age:
+            continue
+        snapshots.append(snapshot)
+
+    return snapshots
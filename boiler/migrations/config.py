@@ -3,10 +3,13 @@ from alembic.config import Config as AlembicConfig
 
 
 class MigrationsConfig(AlembicConfig):
-    def __init__(self, path, db_url, metadata, *args, **kwargs):
+    def __init__(self, path, db_url, metadata, *args, bind=None, tables=None,
+                 **kwargs):
         self.dir=path
         self.url=db_url
         self.meta=metadata
+        self.bind=bind
+        self.tables=tables
         self.config = os.path.join(self.dir, 'alembic.ini')
 
         # bootstrap with ini if exists
@@ -25,6 +25,14 @@ fileConfig(config.config_file_name)
 target_metadata = config.meta
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """ Only autogenerate tables of the database bind being migrated """
+    tables = getattr(config, 'tables', None)
+    if type_ == 'table' and tables is not None:
+        return name in tables
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -38,7 +46,7 @@ def run_migrations_offline():
 
     """
     url = config.get_main_option("sqlalchemy.url")
-    context.configure(url=url)
+    context.configure(url=url, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -60,7 +68,8 @@ def run_migrations_online():
     connection = engine.connect()
     context.configure(
         connection=connection,
-        target_metadata=target_metadata
+        target_metadata=target_metadata,
+        include_object=include_object
     )
 
     try:
@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import builtins
+from statistics import median
+from contextlib import contextmanager
+from functools import wraps
+
+
+class StartupProfiler:
+    """
+    Startup profiler
+    Records wall time and import time of app bootstrap phases: app module
+    import, create_app steps and feature toggles. Import time is measured
+    by wrapping builtin import. Each phase counts time of imports started
+    within it, plus import time of its nested phases, so phases that run
+    while a module is being imported (like create_app in app module) do
+    not count towards that import. Modules imported with importlib
+    directly are still counted, but their time is not.
+
+    Phases are only recorded when profiler is enabled, otherwise they are
+    a no-op, so bootstrap can stay instrumented.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """ Drop recorded phases """
+        self.phases = []
+        self.levels = [self.level()]
+        self.modules = len(sys.modules)
+        self.started = time.perf_counter()
+
+    def level(self, name=None):
+        """ Create import timing state of a phase """
+        return dict(name=name, depth=0, start=None, imports=0.0, nested=0.0)
+
+    def enable(self):
+        """ Start recording phases and timing imports """
+        if self.enabled:
+            return
+
+        self.reset()
+        self.enabled = True
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def disable(self):
+        """ Stop recording and restore builtin import """
+        if not self.enabled:
+            return
+
+        builtins.__import__ = self.original_import
+        self.enabled = False
+
+    def timed_import(self, *args, **kwargs):
+        """ Builtin import replacement that times outermost imports """
+        level = self.levels[-1]
+        if level['depth']:
+            return self.original_import(*args, **kwargs)
+
+        level['depth'] = 1
+        level['start'] = time.perf_counter()
+        try:
+            return self.original_import(*args, **kwargs)
+        finally:
+            level['imports'] += time.perf_counter() - level['start']
+            level['depth'] = 0
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Phase
+        Context manager that records a bootstrap phase. Phases can be
+        nested and are identified by their path, like 'app > add_orm'.
+
+        :param name: str, phase name
+        :return: None
+        """
+        if not self.enabled:
+            yield
+            return
+
+        # pause timing import this phase runs in
+        parent = self.levels[-1]
+        if parent['depth']:
+            parent['imports'] += time.perf_counter() - parent['start']
+
+        path = [level['name'] for level in self.levels[1:]] + [name]
+        entry = dict(path=' > '.join(path), depth=len(path) - 1)
+        self.phases.append(entry)
+        level = self.level(name)
+        self.levels.append(level)
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            imports = level['imports'] + level['nested']
+            entry['wall_ms'] = (time.perf_counter() - start) * 1000
+            entry['import_ms'] = imports * 1000
+            entry['modules'] = len(sys.modules) - modules
+            self.levels.pop()
+            parent['nested'] += imports
+            if parent['depth']:
+                parent['start'] = time.perf_counter()
+
+    def report(self):
+        """
+        Report
+        Returns recorded phases with totals since profiler was enabled.
+
+        :return: dict
+        """
+        root = self.levels[0]
+        return dict(
+            pid=os.getpid(),
+            python=sys.version.split()[0],
+            time=time.time(),
+            wall_ms=(time.perf_counter() - self.started) * 1000,
+            import_ms=(root['imports'] + root['nested']) * 1000,
+            modules=len(sys.modules) - self.modules,
+            phases=[dict(entry) for entry in self.phases],
+        )
+
+
+# profiler used by bootstrap
+profiler = StartupProfiler()
+
+
+def profiled(func):
+    """
+    Profiled
+    Decorator that records calls of a bootstrap function as a phase named
+    after the function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiler.phase(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def profile_app(flask_app=None):
+    """
+    Profile app
+    Enables profiler, imports boiler bootstrap and the app module, which
+    creates the app, and returns startup report. Only meaningful in a fresh
+    process, as modules imported earlier are not imported again.
+
+    :param flask_app: str, app package, defaults to FLASK_APP
+    :return: dict
+    """
+    from werkzeug.utils import import_string
+    profiler.enable()
+    try:
+        with profiler.phase('import boiler.bootstrap'):
+            from boiler import bootstrap
+        flask_app = flask_app or os.getenv('FLASK_APP')
+        with profiler.phase('import ' + str(flask_app) + '.app'):
+            bootstrap.test_import_name(flask_app)
+            import_string(flask_app + '.app')
+    finally:
+        profiler.disable()
+
+    return profiler.report()
+
+
+def aggregate(reports):
+    """
+    Aggregate
+    Combines reports of several runs into one, taking median of timings
+    of each phase, to smooth out noise.
+
+    :param reports: list, startup reports
+    :return: dict
+    """
+    timings = ('wall_ms', 'import_ms')
+    result = dict(reports[0])
+    for name in timings:
+        result[name] = median(report[name] for report in reports)
+
+    phases = []
+    for entry in reports[0]['phases']:
+        entry = dict(entry)
+        runs = [phases_by_path(report) for report in reports]
+        runs = [run[entry['path']] for run in runs if entry['path'] in run]
+        for name in timings:
+            entry[name] = median(run[name] for run in runs)
+        phases.append(entry)
+
+    result['phases'] = phases
+    result['runs'] = len(reports)
+    return result
+
+
+def phases_by_path(report):
+    """ Get phases of a report by their path """
+    return {entry['path']: entry for entry in report['phases']}
+
+
+def compare(report, previous):
+    """
+    Compare
+    Adds wall time difference to previous report to every phase and to
+    totals, as 'delta_ms'. Phases missing from previous report get None.
+
+    :param report: dict, startup report
+    :param previous: dict, earlier startup report
+    :return: dict, report
+    """
+    before = phases_by_path(previous)
+    for entry in report['phases']:
+        other = before.get(entry['path'])
+        delta = entry['wall_ms'] - other['wall_ms'] if other else None
+        entry['delta_ms'] = delta
+
+    report['delta_ms'] = report['wall_ms'] - previous['wall_ms']
+    return report
+
+
+def save_report(report, path):
+    """
+    Save report
+    Writes startup report into directory, named after its time, so that
+    runs can be compared later.
+
+    :param report: dict, startup report
+    :param path: str, directory to save to
+    :return: str, report file path
+    """
+    os.makedirs(path, exist_ok=True)
+    name = time.strftime('%Y%m%d-%H%M%S', time.localtime(report['time']))
+    filename = os.path.join(path, 'startup-{}.json'.format(name))
+    with open(filename, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    return filename
+
+
+def last_report(path):
+    """
+    Last report
+    Reads latest startup report saved into directory.
+
+    :param path: str, directory with reports
+    :return: dict or None
+    """
+    if not os.path.isdir(path):
+        return None
+
+    names = [n for n in os.listdir(path) if n.startswith('startup-')]
+    if not names:
+        return None
+
+    with open(os.path.join(path, sorted(names)[-1])) as file:
+        return json.load(file)
+
+
+if __name__ == '__main__':
+    # bootstrap records into profiler of the imported module, not __main__
+    from boiler.timer.startup_profiler import profile_app
+    print(json.dumps(profile_app(*sys.argv[1:2])))
@@ -0,0 +1,332 @@
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from faker import Factory
+from boiler.feature.orm import db
+from tests.boiler_test_app.models import User
+from tests.boiler_test_app.services import UserService
+
+
+@attr('kernel', 'abstract', 'abstract_service')
+class AbstractServiceTests(BoilerTestCase):
+    """
+    Abstract service tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+
+    def fake_data(self, how_many=1):
+        """ Generate fake data to create users from """
+        fake = Factory.create()
+        emails = set()
+        while len(emails) < how_many:
+            emails.add(fake.email())
+
+        return [dict(email=email, password='secret') for email in emails]
+
+    def create_fake_data(self, how_many=1):
+        """ Create a fake data set to test our service """
+        items = []
+        for data in self.fake_data(how_many):
+            user = User(**data)
+            db.session.add(user)
+            db.session.commit()
+            items.append(user)
+
+        return items
+
+    # ------------------------------------------------------------------------
+    # Bulk operations
+    # ------------------------------------------------------------------------
+
+    def test_can_create_many(self):
+        """ Creating many models in chunks """
+        service = UserService()
+        with mock.patch.object(service, 'commit') as commit:
+            ids = service.create_many(self.fake_data(5), chunk_size=2)
+            self.assertEquals(3, commit.call_count)
+
+        self.assertIsNone(ids)
+        self.assertEquals(5, User.query.count())
+
+    def test_can_save_many(self):
+        """ Saving many models in chunks """
+        service = UserService()
+        models = [service.new(**data) for data in self.fake_data(3)]
+        with mock.patch.object(service, 'commit') as commit:
+            service.save_many(models, chunk_size=2, commit=False)
+            commit.assert_not_called()
+
+        service.commit()
+        self.assertEquals(3, User.query.count())
+        for model in models:
+            self.assertIsNotNone(model.id)
+
+    def test_save_many_validates_all_types_upfront(self):
+        """ Saving many fails before persisting anything on invalid type """
+        service = UserService()
+        models = [service.new(**data) for data in self.fake_data(2)]
+        with self.assertRaises(ValueError):
+            service.save_many(models + ['not a user'], chunk_size=1)
+
+        self.assertEquals(0, User.query.count())
+
+    def test_can_delete_many(self):
+        """ Deleting many models in chunks """
+        models = self.create_fake_data(3)
+        service = UserService()
+        service.delete_many(models[:2], chunk_size=1)
+        self.assertEquals([models[2].id], [u.id for u in User.query.all()])
+
+    # ------------------------------------------------------------------------
+    # Upserts
+    # ------------------------------------------------------------------------
+
+    def test_can_upsert(self):
+        """ Upserting inserts new and updates existing rows """
+        service = UserService()
+        data = dict(email='me@example.com', password='one')
+        self.assertEquals(1, service.upsert(data, ['email']))
+        data['password'] = 'two'
+        service.upsert(data, ['email'])
+
+        db.session.remove()
+        users = User.query.all()
+        self.assertEquals(1, len(users))
+        self.assertEquals('two', users[0].password)
+
+    def test_can_upsert_many(self):
+        """ Upserting many rows in chunks """
+        existing = self.create_fake_data(2)
+        service = UserService()
+        items = [dict(email=u.email, password='new') for u in existing]
+        ids = [user.id for user in existing]
+        items += self.fake_data(3)
+        with mock.patch.object(service, 'commit') as commit:
+            service.upsert_many(items, ['email'], chunk_size=2)
+            self.assertEquals(3, commit.call_count)
+
+        service.commit()
+        db.session.remove()
+        self.assertEquals(5, User.query.count())
+        for id in ids:
+            self.assertEquals('new', User.query.get(id).password)
+
+    def test_upsert_by_primary_key(self):
+        """ Upserting by primary key updates existing row """
+        user = self.create_fake_data()[0]
+        id = user.id
+        data = dict(id=id, email='changed@example.com', password='new')
+        UserService().upsert(data)
+        db.session.remove()
+        self.assertEquals(1, User.query.count())
+        self.assertEquals('changed@example.com', User.query.get(id).email)
+
+    def test_upsert_can_limit_updated_columns(self):
+        """ Upserting with no columns to update skips conflicting rows """
+        user = self.create_fake_data()[0]
+        service = UserService()
+        id = user.id
+        data = dict(email=user.email, password='new')
+        service.upsert(data, ['email'], update_columns=[])
+        db.session.remove()
+        self.assertEquals('secret', User.query.get(id).password)
+
+    def test_upsert_compiles_to_native_statements(self):
+        """ Upsert statements compile to dialect-specific syntax """
+        from sqlalchemy.dialects import mysql, postgresql
+        service = UserService()
+        table = User.__table__
+
+        statement = service._upsert_statement(
+            'postgresql', table, ['email'], ['password']
+        )
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.assertIn('ON CONFLICT (email) DO UPDATE', sql)
+
+        statement = service._upsert_statement(
+            'mysql', table, ['email'], ['password']
+        )
+        sql = str(statement.compile(dialect=mysql.dialect()))
+        self.assertIn('ON DUPLICATE KEY UPDATE', sql)
+
+        with self.assertRaises(ValueError):
+            service._upsert_statement('oracle', table, ['email'], [])
+
+    def test_upsert_fails_on_unknown_column(self):
+        """ Upserting with unknown conflict column fails """
+        with self.assertRaises(ValueError):
+            UserService().upsert(dict(email='me@example.com'), ['nope'])
+
+    # ------------------------------------------------------------------------
+    # Set-based updates and deletes
+    # ------------------------------------------------------------------------
+
+    def test_can_update_where(self):
+        """ Updating rows by criteria in one statement """
+        users = self.create_fake_data(3)
+        service = UserService()
+        email = users[0].email
+        affected = service.update_where(dict(_password='new'), _email=email)
+        self.assertEquals(1, affected)
+        self.assertEquals('new', users[0].password)
+        self.assertEquals('secret', users[1].password)
+
+    def test_update_where_requires_values(self):
+        """ Updating rows requires values """
+        with self.assertRaises(ValueError):
+            UserService().update_where(dict())
+
+    def test_where_requires_criteria(self):
+        """ Updating or deleting without criteria must be explicit """
+        self.create_fake_data(2)
+        service = UserService()
+        with self.assertRaises(ValueError):
+            service.update_where(dict(_password='new'))
+        with self.assertRaises(ValueError):
+            service.delete_where(chunk_size=2)
+        self.assertEquals(2, service.delete_where(all_rows=True))
+
+    def test_chunking_requires_integer_primary_key(self):
+        """ Chunking by primary key ranges fails on non-integer keys """
+        from sqlalchemy import String
+        self.create_fake_data(2)
+        with mock.patch.object(User.__table__.c.id, 'type', String()):
+            with self.assertRaises(ValueError):
+                UserService().delete_where(chunk_size=2, all_rows=True)
+        self.assertEquals(2, User.query.count())
+
+    def test_can_delete_where(self):
+        """ Deleting rows by criteria in one statement """
+        users = self.create_fake_data(3)
+        service = UserService()
+        self.assertEquals(1, service.delete_where(_email=users[1].email))
+        self.assertNotIn(users[1], db.session)
+        self.assertEquals(2, User.query.count())
+
+    def test_can_delete_where_in_chunks(self):
+        """ Deleting rows in primary key ranges """
+        self.create_fake_data(5)
+        service = UserService()
+        with mock.patch.object(service, 'commit') as commit:
+            affected = service.delete_where(chunk_size=2, _password='secret')
+            self.assertEquals(3, commit.call_count)
+
+        service.commit()
+        self.assertEquals(5, affected)
+        self.assertEquals(0, User.query.count())
+
+    def test_can_update_where_in_chunks(self):
+        """ Updating rows in primary key ranges evaluates criteria """
+        from warnings import catch_warnings, simplefilter
+        from sqlalchemy.exc import SAWarning
+        users = self.create_fake_data(3)
+        service = UserService()
+        with catch_warnings():
+            simplefilter('error', SAWarning)
+            values = dict(_password='new')
+            affected = service.update_where(
+                values,
+                chunk_size=2,
+                all_rows=True
+            )
+
+        self.assertEquals(3, affected)
+        self.assertEquals(['new'] * 3, [user.password for user in users])
+
+    def test_chunked_delete_where_with_no_matches(self):
+        """ Chunked delete does nothing when nothing matches """
+        self.create_fake_data(2)
+        affected = UserService().delete_where(chunk_size=2, _password='nope')
+        self.assertEquals(0, affected)
+        self.assertEquals(2, User.query.count())
+
+    # ------------------------------------------------------------------------
+    # Collections
+    # ------------------------------------------------------------------------
+
+    def test_collection_filters_by_arguments(self):
+        """ Getting collection filtered by arguments """
+        users = self.create_fake_data(3)
+        service = UserService()
+        collection = service.collection(_email=users[1].email)
+        self.assertEquals([users[1]], collection.items)
+
+        collection = service.collection(_email=users[2].email)
+        self.assertEquals([users[2]], collection.items)
+
+    def test_collection_filters_by_none(self):
+        """ None filters compile to IS NULL """
+        self.create_fake_data(2)
+        collection = UserService().collection(_password=None)
+        self.assertEquals(0, collection.total_items)
+
+    def test_collection_reuses_query_template(self):
+        """ Collection base queries are built once per loading profile """
+        service = UserService()
+        template = service.collection_template()
+        self.assertIs(template, service.collection_template())
+        self.assertIsNone(template.session)
+        with mock.patch.object(service, 'loading_options') as options:
+            service.collection()
+            options.assert_not_called()
+
+    def test_collection_paginates(self):
+        """ Collection pages are ordered by primary key """
+        users = self.create_fake_data(5)
+        collection = UserService().collection(page=2, per_page=2)
+        self.assertEquals(5, collection.total_items)
+        self.assertEquals(users[2:4], collection.items)
+
+    # ------------------------------------------------------------------------
+    # Getting multiple
+    # ------------------------------------------------------------------------
+
+    def test_get_multiple_preserves_order(self):
+        """ Getting multiple entities in order of ids """
+        ids = [user.id for user in self.create_fake_data(5)]
+        db.session.remove()
+        requested = [ids[3], ids[0], ids[4], ids[0], ids[1]]
+        result = UserService().get_multiple(requested, chunk_size=2)
+        self.assertEquals([ids[3], ids[0], ids[4], ids[1]], [u.id for u in result])
+
+    def test_get_multiple_can_mark_missing(self):
+        """ Getting multiple entities with missing ones marked """
+        ids = [user.id for user in self.create_fake_data(2)]
+        db.session.remove()
+        service = UserService()
+        result = service.get_multiple([ids[0], 999, ids[1]])
+        self.assertEquals([ids[0], ids[1]], [u.id for u in result])
+
+        result = service.get_multiple([ids[0], 999, ids[1]], mark_missing=True)
+        self.assertEquals(ids[0], result[0].id)
+        self.assertIsNone(result[1])
+        self.assertEquals(ids[1], result[2].id)
+
+    def test_get_multiple_accepts_string_ids(self):
+        """ Getting multiple entities by ids that came in as strings """
+        ids = [user.id for user in self.create_fake_data(2)]
+        db.session.remove()
+        requested = [str(ids[1]), str(ids[0]), ids[1], 'nope']
+        result = UserService().get_multiple(requested, mark_missing=True)
+        self.assertEquals([ids[1], ids[0]], [u.id for u in result[:2]])
+        self.assertIsNone(result[2])
+
+    def test_get_multiple_uses_identity_map(self):
+        """ Getting multiple entities skips those loaded into session """
+        ids = [user.id for user in self.create_fake_data(3)]
+        db.session.remove()
+        service = UserService()
+        loaded = service.get(ids[1])
+
+        with mock.patch('sqlalchemy.orm.Query.filter') as query_filter:
+            query_filter.return_value.all.return_value = []
+            service.get_multiple([ids[1]])
+            query_filter.assert_not_called()
+
+        result = service.get_multiple(ids)
+        self.assertIs(loaded, result[1])
@@ -0,0 +1,121 @@
+import asyncio
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from werkzeug.exceptions import NotFound
+from boiler.abstract.async_service import AsyncAbstractService
+from boiler.abstract.async_service import async_session_scope
+from boiler.feature.orm import db, get_async_database_uri
+from boiler import exceptions as x
+from tests.boiler_test_app.models import User
+
+
+class AsyncUserService(AsyncAbstractService):
+    """ Async user service to test async abstract service """
+    __model__ = User
+
+
+@attr('kernel', 'service', 'async_service')
+class AsyncServiceTest(BoilerTestCase):
+    """
+    Async service tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+
+    def create_users(self, count=3):
+        """ Create some users to query """
+        for i in range(count):
+            email = 'user{}@example.com'.format(i)
+            db.session.add(User(email=email, password='secret'))
+        db.session.commit()
+
+    def run_async(self, coroutine):
+        """ Run coroutine in app context """
+        return asyncio.run(coroutine)
+
+    def test_derive_async_database_uri(self):
+        """ Deriving async database uri from sync one """
+        uri = get_async_database_uri(self.app)
+        self.assertTrue(uri.startswith('sqlite+aiosqlite:///'))
+
+    def test_raise_on_unknown_async_driver(self):
+        """ Raise when async uri can not be derived """
+        config = {'SQLALCHEMY_DATABASE_URI': 'oracle://db'}
+        with mock.patch.dict(self.app.config, config):
+            with self.assertRaises(x.BootstrapException):
+                get_async_database_uri(self.app)
+
+    def test_create_and_get(self):
+        """ Creating and getting model asynchronously """
+        service = AsyncUserService()
+
+        async def work():
+            user = await service.create(email='me@me.com', password='x')
+            return await service.get(user.id)
+
+        user = self.run_async(work())
+        self.assertEquals('me@me.com', user.email)
+        self.assertEquals(1, User.query.count())
+
+    def test_get_or_404(self):
+        """ Async get or 404 aborts when nothing is found """
+        service = AsyncUserService()
+        with self.assertRaises(NotFound):
+            self.run_async(service.get_or_404(123))
+
+    def test_find_and_first(self):
+        """ Finding models asynchronously """
+        self.create_users()
+        service = AsyncUserService()
+        found = self.run_async(service.find(email='user1@example.com'))
+        self.assertEquals(1, len(found))
+        first = self.run_async(service.first(email='user2@example.com'))
+        self.assertEquals('user2@example.com', first.email)
+        self.assertIsNone(self.run_async(service.first(email='nope')))
+
+    def test_save_within_scope(self):
+        """ Saving model loaded within session scope """
+        self.create_users(1)
+        service = AsyncUserService()
+
+        async def work():
+            async with async_session_scope():
+                user = await service.first(email='user0@example.com')
+                user.password = 'changed'
+                await service.save(user)
+
+        self.run_async(work())
+        db.session.remove()
+        self.assertEquals('changed', User.query.first().password)
+
+    def test_delete_detached(self):
+        """ Deleting detached model merges it into session """
+        self.create_users(2)
+        service = AsyncUserService()
+        user = self.run_async(service.first(email='user0@example.com'))
+        self.run_async(service.delete(user))
+        self.assertEquals(1, User.query.count())
+
+    def test_collection(self):
+        """ Getting a page of models as async collection """
+        self.create_users(5)
+        service = AsyncUserService()
+        collection = self.run_async(service.collection(page=2, per_page=2))
+        self.assertEquals(5, collection.total_items)
+        self.assertEquals(3, collection.total_pages)
+        self.assertEquals(2, len(collection.items))
+        self.assertEquals('user2@example.com', collection.items[0].email)
+
+    def test_serialized_collection(self):
+        """ Getting serialized async collection """
+        self.create_users(2)
+        service = AsyncUserService()
+        collection = service.collection(serialized=lambda u: u.email)
+        collection = self.run_async(collection)
+        items = collection.dict()['items']
+        self.assertEquals(['user0@example.com', 'user1@example.com'], items)
@@ -0,0 +1,138 @@
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from flask import g
+from sqlalchemy import inspect
+from sqlalchemy.exc import InvalidRequestError
+from boiler.feature.orm import db, detect_lazy_loads
+from boiler import exceptions as x
+from tests.boiler_test_app.models import User, Post
+from tests.boiler_test_app.services import PostService
+
+
+@attr('kernel', 'service', 'loading_profiles')
+class LoadingProfilesTest(BoilerTestCase):
+    """
+    Loading profiles tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        for i in range(3):
+            user = User(email='user{}@example.com'.format(i), password='x')
+            user.posts.append(Post(title='Post {}'.format(i)))
+            db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+
+    def test_fail_on_unknown_profile(self):
+        """ Using undefined loading profile fails """
+        with self.assertRaises(ValueError):
+            PostService().with_profile('nope')
+
+    def test_find_with_profile(self):
+        """ Finding with a loading profile eagerly loads relationships """
+        posts = PostService().with_profile('api').find()
+        self.assertEquals(3, len(posts))
+        for post in posts:
+            self.assertNotIn('author', inspect(post).unloaded)
+
+    def test_first_with_nested_profile(self):
+        """ Nested relationship paths are loaded """
+        post = PostService().with_profile('nested').first(title='Post 1')
+        self.assertNotIn('author', inspect(post).unloaded)
+        self.assertNotIn('posts', inspect(post.author).unloaded)
+
+    def test_load_only_profile(self):
+        """ Loading only some columns """
+        post = PostService().with_profile('titles').first()
+        self.assertIn('user_id', inspect(post).unloaded)
+
+    def test_get_multiple_with_profile(self):
+        """ Getting multiple entities applies loading profile """
+        posts = PostService().with_profile('api').get_multiple([1, 2])
+        for post in posts:
+            self.assertNotIn('author', inspect(post).unloaded)
+
+    def test_collection_with_profile(self):
+        """ Getting a collection applies loading profile """
+        collection = PostService().with_profile('api').collection(per_page=2)
+        self.assertEquals(3, collection.total_items)
+        self.assertEquals(2, len(collection.items))
+        for post in collection.items:
+            self.assertNotIn('author', inspect(post).unloaded)
+
+    def test_profile_does_not_shadow_filters(self):
+        """ Profile keyword is a filter, not a loading profile name """
+        with self.assertRaises(InvalidRequestError):
+            PostService().find(profile='api')
+
+    def test_serialized_collection(self):
+        """ Getting api collection from service """
+        serialize = lambda post: post.title
+        collection = PostService().collection(serialized=serialize)
+        self.assertEquals(['Post 0', 'Post 1', 'Post 2'], list(collection))
+
+    def test_profile_accepts_loader_options(self):
+        """ Loading profile can be a list of loader options """
+        from sqlalchemy.orm import joinedload
+        service = PostService()
+        profiles = dict(raw=[joinedload(Post.author)])
+        with mock.patch.object(service, '__loading_profiles__', profiles):
+            post = service.with_profile('raw').first()
+        self.assertNotIn('author', inspect(post).unloaded)
+
+
+@attr('kernel', 'service', 'lazy_loads')
+class LazyLoadDetectionTest(BoilerTestCase):
+    """
+    Lazy load detection tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        for i in range(3):
+            user = User(email='user{}@example.com'.format(i), password='x')
+            user.posts.append(Post(title='Post {}'.format(i)))
+            db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+        detect_lazy_loads()
+        g.pop('boiler_lazy_loads', None)
+
+    def tearDown(self):
+        self.app.config['ORM_LAZY_LOAD_THRESHOLD'] = None
+        self.app.config['ORM_LAZY_LOAD_RAISE'] = False
+        super().tearDown()
+
+    def test_count_lazy_loads(self):
+        """ Lazy loads are counted per app context """
+        self.app.config['ORM_LAZY_LOAD_THRESHOLD'] = 10
+        [post.author for post in PostService().find()]
+        self.assertEquals(3, g.boiler_lazy_loads)
+
+    def test_eager_loads_are_not_counted(self):
+        """ Eager loading does not count as lazy loads """
+        self.app.config['ORM_LAZY_LOAD_THRESHOLD'] = 10
+        [post.author for post in PostService().with_profile('api').find()]
+        self.assertEquals(0, g.get('boiler_lazy_loads', 0))
+
+    def test_warn_past_threshold(self):
+        """ Warning is logged once past lazy load threshold """
+        self.app.config['ORM_LAZY_LOAD_THRESHOLD'] = 1
+        with mock.patch.object(self.app.logger, 'warning') as warning:
+            [post.author for post in PostService().find()]
+        warning.assert_called_once()
+        self.assertIn('author', warning.call_args[0][0])
+
+    def test_raise_past_threshold(self):
+        """ Exception is raised past lazy load threshold if configured """
+        self.app.config['ORM_LAZY_LOAD_THRESHOLD'] = 1
+        self.app.config['ORM_LAZY_LOAD_RAISE'] = True
+        with self.assertRaises(x.LazyLoadException):
+            [post.author for post in PostService().find()]
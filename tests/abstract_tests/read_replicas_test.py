@@ -0,0 +1,96 @@
+import os
+from shutil import copyfile
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from sqlalchemy import create_engine, text
+from boiler.feature.orm import init_replicas, ReplicaSet
+from tests.boiler_test_app.models import User
+from tests.boiler_test_app.services import UserService
+
+
+@attr('kernel', 'service', 'read_replicas')
+class ReadReplicasTest(BoilerTestCase):
+    """
+    Read replicas tests
+    These are integration tests and will require an actual database. We
+    use a copy of test database as replica and put a marker user only into
+    replica to see where reads go.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        path = os.path.split(self.app.config['TEST_DB_PATH'])[0]
+        self.replica_path = os.path.join(path, 'replica.db')
+        copyfile(self.app.config['TEST_DB_PATH'], self.replica_path)
+
+        replica = create_engine('sqlite:///' + self.replica_path)
+        with replica.begin() as connection:
+            sql = "INSERT INTO user (email) VALUES ('replica@example.com')"
+            connection.execute(text(sql))
+        replica.dispose()
+
+        uri = 'sqlite:///' + self.replica_path
+        self.app.config['SQLALCHEMY_REPLICA_URIS'] = [uri]
+        init_replicas(self.app)
+
+    def tearDown(self):
+        self.app.extensions.pop('boiler_replicas', None)
+        self.app.config['SQLALCHEMY_REPLICA_URIS'] = []
+        super().tearDown()
+        os.remove(self.replica_path)
+
+    def test_service_reads_go_to_replica(self):
+        """ Service reads are routed to replica """
+        service = UserService()
+        user = service.first(email='replica@example.com')
+        self.assertIsNotNone(user)
+        self.assertEquals(1, len(service.find()))
+        self.assertIsNotNone(service.get(user.id))
+        self.assertEquals(1, service.collection().total_items)
+
+    def test_plain_queries_stay_on_primary(self):
+        """ Queries that are not flagged stay on primary """
+        self.assertEquals(0, User.query.count())
+
+    def test_read_your_writes(self):
+        """ Reads go to primary once session wrote something """
+        service = UserService()
+        service.create(email='primary@example.com', password='secret')
+        emails = [user.email for user in service.find()]
+        self.assertEquals(['primary@example.com'], emails)
+
+    def test_round_robin(self):
+        """ Replicas are picked round robin """
+        replicas = ReplicaSet(['sqlite://', 'sqlite://'])
+        first = replicas.engine()
+        second = replicas.engine()
+        self.assertIsNot(first, second)
+        self.assertIs(first, replicas.engine())
+
+    def test_skip_unhealthy_replica(self):
+        """ Replicas failing health check are skipped """
+        bad = 'sqlite:////nonexistent/dir/replica.db'
+        replicas = ReplicaSet([bad, 'sqlite://'], health_interval=30)
+        good = replicas.get_engine(1)
+        self.assertIs(good, replicas.engine())
+        self.assertIs(good, replicas.engine())
+        self.assertFalse(replicas.healthy(0))
+
+    def test_fall_back_to_primary_when_all_replicas_down(self):
+        """ Reads go to primary if all replicas are down """
+        replicas = self.app.extensions['boiler_replicas']
+        replicas.mark_down(0)
+        self.assertIsNone(replicas.engine())
+        service = UserService()
+        self.assertIsNone(service.first(email='replica@example.com'))
+
+    def test_recheck_replica_after_interval(self):
+        """ Replica is checked again after health interval """
+        replicas = ReplicaSet(['sqlite://'], health_interval=30)
+        replicas.mark_down(0)
+        self.assertIsNone(replicas.engine())
+        with mock.patch('time.monotonic', return_value=10 ** 9):
+            self.assertIsNotNone(replicas.engine())
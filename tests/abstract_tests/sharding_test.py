@@ -0,0 +1,132 @@
+import os
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from sqlalchemy import text
+from boiler.feature.orm import db, route_shard, shard_for
+from boiler.cli.db import get_config
+from boiler import exceptions as x
+from tests.boiler_test_app.services import NoteService
+
+
+@attr('kernel', 'service', 'sharding')
+class ShardingTest(BoilerTestCase):
+    """
+    Sharding tests
+    These are integration tests and will require an actual database. Notes
+    are sharded by tenant across two sqlite shards next to test database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        path = os.path.split(self.app.config['TEST_DB_PATH'])[0]
+        self.shards = ['shard_0', 'shard_1']
+        self.shard_paths = []
+        binds = dict()
+        for shard in self.shards:
+            shard_path = os.path.join(path, shard + '.db')
+            self.shard_paths.append(shard_path)
+            binds[shard] = 'sqlite:///' + shard_path
+
+        config = dict(SQLALCHEMY_BINDS=binds, SQLALCHEMY_SHARDS=self.shards)
+        self.config = mock.patch.dict(self.app.config, config)
+        self.config.start()
+        db.create_all(bind=self.shards)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all(bind=self.shards)
+        for shard in self.shards:
+            db.get_engine(self.app, bind=shard).dispose()
+        self.config.stop()
+        super().tearDown()
+        for shard_path in self.shard_paths:
+            os.remove(shard_path)
+
+    def count(self, shard):
+        """ Count notes on a shard """
+        engine = db.get_engine(self.app, bind=shard)
+        with engine.connect() as connection:
+            sql = text('SELECT COUNT(*) FROM note')
+            return connection.execute(sql).scalar()
+
+    def test_sharded_tables_live_on_shards(self):
+        """ Sharded tables are created on shards instead of main db """
+        main = [table.name for table in db.get_tables_for_bind()]
+        shard = [table.name for table in db.get_tables_for_bind('shard_0')]
+        self.assertNotIn('note', main)
+        self.assertIn('user', main)
+        self.assertEquals(['note'], shard)
+
+    def test_route_shard(self):
+        """ Default router spreads keys across shards """
+        self.assertEquals('shard_1', route_shard(3, self.shards))
+        self.assertEquals('shard_0', route_shard(4, self.shards))
+        key = 'tenant-a'
+        self.assertEquals(route_shard(key, self.shards), shard_for(key))
+
+    def test_custom_shard_router(self):
+        """ Using custom shard router """
+        router = lambda key, shards: shards[0]
+        with mock.patch.dict(self.app.config, SQLALCHEMY_SHARD_ROUTER=router):
+            self.assertEquals('shard_0', shard_for(1))
+
+        router = lambda key, shards: 'nope'
+        with mock.patch.dict(self.app.config, SQLALCHEMY_SHARD_ROUTER=router):
+            with self.assertRaises(x.ShardingException):
+                shard_for(1)
+
+    def test_raise_if_no_shard_selected(self):
+        """ Sharded models require a shard """
+        with self.assertRaises(x.ShardingException):
+            NoteService().find()
+
+    def test_service_writes_and_reads_shard(self):
+        """ Service writes to and reads from shard of the key """
+        service = NoteService()
+        with service.shard(1):
+            service.create(id=1, tenant_id=1, text='one')
+        with service.shard(2):
+            service.create(id=2, tenant_id=2, text='two')
+            service.create(id=4, tenant_id=2, text='four')
+
+        self.assertEquals(2, self.count('shard_0'))
+        self.assertEquals(1, self.count('shard_1'))
+        with service.shard(2):
+            notes = service.find()
+            self.assertEquals([2, 4], sorted(note.id for note in notes))
+            self.assertEquals(2, service.collection().total_items)
+
+    def test_bulk_writes_go_to_shard(self):
+        """ Bulk core statements are routed by model """
+        service = NoteService()
+        with service.shard(1):
+            service.create_many([dict(id=1, tenant_id=1, text='one')])
+            service.upsert(dict(id=3, tenant_id=1, text='three'))
+
+        self.assertEquals(2, self.count('shard_1'))
+        self.assertEquals(0, self.count('shard_0'))
+
+    def test_main_database_without_shards(self):
+        """ Sharded models use main database if app has no shards """
+        self.app.config['SQLALCHEMY_SHARDS'] = []
+        service = NoteService()
+        service.create(tenant_id=1, text='one')
+        self.assertEquals(1, len(service.find()))
+
+    def test_migrations_config_per_bind(self):
+        """ Migrations of shards share a directory and see shard tables """
+        with mock.patch('boiler.bootstrap.get_app', return_value=self.app):
+            main = get_config()
+            shard = get_config('shard_1')
+            with self.assertRaises(Exception):
+                get_config('all')
+
+        self.assertNotIn('note', main.tables)
+        self.assertEquals(['note'], shard.tables)
+        self.assertEquals('shard_1', shard.bind)
+        self.assertEquals('shards', os.path.basename(shard.dir))
+        expected = self.app.config['SQLALCHEMY_BINDS']['shard_1']
+        self.assertEquals(expected, shard.get_main_option('sqlalchemy.url'))
@@ -0,0 +1,151 @@
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from flask import Flask, abort
+from boiler.abstract.unit_of_work import UnitOfWork, in_unit_of_work
+from boiler.abstract.unit_of_work import unit_of_work_per_request
+from boiler.feature.orm import db
+from tests.boiler_test_app.models import User
+from tests.boiler_test_app.services import UserService
+
+
+@attr('kernel', 'service', 'unit_of_work')
+class UnitOfWorkTest(BoilerTestCase):
+    """
+    Unit of work tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+
+    def user(self, i=1):
+        """ Get a new unsaved user """
+        email = 'user{}@example.com'.format(i)
+        return User(email=email, password='secret')
+
+    def test_commits_once_on_exit(self):
+        """ Service commits within unit of work are coalesced """
+        service = UserService()
+        with mock.patch.object(db.session, 'commit') as commit:
+            with UnitOfWork():
+                self.assertTrue(in_unit_of_work())
+                service.save(self.user(1))
+                service.save(self.user(2))
+                commit.assert_not_called()
+            commit.assert_called_once()
+        self.assertFalse(in_unit_of_work())
+
+    def test_persists_changes_on_exit(self):
+        """ Changes are committed when unit of work exits """
+        service = UserService()
+        with UnitOfWork():
+            user = service.save(self.user())
+            self.assertIsNotNone(user.id)
+
+        db.session.remove()
+        self.assertEquals(1, User.query.count())
+
+    def test_rolls_back_on_error(self):
+        """ Unit of work rolls back changes on exception """
+        service = UserService()
+        with self.assertRaises(RuntimeError):
+            with UnitOfWork():
+                service.save(self.user(1))
+                service.save(self.user(2))
+                raise RuntimeError('Boom')
+
+        self.assertFalse(in_unit_of_work())
+        self.assertEquals(0, User.query.count())
+
+    def test_can_be_used_as_decorator(self):
+        """ Unit of work works as a decorator """
+        service = UserService()
+
+        @UnitOfWork()
+        def register():
+            service.save(self.user(1))
+            service.save(self.user(2))
+
+        register()
+        db.session.remove()
+        self.assertEquals(2, User.query.count())
+
+    def test_only_outermost_unit_commits(self):
+        """ Nested units of work are committed by outermost """
+        service = UserService()
+        with mock.patch.object(db.session, 'commit') as commit:
+            with UnitOfWork():
+                with UnitOfWork():
+                    service.save(self.user())
+                commit.assert_not_called()
+            commit.assert_called_once()
+
+    def test_failed_nested_unit_rolls_back_outer(self):
+        """ Failure in nested unit of work rolls back whole transaction """
+        service = UserService()
+        with UnitOfWork():
+            service.save(self.user(1))
+            try:
+                with UnitOfWork():
+                    service.save(self.user(2))
+                    raise RuntimeError('Boom')
+            except RuntimeError:
+                pass
+
+        self.assertEquals(0, User.query.count())
+
+    def test_notifies_caches_once(self):
+        """ Tracked changes are sent once on commit """
+        service = UserService()
+        from boiler.abstract.events import changes_committed
+        received = []
+
+        def receiver(sender, changes=None, **kwargs):
+            received.append(len(changes))
+
+        changes_committed.connect(receiver)
+        try:
+            with UnitOfWork():
+                service.save(self.user(1))
+                service.save(self.user(2))
+        finally:
+            changes_committed.disconnect(receiver)
+
+        self.assertEquals([2], received)
+
+    def test_unit_of_work_per_request(self):
+        """ Requests can be wrapped in unit of work """
+        app = Flask(__name__)
+        app.config.update(self.app.config)
+        db.init_app(app)
+        unit_of_work_per_request(app)
+        service = UserService()
+
+        @app.route('/ok/<int:i>')
+        def ok(i):
+            service.save(self.user(i))
+            service.save(self.user(i + 100))
+            return 'ok'
+
+        @app.route('/fail/<int:i>')
+        def fail(i):
+            service.save(self.user(i))
+            abort(400)
+
+        @app.route('/error/<int:i>')
+        def error(i):
+            service.save(self.user(i))
+            raise RuntimeError('Boom')
+
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+        client = app.test_client()
+        self.assertEquals(200, client.get('/ok/1').status_code)
+        self.assertEquals(400, client.get('/fail/2').status_code)
+        self.assertEquals(500, client.get('/error/3').status_code)
+
+        db.session.remove()
+        emails = sorted(u.email for u in User.query.all())
+        self.assertEquals(['user101@example.com', 'user1@example.com'], emails)
@@ -90,3 +90,47 @@ class User(db.Model):
         """ Encode a string and set as password """
         self._password = password
 
+
+
+class Post(db.Model):
+    """
+    Post model
+    Belongs to a user, we use it to test relationship loading
+    """
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    title = db.Column(db.String(128), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    author = db.relationship(User, backref='posts')
+
+
+class Note(db.Model):
+    """
+    Note model
+    A sharded model, spread over shards by tenant
+    """
+    __sharded__ = True
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    tenant_id = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.String(128), nullable=False)
+
+
+class Page(db.Model):
+    """
+    Page model
+    Base of single-table inheritance, we use it to test counting subclasses
+    """
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    title = db.Column(db.String(128), nullable=False)
+    __mapper_args__ = dict(polymorphic_on=kind, polymorphic_identity='page')
+
+
+class Article(Page):
+    """
+    Article model
+    A page subclass stored in the same table
+    """
+    __mapper_args__ = dict(polymorphic_identity='article')
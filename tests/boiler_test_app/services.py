@@ -0,0 +1,31 @@
+from boiler.abstract.abstract_service import AbstractService
+from tests.boiler_test_app.models import User, Post, Note
+
+
+class UserService(AbstractService):
+    """
+    User service
+    A concrete service we use to test abstract service functionality
+    """
+    __model__ = User
+
+
+class PostService(AbstractService):
+    """
+    Post service
+    A concrete service with loading profiles
+    """
+    __model__ = Post
+    __loading_profiles__ = dict(
+        api=dict(joined=['author']),
+        nested=dict(selectin=['author.posts']),
+        titles=dict(load_only=['id', 'title']),
+    )
+
+
+class NoteService(AbstractService):
+    """
+    Note service
+    A concrete service of sharded model
+    """
+    __model__ = Note
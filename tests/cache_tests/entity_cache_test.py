@@ -0,0 +1,101 @@
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from werkzeug.exceptions import NotFound
+from boiler.cache import EntityCache
+from boiler.feature.orm import db
+from tests.boiler_test_app.models import User
+from tests.boiler_test_app.services import UserService
+
+
+class CachedUserService(UserService):
+    """ User service with entity cache enabled """
+    __entity_cache__ = EntityCache()
+
+
+@attr('kernel', 'cache', 'entity_cache')
+class EntityCacheTest(BoilerTestCase):
+    """
+    Entity cache tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        CachedUserService.__entity_cache__.clear()
+
+    def create_user(self, email='user@example.com'):
+        """ Create a user to cache """
+        user = User(email=email, password='secret')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_can_read_through_cache(self):
+        """ Getting entity by id reads through cache """
+        id = self.create_user().id
+        db.session.remove()
+        service = CachedUserService()
+        self.assertEquals(id, service.get(id).id)
+
+        db.session.remove()
+        with mock.patch('sqlalchemy.orm.Query.get') as query_get:
+            cached = service.get(id)
+            query_get.assert_not_called()
+
+        self.assertEquals(id, cached.id)
+        self.assertEquals('user@example.com', cached.email)
+        self.assertIn(cached, db.session)
+
+    def test_prefer_identity_map_over_cache(self):
+        """ Entities in session take precedence over cache """
+        user = self.create_user()
+        service = CachedUserService()
+        service.get(user.id)
+        user.password = 'changed'
+        self.assertIs(user, service.get(user.id))
+        self.assertEquals('changed', service.get(user.id).password)
+
+    def test_invalidate_on_save(self):
+        """ Saving entity invalidates its cached snapshot """
+        id = self.create_user().id
+        db.session.remove()
+        service = CachedUserService()
+        user = service.get(id)
+        user.password = 'changed'
+        service.save(user)
+
+        db.session.remove()
+        self.assertEquals('changed', service.get(id).password)
+
+    def test_invalidate_on_delete(self):
+        """ Deleting entity invalidates its cached snapshot """
+        id = self.create_user().id
+        db.session.remove()
+        service = CachedUserService()
+        service.delete(service.get(id))
+
+        db.session.remove()
+        self.assertIsNone(service.get(id))
+        with self.assertRaises(NotFound):
+            service.get_or_404(id)
+
+    def test_can_get_multiple_through_cache(self):
+        """ Getting multiple entities reads through cache """
+        users = [self.create_user('user{}@example.com'.format(i)) for i in range(3)]
+        ids = [user.id for user in users]
+        db.session.remove()
+        service = CachedUserService()
+        service.get(ids[0])
+
+        db.session.remove()
+        entities = service.get_multiple(ids)
+        self.assertEquals(set(ids), set(e.id for e in entities))
+
+        db.session.remove()
+        with mock.patch('sqlalchemy.orm.Query.all') as query_all:
+            entities = service.get_multiple(ids)
+            query_all.assert_not_called()
+        self.assertEquals(set(ids), set(e.id for e in entities))
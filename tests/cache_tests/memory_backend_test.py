@@ -0,0 +1,39 @@
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+from boiler.cache import MemoryBackend
+
+
+@attr('kernel', 'cache', 'memory_backend')
+class MemoryBackendTest(BoilerTestCase):
+    """ In-memory cache backend tests """
+
+    def test_can_set_and_get_values(self):
+        """ Setting and getting values """
+        backend = MemoryBackend()
+        self.assertIsNone(backend.get('key'))
+        backend.set('key', 'value')
+        self.assertEquals('value', backend.get('key'))
+        backend.delete('key')
+        self.assertIsNone(backend.get('key'))
+
+    def test_evict_least_recently_used(self):
+        """ Evicting least recently used keys when full """
+        backend = MemoryBackend(max_size=2)
+        backend.set('one', 1)
+        backend.set('two', 2)
+        backend.get('one')
+        backend.set('three', 3)
+        self.assertEquals(1, backend.get('one'))
+        self.assertIsNone(backend.get('two'))
+        self.assertEquals(3, backend.get('three'))
+
+    def test_expire_values(self):
+        """ Expiring values after ttl """
+        backend = MemoryBackend()
+        with mock.patch('time.monotonic', return_value=100):
+            backend.set('key', 'value', ttl=10)
+        with mock.patch('time.monotonic', return_value=105):
+            self.assertEquals('value', backend.get('key'))
+        with mock.patch('time.monotonic', return_value=111):
+            self.assertIsNone(backend.get('key'))
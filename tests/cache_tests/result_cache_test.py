@@ -0,0 +1,118 @@
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from faker import Factory
+from boiler.cache import ResultCache
+from boiler.cache.result_cache import query_tables
+from boiler.collections import PaginatedCollection
+from boiler.feature.orm import db
+from tests.boiler_test_app.models import User
+from tests.boiler_test_app.services import UserService
+
+
+@attr('kernel', 'cache', 'result_cache')
+class ResultCacheTest(BoilerTestCase):
+    """
+    Result cache tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+
+    def create_fake_data(self, how_many=1):
+        """ Create a fake data set to cache """
+        fake = Factory.create()
+        items = []
+        for i in range(how_many):
+            user = User(email=fake.email(), password=fake.password())
+            db.session.add(user)
+            db.session.commit()
+            items.append(user)
+
+        return items
+
+    def test_can_get_query_tables(self):
+        """ Getting tables query reads from """
+        self.assertEquals(['user'], query_tables(User.query))
+
+    def test_can_cache_query_results(self):
+        """ Caching query results """
+        items = self.create_fake_data(2)
+        cache = ResultCache()
+        result = cache.all(User.query)
+        self.assertEquals(items, result)
+
+        db.session.remove()
+        with mock.patch('sqlalchemy.orm.Query.all') as query_all:
+            result = cache.all(User.query)
+            query_all.assert_not_called()
+
+        self.assertEquals([i.id for i in items], [i.id for i in result])
+        for item in result:
+            self.assertIn(item, db.session)
+
+    def test_cache_hits_keep_unflushed_changes(self):
+        """ Cached results do not overwrite instances already in session """
+        items = self.create_fake_data(3)
+        cache = ResultCache()
+        id = items[2].id
+        user = User.query.get(id)
+        user._password = 'dirty'
+        for i in range(2):
+            PaginatedCollection(User.query, cache=cache)
+
+        self.assertIn(user, db.session.dirty)
+        self.assertEquals('dirty', user._password)
+        db.session.commit()
+        db.session.remove()
+        self.assertEquals('dirty', User.query.get(id)._password)
+
+    def test_invalidate_on_service_commit(self):
+        """ Service commits invalidate cached results of the model """
+        self.create_fake_data(2)
+        cache = ResultCache()
+        self.assertEquals(2, len(cache.all(User.query)))
+
+        self.create_fake_data(1)
+        self.assertEquals(2, len(cache.all(User.query)))
+
+        service = UserService()
+        service.create(email='new@example.com', password='secret')
+        self.assertEquals(4, len(cache.all(User.query)))
+
+    def test_invalidate_deferred_commits(self):
+        """ Changes saved without commit invalidate on commit """
+        cache = ResultCache()
+        self.assertEquals(0, len(cache.all(User.query)))
+        service = UserService()
+        service.save(service.new(email='new@example.com'), commit=False)
+        self.assertEquals(0, len(cache.all(User.query)))
+        service.commit()
+        self.assertEquals(1, len(cache.all(User.query)))
+
+    def test_can_cache_collections(self):
+        """ Caching paginated collection results """
+        self.create_fake_data(3)
+        cache = ResultCache()
+        collection = PaginatedCollection(User.query, per_page=2, cache=cache)
+        self.assertEquals(3, collection.total_items)
+
+        with mock.patch('sqlalchemy.orm.Query.all') as query_all:
+            with mock.patch('sqlalchemy.orm.Query.count') as query_count:
+                collection = PaginatedCollection(
+                    User.query,
+                    per_page=2,
+                    cache=cache
+                )
+                query_all.assert_not_called()
+                query_count.assert_not_called()
+
+        self.assertEquals(3, collection.total_items)
+        self.assertEquals(2, len(collection.items))
+
+        UserService().delete(collection.items[0])
+        collection = PaginatedCollection(User.query, per_page=2, cache=cache)
+        self.assertEquals(2, collection.total_items)
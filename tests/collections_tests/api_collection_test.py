@@ -91,3 +91,127 @@ class ApiCollectionTests(BoilerTestCase):
         for item in collection:
             self.assertIsInstance(item, str)
             self.assertTrue(item.startswith('<User id='))
+
+    def test_can_stream_collection_as_json(self):
+        """ Streaming API collection as json chunks """
+        from json import loads
+        self.create_fake_data(3)
+        collection = ApiCollection(
+            User.query,
+            per_page=2,
+            serialize_function=self.serializer
+        )
+
+        chunks = list(collection.stream())
+        self.assertEquals(4, len(chunks))
+        self.assertEquals(loads(collection.json()), loads(''.join(chunks)))
+
+    def test_can_stream_empty_collection(self):
+        """ Streaming empty API collection """
+        from json import loads
+        collection = ApiCollection(User.query, serialize_function=self.serializer)
+        streamed = loads(''.join(collection.stream()))
+        self.assertEquals([], streamed['items'])
+
+    def test_can_get_streaming_response(self):
+        """ Getting flask streaming response for API collection """
+        from json import loads
+        self.create_fake_data(2)
+        collection = ApiCollection(User.query, serialize_function=self.serializer)
+        with self.app.test_request_context():
+            response = collection.stream_response()
+            self.assertTrue(response.is_streamed)
+            self.assertEquals('application/json', response.mimetype)
+            data = loads(response.get_data(as_text=True))
+            self.assertEquals(2, len(data['items']))
+
+    def test_raise_without_serializer(self):
+        """ Require a serializer to create collection """
+        with self.assertRaises(ValueError):
+            ApiCollection(User.query)
+
+    def test_can_use_batch_serializer(self):
+        """ Serializing page in one call with batch serializer """
+        self.create_fake_data(3)
+        batches = []
+
+        def serialize_many(items):
+            batches.append(len(items))
+            return [self.serializer(item) for item in items]
+
+        collection = ApiCollection(
+            User.query,
+            per_page=2,
+            serialize_many=serialize_many
+        )
+
+        items = list(collection)
+        self.assertEquals(2, len(items))
+        self.assertEquals(items, collection.dict()['items'])
+        self.assertEquals([2], batches)
+
+        collection.next_page()
+        self.assertEquals(1, len(collection.dict()['items']))
+        self.assertEquals([2, 1], batches)
+
+    def test_memoize_serialized_page(self):
+        """ Iterating and getting dict serializes page only once """
+        self.create_fake_data(2)
+        serializer = mock.Mock(side_effect=self.serializer)
+        collection = ApiCollection(User.query, serialize_function=serializer)
+        list(collection)
+        collection.dict()
+        collection.json()
+        self.assertEquals(2, serializer.call_count)
+
+    def test_can_fingerprint_collection(self):
+        """ Fingerprinting collection without fetching items """
+        self.create_fake_data(2)
+        first = ApiCollection.fingerprint(User.query, version_column=User.id)
+        again = ApiCollection.fingerprint(User.query, version_column=User.id)
+        self.assertEquals(first, again)
+
+        page = ApiCollection.fingerprint(User.query, page=2)
+        self.assertNotEquals(page, ApiCollection.fingerprint(User.query))
+
+        self.create_fake_data(1)
+        changed = ApiCollection.fingerprint(User.query, version_column=User.id)
+        self.assertNotEquals(first, changed)
+
+    def test_conditional_response_requires_version_column(self):
+        """ Conditional response requires version column to detect updates """
+        with self.app.test_request_context():
+            with self.assertRaises(TypeError):
+                ApiCollection.conditional_response(
+                    User.query,
+                    serialize_function=self.serializer
+                )
+
+    def test_can_respond_not_modified(self):
+        """ Responding with 304 if etag matches """
+        self.create_fake_data(2)
+        serializer = mock.Mock(side_effect=self.serializer)
+        with self.app.test_request_context():
+            response = ApiCollection.conditional_response(
+                User.query,
+                version_column=User.id,
+                serialize_function=serializer
+            )
+            self.assertEquals(200, response.status_code)
+            etag, _ = response.get_etag()
+            self.assertIsNotNone(etag)
+            self.assertEquals(2, serializer.call_count)
+
+        headers = {'If-None-Match': '"{}"'.format(etag)}
+        with self.app.test_request_context(headers=headers):
+            path = 'boiler.collections.api_collection.ApiCollection.__init__'
+            with mock.patch(path) as init:
+                response = ApiCollection.conditional_response(
+                    User.query,
+                    version_column=User.id,
+                    serialize_function=serializer
+                )
+                init.assert_not_called()
+
+            self.assertEquals(304, response.status_code)
+            self.assertEquals(2, serializer.call_count)
@@ -0,0 +1,102 @@
+import asyncio
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from sqlalchemy import select
+from boiler.abstract.async_service import async_session_scope
+from boiler.collections.async_collection import AsyncPaginatedCollection
+from boiler.collections.async_collection import AsyncApiCollection
+from boiler.collections import PaginatedCollection
+from boiler.feature.orm import db
+from tests.boiler_test_app.models import User
+
+
+@attr('kernel', 'collections', 'async_collection')
+class AsyncCollectionTest(BoilerTestCase):
+    """
+    Async collection tests
+    These are integration tests and will require an actual database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        for i in range(25):
+            email = 'user{}@example.com'.format(i)
+            db.session.add(User(email=email, password='secret'))
+        db.session.commit()
+
+    def test_await_collection(self):
+        """ Awaiting collection fetches first page """
+        async def work():
+            async with async_session_scope() as session:
+                statement = select(User).order_by(User.id)
+                return await AsyncPaginatedCollection(session, statement)
+
+        collection = asyncio.run(work())
+        self.assertEquals(25, collection.total_items)
+        self.assertEquals(3, collection.total_pages)
+        self.assertEquals(10, len(collection.items))
+        self.assertTrue(collection.is_first_page())
+        self.assertEquals(2, collection.pagination['next'])
+
+    def test_navigate_pages(self):
+        """ Navigating async collection pages """
+        async def work():
+            async with async_session_scope() as session:
+                statement = select(User).order_by(User.id)
+                collection = await AsyncPaginatedCollection(
+                    session,
+                    statement,
+                    page=2
+                )
+                self.assertTrue(await collection.next_page())
+                self.assertFalse(await collection.next_page())
+                self.assertEquals(5, len(collection.items))
+                self.assertTrue(await collection.previous_page())
+                return collection
+
+        collection = asyncio.run(work())
+        self.assertEquals(2, collection.page)
+
+    def test_fetch_columns(self):
+        """ Collection of multiple columns returns rows """
+        async def work():
+            async with async_session_scope() as session:
+                statement = select(User.id, User.email).order_by(User.id)
+                return await AsyncPaginatedCollection(session, statement)
+
+        collection = asyncio.run(work())
+        self.assertEquals('user0@example.com', collection.items[0][1])
+
+    def test_api_collection(self):
+        """ Async api collection serializes items """
+        async def work():
+            async with async_session_scope() as session:
+                statement = select(User).order_by(User.id)
+                return await AsyncApiCollection(
+                    session,
+                    statement,
+                    per_page=2,
+                    serialize_function=lambda user: dict(email=user.email)
+                )
+
+        collection = asyncio.run(work())
+        items = collection.dict()['items']
+        self.assertEquals([{'email': 'user0@example.com'},
+                           {'email': 'user1@example.com'}], items)
+
+    def test_api_collection_requires_serializer(self):
+        """ Async api collection requires a serializer """
+        with self.assertRaises(ValueError):
+            AsyncApiCollection(None, select(User))
+
+    def test_sync_only_features_are_not_inherited(self):
+        """ Async collections do not inherit sync-only features """
+        for name in ('to_columns', 'iter_all', 'fingerprint',
+                     'conditional_response'):
+            self.assertFalse(hasattr(AsyncApiCollection, name))
+        self.assertNotIsInstance(
+            AsyncApiCollection(None, select(User), serialize_function=str),
+            PaginatedCollection
+        )
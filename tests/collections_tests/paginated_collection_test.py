@@ -4,7 +4,8 @@ from tests.base_testcase import BoilerTestCase
 
 from faker import Factory
 from boiler.collections import PaginatedCollection
-from tests.boiler_test_app.models import User
+from boiler.collections import CappedCount, CachedCount, EstimatedCount
+from tests.boiler_test_app.models import User, Page, Article
 from boiler.feature.orm import db
 from pprint import pprint as pp
 
@@ -159,3 +160,355 @@ class PaginatedCollectionTests(BoilerTestCase):
 
         # as dict
         self.assertIn('pagination', collection.dict())
+
+    # ------------------------------------------------------------------------
+    # Keyset pagination
+    # ------------------------------------------------------------------------
+
+    def test_can_fetch_keyset_page(self):
+        """ Fetching first page in keyset mode """
+        items = self.create_fake_data(3)
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            keyset=[User.id]
+        )
+
+        self.assertEquals([i.id for i in items[:2]], [i.id for i in collection])
+        self.assertTrue(collection.is_first_page())
+        self.assertFalse(collection.is_last_page())
+        self.assertIsNone(collection.previous_cursor)
+        self.assertIsInstance(collection.next_cursor, str)
+
+    def test_can_walk_keyset_pages_with_cursors(self):
+        """ Walking keyset pages back and forth """
+        items = self.create_fake_data(5)
+        ids = [item.id for item in items]
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            keyset=[User.id]
+        )
+
+        self.assertTrue(collection.next_page())
+        self.assertEquals(ids[2:4], [i.id for i in collection.items])
+        self.assertTrue(collection.next_page())
+        self.assertEquals(ids[4:], [i.id for i in collection.items])
+        self.assertTrue(collection.is_last_page())
+        self.assertFalse(collection.next_page())
+
+        self.assertTrue(collection.previous_page())
+        self.assertEquals(ids[2:4], [i.id for i in collection.items])
+        self.assertTrue(collection.previous_page())
+        self.assertEquals(ids[:2], [i.id for i in collection.items])
+        self.assertTrue(collection.is_first_page())
+
+    def test_can_fetch_keyset_page_by_cursor(self):
+        """ Fetching keyset page by cursor token """
+        items = self.create_fake_data(4)
+        first = PaginatedCollection(
+            User.query,
+            per_page=2,
+            keyset=[User.id.desc()]
+        )
+        self.assertEquals([items[3].id, items[2].id], [i.id for i in first])
+
+        second = PaginatedCollection(
+            User.query,
+            per_page=2,
+            keyset=[User.id.desc()],
+            cursor=first.next_cursor,
+            page=2
+        )
+        self.assertEquals([items[1].id, items[0].id], [i.id for i in second])
+
+        collection = second.dict()
+        self.assertIsNone(collection['next_cursor'])
+        self.assertIsNotNone(collection['previous_cursor'])
+        self.assertEquals(1, collection['pagination']['previous'])
+        self.assertIsNone(collection['pagination']['next'])
+
+    def test_raise_on_invalid_cursor(self):
+        """ Raise on malformed cursor token """
+        from boiler.exceptions import InvalidCursor
+        with self.assertRaises(InvalidCursor):
+            PaginatedCollection(User.query, keyset=[User.id], cursor='nope')
+
+    # ------------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------------
+
+    def test_can_iterate_all_items_in_keyset_chunks(self):
+        """ Iterating through all items in chunks """
+        items = self.create_fake_data(5)
+        ids = [item.id for item in items]
+        db.session.expunge_all()
+
+        collection = PaginatedCollection(User.query, per_page=2)
+        with mock.patch.object(collection, '_iter_streamed') as streamed:
+            result = [item.id for item in collection.iter_all(chunk_size=2)]
+            streamed.assert_not_called()
+
+        self.assertEquals(ids, result)
+        for item in collection.items:
+            self.assertIn(item, db.session)
+        self.assertEquals(2, len(db.session.identity_map))
+
+    def test_can_iterate_all_items_with_server_side_cursor(self):
+        """ Iterating through all items using yield_per """
+        items = self.create_fake_data(3)
+        collection = PaginatedCollection(User.query, per_page=1)
+        dialect = db.engine.dialect
+        streamed = mock.Mock(return_value=iter(items))
+        with mock.patch.object(dialect, 'supports_server_side_cursors', True):
+            with mock.patch.object(collection, '_iter_streamed', streamed):
+                result = list(collection.iter_all(chunk_size=2))
+
+        streamed.assert_called_once_with(2)
+        self.assertEquals(items, result)
+        self.assertIn(items[0], db.session)
+        for item in result[1:]:
+            self.assertNotIn(item, db.session)
+
+    # ------------------------------------------------------------------------
+    # Columnar export
+    # ------------------------------------------------------------------------
+
+    def test_can_export_page_to_columns(self):
+        """ Exporting current page to typed column arrays """
+        from array import array
+        items = self.create_fake_data(3)
+        query = User.query.order_by(User.id)
+        collection = PaginatedCollection(query, per_page=2, page=2)
+        with mock.patch('boiler.collections.columns.numpy', None):
+            columns = collection.to_columns([User.id, User._email])
+
+        self.assertEquals(['id', '_email'], list(columns.keys()))
+        self.assertIsInstance(columns['id'], array)
+        self.assertEquals('q', columns['id'].typecode)
+        self.assertEquals([items[2].id], list(columns['id']))
+        self.assertEquals([items[2].email], columns['_email'])
+
+    def test_can_export_keyset_page_to_columns(self):
+        """ Exporting keyset page to columns preserves page order """
+        items = self.create_fake_data(4)
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            keyset=[User.id]
+        )
+        collection.next_page()
+        collection.previous_page()
+        with mock.patch('boiler.collections.columns.numpy', None):
+            columns = collection.to_columns([User.id])
+
+        self.assertEquals([i.id for i in items[:2]], list(columns['id']))
+
+    def test_keyset_page_columns_are_contiguous(self):
+        """ Previous keyset page exports to contiguous numpy arrays """
+        items = self.create_fake_data(4)
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            keyset=[User.id]
+        )
+        collection.next_page()
+        collection.previous_page()
+        columns = collection.to_columns([User.id])
+        self.assertTrue(columns['id'].flags['C_CONTIGUOUS'])
+        self.assertEquals([i.id for i in items[:2]], list(columns['id']))
+
+    def test_export_empty_page_to_columns(self):
+        """ Exporting empty page to columns """
+        collection = PaginatedCollection(User.query)
+        with mock.patch('boiler.collections.columns.numpy', None):
+            columns = collection.to_columns([User.id])
+        self.assertEquals(0, len(columns['id']))
+
+    # ------------------------------------------------------------------------
+    # Window count
+    # ------------------------------------------------------------------------
+
+    def test_can_fetch_page_with_window_count(self):
+        """ Fetching total and page items in one query """
+        items = self.create_fake_data(5)
+        counter = mock.Mock()
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            page=2,
+            counter=counter,
+            window_count=True
+        )
+
+        self.assertTrue(collection.window_count)
+        counter.count.assert_not_called()
+        self.assertEquals(5, collection.total_items)
+        self.assertEquals(3, collection.total_pages)
+        self.assertEquals([i.id for i in items[2:4]], [i.id for i in collection])
+
+        collection.next_page()
+        self.assertEquals([items[4].id], [i.id for i in collection])
+        self.assertTrue(collection.is_last_page())
+
+    def test_window_count_on_out_of_range_page(self):
+        """ Window count falls back to count query past last page """
+        self.create_fake_data(2)
+        collection = PaginatedCollection(User.query, page=5, window_count=True)
+        self.assertEquals(2, collection.total_items)
+        self.assertEquals([], collection.items)
+
+    def test_window_count_falls_back_without_support(self):
+        """ Use two queries if backend lacks window functions """
+        self.create_fake_data(2)
+        path = 'boiler.collections.paginated_collection.supports_window_functions'
+        with mock.patch(path, return_value=False):
+            collection = PaginatedCollection(User.query, window_count=True)
+
+        self.assertFalse(collection.window_count)
+        self.assertEquals(2, collection.total_items)
+        self.assertEquals(2, len(collection.items))
+
+    def test_window_count_falls_back_for_distinct_queries(self):
+        """ Use two queries if window count would count duplicates """
+        self.create_fake_data(3)
+        User.query.update(dict(_password='same'))
+        db.session.commit()
+        query = db.session.query(User._password).distinct()
+        collection = PaginatedCollection(query, window_count=True)
+        self.assertFalse(collection.window_count)
+        self.assertEquals(1, collection.total_items)
+        self.assertEquals(1, len(collection.items))
+
+    # ------------------------------------------------------------------------
+    # Counting strategies
+    # ------------------------------------------------------------------------
+
+    def test_exact_count_counts_flat(self):
+        """ Plain entity queries are counted without a subquery """
+        self.create_fake_data(3)
+        query = User.query.filter(User.id > 1).order_by(User.id)
+        with mock.patch('sqlalchemy.orm.Query.count') as count:
+            collection = PaginatedCollection(query)
+            count.assert_not_called()
+        self.assertEquals(2, collection.total_items)
+
+    def test_exact_count_keeps_inheritance_criteria(self):
+        """ Counting subclasses of single-table inheritance """
+        db.session.add(Page(title='Page'))
+        db.session.add(Article(title='First'))
+        db.session.add(Article(title='Second'))
+        db.session.commit()
+        self.assertEquals(2, PaginatedCollection(Article.query).total_items)
+        self.assertEquals(3, PaginatedCollection(Page.query).total_items)
+
+    def test_exact_count_falls_back_to_subquery(self):
+        """ Queries that change row count are counted with a subquery """
+        self.create_fake_data(3)
+        collection = PaginatedCollection(User.query.limit(2))
+        self.assertEquals(2, collection.total_items)
+
+    def test_can_use_capped_count(self):
+        """ Capped count reports inexact total past the cap """
+        self.create_fake_data(5)
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            counter=CappedCount(cap=3)
+        )
+        self.assertEquals(3, collection.total_items)
+        self.assertFalse(collection.total_exact)
+        self.assertEquals('3+', collection.total_label)
+        self.assertIsNone(collection.pagination['last'])
+        self.assertFalse(collection.dict()['total_exact'])
+
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            counter=CappedCount(cap=10)
+        )
+        self.assertEquals(5, collection.total_items)
+        self.assertTrue(collection.total_exact)
+
+    def test_can_walk_pages_with_inexact_count(self):
+        """ Walking past the capped count bound """
+        self.create_fake_data(5)
+        collection = PaginatedCollection(
+            User.query,
+            per_page=2,
+            page=2,
+            counter=CappedCount(cap=2)
+        )
+        self.assertFalse(collection.is_last_page())
+        self.assertTrue(collection.next_page())
+        self.assertEquals(1, len(collection.items))
+        self.assertTrue(collection.is_last_page())
+
+    def test_estimated_count_falls_back_to_capped_count(self):
+        """ Estimated count uses capped count without planner stats """
+        self.create_fake_data(3)
+        collection = PaginatedCollection(
+            User.query,
+            counter=EstimatedCount(cap=2)
+        )
+        self.assertEquals(2, collection.total_items)
+        self.assertFalse(collection.total_exact)
+
+    def test_estimated_count_passes_bound_parameters(self):
+        """ Planner is asked with values passed as parameters """
+        from sqlalchemy.dialects import postgresql
+        self.create_fake_data(3)
+        query = User.query.filter(User._email != 'at 10 :30')
+        bind = mock.Mock(dialect=postgresql.dialect())
+        plan = [dict(Plan={'Plan Rows': 5000})]
+        execute = 'sqlalchemy.engine.Connection.exec_driver_sql'
+        with mock.patch(execute) as exec_driver_sql:
+            exec_driver_sql.return_value.scalar.return_value = plan
+            with mock.patch(
+                'boiler.collections.counters.query_bind',
+                return_value=bind
+            ):
+                total = EstimatedCount(cap=2).count(query)
+
+        self.assertEquals((5000, False), total)
+        sql, params = exec_driver_sql.call_args[0]
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+        self.assertNotIn('at 10 :30', sql)
+        self.assertIn('at 10 :30', params.values())
+
+    def test_estimated_count_falls_back_if_explain_fails(self):
+        """ Estimated count uses capped count when EXPLAIN fails """
+        from sqlalchemy.dialects import postgresql
+        self.create_fake_data(3)
+        bind = mock.Mock(dialect=postgresql.dialect())
+        with mock.patch(
+            'boiler.collections.counters.query_bind',
+            return_value=bind
+        ):
+            collection = PaginatedCollection(
+                User.query,
+                counter=EstimatedCount(cap=2)
+            )
+
+        self.assertEquals(2, collection.total_items)
+        self.assertFalse(collection.total_exact)
+        self.assertEquals(3, User.query.count())
+
+    def test_can_cache_counts(self):
+        """ Cached count reuses results for the same query """
+        self.create_fake_data(2)
+        counter = CachedCount(ttl=60)
+        collection = PaginatedCollection(User.query, counter=counter)
+        self.assertEquals(2, collection.total_items)
+
+        self.create_fake_data(1)
+        collection = PaginatedCollection(User.query, counter=counter)
+        self.assertEquals(2, collection.total_items)
+
+        query = User.query.filter(User.id > 0)
+        collection = PaginatedCollection(query, counter=counter)
+        self.assertEquals(3, collection.total_items)
+
+        counter.clear()
+        collection = PaginatedCollection(User.query, counter=counter)
+        self.assertEquals(3, collection.total_items)
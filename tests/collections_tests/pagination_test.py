@@ -126,3 +126,38 @@ class PaginationTest(BoilerTestCase):
         )['pagination']
         self.assertIsNone(pagination['next_slice'])
 
+
+    def test_paginate_with_cursors(self):
+        """ Generating cursor links in keyset mode """
+        pagination = paginate(
+            page=3,
+            total_pages=10,
+            total_items=100,
+            cursors=dict(next='abc', previous='xyz')
+        )['pagination']
+
+        self.assertEquals('abc', pagination['next_cursor'])
+        self.assertEquals('xyz', pagination['previous_cursor'])
+        self.assertEquals(4, pagination['next'])
+        self.assertEquals(2, pagination['previous'])
+        self.assertIsNone(pagination['last'])
+        self.assertIsNone(pagination['next_slice'])
+
+    def test_paginate_with_unknown_total(self):
+        """ Paginating with unknown or inexact total pages """
+        pagination = paginate(page=3, total_pages=None, total_items=None)
+        self.assertIsNone(pagination['total_pages'])
+        links = pagination['pagination']
+        self.assertIsNone(links['last'])
+        self.assertEquals(4, links['next'])
+        self.assertEquals(2, links['previous'])
+        self.assertIn(3, links['pages'])
+
+        pagination = paginate(
+            page=2,
+            total_pages=10,
+            total_items=100,
+            exact=False
+        )['pagination']
+        self.assertIsNone(pagination['last'])
+        self.assertEquals(3, pagination['next'])
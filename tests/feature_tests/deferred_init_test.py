@@ -0,0 +1,139 @@
+from threading import Thread, Event
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from boiler import bootstrap
+from boiler import exceptions as x
+from boiler.config import TestingConfig
+
+
+class DeferredConfig(TestingConfig):
+    """ Testing config with deferred init """
+    DEFERRED_INIT = True
+
+
+@attr('kernel', 'bootstrap', 'deferred_init')
+class DeferredInitTest(BoilerTestCase):
+    """ Deferred feature init tests """
+
+    def create_app(self):
+        """ Create an app with deferred init """
+        app = bootstrap.create_app(
+            'tests.boiler_test_app.app',
+            config=DeferredConfig(),
+            flask_params=dict(template_folder='../../templates')
+        )
+        bootstrap.add_orm(app)
+        bootstrap.add_mail(app)
+        bootstrap.add_routing(app)
+        return app
+
+    def pending(self, app):
+        """ Get names of features waiting for first use """
+        return list(app.extensions['boiler_deferred']['pending'])
+
+    def test_features_init_eagerly_by_default(self):
+        """ Features are set up right away unless deferred """
+        self.assertIn('csrf', self.app.extensions)
+        self.assertIn('sqlalchemy', self.app.extensions)
+        self.assertNotIn('boiler_deferred', self.app.extensions)
+
+    def test_features_wait_for_first_use(self):
+        """ Deferred features are not set up when app is created """
+        app = self.create_app()
+        self.assertNotIn('csrf', app.extensions)
+        self.assertNotIn('sqlalchemy', app.extensions)
+        expected = ['csrf', 'error_handlers', 'jinja', 'orm', 'mail']
+        self.assertEquals(expected + ['routing'], self.pending(app))
+
+    def test_context_features_init_on_app_context(self):
+        """ Context features are set up when app context is pushed """
+        app = self.create_app()
+        with app.app_context():
+            self.assertIn('sqlalchemy', app.extensions)
+            self.assertIn('mail', app.extensions)
+            self.assertIn('regex', app.url_map.converters)
+
+        self.assertNotIn('csrf', app.extensions)
+        self.assertEquals(['csrf', 'error_handlers'], self.pending(app))
+
+    def test_request_features_init_before_first_request(self):
+        """ Request features are set up before first request """
+        app = self.create_app()
+        response = app.test_client().get('/there-is-no-such-page/')
+        self.assertEquals(404, response.status_code)
+        self.assertIn('csrf', app.extensions)
+        self.assertIn(404, app.error_handler_spec[None])
+        self.assertEquals([], self.pending(app))
+
+    def test_force_eager_init(self):
+        """ Forcing deferred features to init right away """
+        app = self.create_app()
+        initialized = bootstrap.init_deferred(app)
+        self.assertEquals(6, len(initialized))
+        self.assertIn('csrf', app.extensions)
+        self.assertIn('sqlalchemy', app.extensions)
+        self.assertEquals([], bootstrap.init_deferred(app))
+
+    def test_threads_wait_for_init_in_progress(self):
+        """ Other threads wait until features are set up """
+        started, release = Event(), Event()
+        seen = []
+
+        def slow_feature(app):
+            started.set()
+            release.wait(5)
+            app.extensions['slow'] = True
+
+        def push_context():
+            with app.app_context():
+                seen.append(app.extensions.get('slow'))
+
+        app = self.create_app()
+        bootstrap.init_deferred(app, 'request')
+        bootstrap.defer(app, 'slow', slow_feature)
+        first = Thread(target=push_context)
+        second = Thread(target=push_context)
+        first.start()
+        started.wait(5)
+        second.start()
+        second.join(0.2)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEquals([True, True], seen)
+        self.assertEquals([], self.pending(app))
+
+    def test_failed_init_stays_pending(self):
+        """ Feature that failed to init is retried on next use """
+        app = self.create_app()
+        init = mock.Mock(side_effect=[RuntimeError, None])
+        bootstrap.defer(app, 'flaky', init)
+        with self.assertRaises(RuntimeError):
+            bootstrap.init_deferred(app, 'context')
+        self.assertIn('flaky', self.pending(app))
+        self.assertIn('flaky', bootstrap.init_deferred(app, 'context'))
+
+    def test_init_can_push_app_context(self):
+        """ Features are set up once when init pushes app context """
+        app = self.create_app()
+        calls = []
+
+        def pushes_context(app):
+            calls.append('a')
+            with app.app_context():
+                pass
+
+        bootstrap.defer(app, 'a', pushes_context)
+        bootstrap.defer(app, 'b', lambda app: calls.append('b'))
+        with app.app_context():
+            self.assertIn('sqlalchemy', app.extensions)
+
+        self.assertEquals(['a', 'b'], calls)
+        self.assertEquals(['csrf', 'error_handlers'], self.pending(app))
+
+    def test_raise_on_unknown_trigger(self):
+        """ Deferring to unknown trigger fails """
+        with self.assertRaises(x.BootstrapException):
+            bootstrap.defer(self.app, 'feature', lambda app: None, 'boot')
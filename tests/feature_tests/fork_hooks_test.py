@@ -0,0 +1,73 @@
+import os
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from flask import Flask
+from boiler import bootstrap
+from boiler.feature.orm import db, app_engines
+
+
+@attr('kernel', 'bootstrap', 'fork_hooks')
+class ForkHooksTest(BoilerTestCase):
+    """ Post-fork engine lifecycle tests """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+
+    def test_get_app_engines(self):
+        """ Getting all engines of the app """
+        self.assertEquals([db.get_engine(self.app)], app_engines(self.app))
+
+    def test_post_fork_disposes_engines_without_closing(self):
+        """ Inherited pools are replaced without closing connections """
+        engine = db.get_engine(self.app)
+        pool = engine.pool
+        with mock.patch.object(pool, 'dispose') as close:
+            report = bootstrap.post_fork(self.app)
+            close.assert_not_called()
+
+        self.assertIsNot(pool, engine.pool)
+        self.assertEquals(1, report['engines'])
+        self.assertEquals(os.getpid(), report['pid'])
+        self.assertIs(report, self.app.extensions['boiler_post_fork'])
+
+    def test_post_fork_warms_connections(self):
+        """ Warming connections after fork """
+        engine = db.get_engine(self.app)
+        with mock.patch.object(engine, 'connect') as connect:
+            report = bootstrap.post_fork(self.app, warm=3)
+        self.assertEquals(3, connect.call_count)
+        self.assertEquals(3, connect.return_value.close.call_count)
+        self.assertEquals(3, report['warmed'])
+
+    def test_post_fork_reports_warm_up_failures(self):
+        """ Failing to warm connections is logged, not raised """
+        engine = db.get_engine(self.app)
+        with mock.patch.object(engine, 'connect', side_effect=OSError):
+            with mock.patch.object(self.app.logger, 'warning') as warning:
+                report = bootstrap.post_fork(self.app, warm=2)
+        warning.assert_called_once()
+        self.assertEquals(0, report['warmed'])
+
+    def test_post_fork_without_orm(self):
+        """ Post fork does nothing without orm feature """
+        report = bootstrap.post_fork(Flask(__name__), warm=2)
+        self.assertEquals(0, report['engines'])
+
+    def test_add_fork_hooks_registers_at_fork(self):
+        """ Registering post fork hook outside uwsgi """
+        with mock.patch('os.register_at_fork') as register:
+            bootstrap.add_fork_hooks(self.app)
+        hook = register.call_args[1]['after_in_child']
+        with mock.patch('boiler.bootstrap.post_fork') as post_fork:
+            hook()
+        post_fork.assert_called_once_with(self.app)
+
+    def test_add_fork_hooks_uses_uwsgi_postfork(self):
+        """ Registering post fork hook under uwsgi """
+        uwsgi = mock.Mock()
+        with mock.patch.dict('sys.modules', uwsgidecorators=uwsgi):
+            bootstrap.add_fork_hooks(self.app)
+        uwsgi.postfork.assert_called_once()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from click.testing import CliRunner
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from boiler.feature.orm import get_pool_options, pool_stats
+from boiler.feature.pool_metrics import instrument_engine, read_pool_stats
+from boiler.cli.db import cli
+
+
+@attr('kernel', 'orm', 'pool_metrics')
+class PoolMetricsTest(BoilerTestCase):
+    """ Connection pool settings and metrics tests """
+
+    def engine(self):
+        """ Get an engine with a queue pool """
+        return create_engine(
+            'sqlite://',
+            poolclass=QueuePool,
+            pool_size=2,
+            max_overflow=1
+        )
+
+    def test_get_pool_options_from_config(self):
+        """ Pool options are read from config, unset ones skipped """
+        config = dict(DB_POOL_SIZE=5, DB_POOL_PRE_PING=True)
+        with mock.patch.dict(self.app.config, config):
+            options = get_pool_options(self.app)
+        self.assertEquals(dict(pool_size=5, pool_pre_ping=True), options)
+
+    def test_count_checkouts(self):
+        """ Counting pool checkouts and wait times """
+        engine = self.engine()
+        metrics = instrument_engine(engine)
+        with engine.connect(), engine.connect():
+            stats = metrics.stats()
+            self.assertEquals(2, stats['checked_out'])
+
+        stats = metrics.stats()
+        self.assertEquals(2, stats['checkouts'])
+        self.assertEquals(0, stats['checked_out'])
+        self.assertEquals(2, stats['size'])
+        self.assertEquals(2, sum(stats['wait_histogram'].values()))
+
+    def test_keep_counting_after_dispose(self):
+        """ Pool is instrumented again after engine is disposed """
+        engine = self.engine()
+        metrics = instrument_engine(engine)
+        engine.dispose()
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        self.assertEquals(1, metrics.stats()['checkouts'])
+
+    def test_histogram_buckets(self):
+        """ Wait times are put into histogram buckets """
+        metrics = instrument_engine(self.engine())
+        metrics.observe(0.0005)
+        metrics.observe(0.02)
+        metrics.observe(10)
+        histogram = metrics.stats()['wait_histogram']
+        self.assertEquals(1, histogram['<=1ms'])
+        self.assertEquals(1, histogram['<=50ms'])
+        self.assertEquals(1, histogram['>5000ms'])
+        self.assertEquals(10000, metrics.stats()['wait_max_ms'])
+
+    def test_write_and_read_snapshots(self):
+        """ Processes write stats snapshots for cli to read """
+        with tempfile.TemporaryDirectory() as path:
+            engine = self.engine()
+            instrument_engine(engine, stats_path=path)
+            with engine.connect():
+                pass
+
+            snapshots = read_pool_stats(path)
+            self.assertEquals(1, len(snapshots))
+            self.assertEquals(os.getpid(), snapshots[0]['pid'])
+            self.assertEquals([], read_pool_stats(path, max_age=-1))
+
+    def test_engines_write_separate_snapshots(self):
+        """ Every engine of a process writes its own snapshot """
+        with tempfile.TemporaryDirectory() as path:
+            engines = [
+                create_engine('sqlite:///' + os.path.join(path, name))
+                for name in ('first.db', 'second.db')
+            ]
+            for engine in engines:
+                instrument_engine(engine, stats_path=path)
+                with engine.connect():
+                    pass
+
+            urls = sorted(stats['url'] for stats in read_pool_stats(path))
+            expected = sorted(str(engine.url) for engine in engines)
+            self.assertEquals(expected, urls)
+
+    def test_app_engine_is_instrumented(self):
+        """ App engine collects pool metrics """
+        self.create_db()
+        stats = pool_stats(self.app)
+        self.assertIsNotNone(stats)
+        self.assertIn('wait_histogram', stats)
+
+    def test_cli_shows_pool_stats(self):
+        """ Showing pool stats from cli """
+        self.create_db()
+        with mock.patch('boiler.bootstrap.get_app', return_value=self.app):
+            result = CliRunner().invoke(cli, ['pool'])
+        self.assertEquals(0, result.exit_code)
+        self.assertIn('wait_histogram', result.output)
@@ -0,0 +1,153 @@
+import tempfile
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from click.testing import CliRunner
+from sqlalchemy import text, event
+from sqlalchemy.engine import Engine
+from boiler.feature.orm import db
+from boiler.feature import query_log
+from boiler.feature.query_log import query_log_feature, normalize_sql
+from boiler.feature.query_log import QueryStats, percentile, read_query_stats
+from boiler.cli.db import cli
+from tests.boiler_test_app.models import User
+
+
+@attr('kernel', 'orm', 'query_log')
+class QueryLogTest(BoilerTestCase):
+    """ Slow query log and statement stats tests """
+
+    def setUp(self):
+        super().setUp()
+        self.create_db()
+        query_log_feature(self.app)
+
+    def tearDown(self):
+        self.app.extensions.pop('boiler_query_log', None)
+        super().tearDown()
+
+    def stats(self):
+        return self.app.extensions['boiler_query_log']
+
+    def test_normalize_sql(self):
+        """ Statements differing only in values normalize the same """
+        first = "SELECT * FROM user WHERE id IN (1, 2, 3) AND email = 'a@b'"
+        second = "SELECT *  FROM user\nWHERE id IN (4) AND email = 'c'"
+        self.assertEquals(normalize_sql(first), normalize_sql(second))
+        self.assertEquals(
+            'SELECT * FROM t1 WHERE a = ? AND b = ?',
+            normalize_sql('SELECT * FROM t1 WHERE a = %(a)s AND b = :b')
+        )
+
+    def test_percentile(self):
+        """ Getting nearest-rank percentiles """
+        values = list(range(1, 101))
+        self.assertEquals(50, percentile(values, 50))
+        self.assertEquals(95, percentile(values, 95))
+        self.assertEquals(7, percentile([7], 95))
+        self.assertIsNone(percentile([], 50))
+
+    def test_bounded_samples(self):
+        """ Only recent samples are kept, but all are counted """
+        stats = QueryStats(samples=3)
+        for millis in (100, 1, 2, 3):
+            stats.record('SELECT 1', millis)
+
+        entry = stats.stats()[0]
+        self.assertEquals(4, entry['count'])
+        self.assertEquals(100, entry['max_ms'])
+        self.assertEquals(3, entry['p95_ms'])
+
+    def test_collect_statement_stats(self):
+        """ Statements executed by app engines are timed """
+        for i in range(3):
+            db.session.execute(text('SELECT {}'.format(i))).fetchall()
+
+        stats = [s for s in self.stats().stats() if s['sql'] == 'SELECT ?']
+        self.assertEquals(1, len(stats))
+        self.assertEquals(3, stats[0]['count'])
+        self.assertIsNotNone(stats[0]['p95_ms'])
+
+    def test_log_slow_queries_once(self):
+        """ Slow statements are logged once per dedupe interval """
+        config = dict(QUERY_LOG_SLOW_MS=0, QUERY_LOG_EXPLAIN=True)
+        with mock.patch.dict(self.app.config, config):
+            with mock.patch.object(query_log.logger, 'info') as log:
+                sql = 'SELECT * FROM user WHERE id = {}'
+                db.session.execute(text(sql.format(1))).fetchall()
+                db.session.execute(text(sql.format(2))).fetchall()
+
+        messages = [c[0][0] for c in log.call_args_list if 'user' in c[0][0]]
+        self.assertEquals(1, len(messages))
+        self.assertIn('SELECT * FROM user WHERE id = ?', messages[0])
+        self.assertIn('PRIMARY KEY', messages[0].upper())
+
+    def test_failed_explain_keeps_transaction(self):
+        """ Failing EXPLAIN is rolled back to a savepoint """
+        statements = []
+        listen = lambda conn, cursor, sql, *args: statements.append(sql)
+        event.listen(Engine, 'before_cursor_execute', listen)
+        config = dict(QUERY_LOG_SLOW_MS=0, QUERY_LOG_EXPLAIN=True)
+        prefixes = dict(sqlite='NOT AN EXPLAIN ')
+        try:
+            with mock.patch.dict(self.app.config, config):
+                with mock.patch.dict(query_log.explain_prefixes, prefixes):
+                    with mock.patch.object(query_log.logger, 'info') as log:
+                        db.session.add(User(email='me@example.com'))
+                        db.session.flush()
+                        sql = 'SELECT * FROM user WHERE id = 1'
+                        db.session.execute(text(sql)).fetchall()
+                        db.session.commit()
+        finally:
+            event.remove(Engine, 'before_cursor_execute', listen)
+
+        message = [c[0][0] for c in log.call_args_list if 'id =' in c[0][0]]
+        self.assertIn('EXPLAIN failed', message[0])
+        self.assertTrue(any(s.startswith('SAVEPOINT') for s in statements))
+        self.assertEquals(1, User.query.count())
+
+    def test_streamed_statements_are_not_explained(self):
+        """ Statements with pending streamed results are not explained """
+        config = dict(QUERY_LOG_SLOW_MS=0, QUERY_LOG_EXPLAIN=True)
+        with mock.patch.dict(self.app.config, config):
+            with mock.patch.object(query_log, 'explain') as explain:
+                statement = text('SELECT * FROM user WHERE id = 1')
+                statement = statement.execution_options(stream_results=True)
+                db.session.execute(statement).fetchall()
+                explain.assert_not_called()
+
+    def test_write_and_read_snapshots(self):
+        """ Processes write stats snapshots for cli to read """
+        with tempfile.TemporaryDirectory() as path:
+            stats = QueryStats(stats_path=path)
+            stats.record('SELECT 1', 10)
+            stats.write()
+            stats.record('SELECT 2', 20)
+            other = QueryStats()
+            other.record('SELECT 3', 30)
+            snapshot = other.snapshot()
+            snapshot['pid'] = 0
+
+            merged = query_log.aggregate([stats.snapshot(), snapshot])
+            self.assertEquals(3, merged[0]['count'])
+            self.assertEquals(30, merged[0]['p95_ms'])
+            self.assertEquals(1, read_query_stats(path)[0]['count'])
+            self.assertEquals([], read_query_stats(path, max_age=-1))
+
+    def test_cli_shows_query_stats(self):
+        """ Showing query stats from cli """
+        with tempfile.TemporaryDirectory() as path:
+            stats = QueryStats(stats_path=path)
+            stats.record('SELECT * FROM user WHERE id = 5', 12)
+            stats.write()
+            config = dict(QUERY_LOG_STATS_PATH=path)
+            with mock.patch.dict(self.app.config, config):
+                with mock.patch(
+                    'boiler.bootstrap.get_app',
+                    return_value=self.app
+                ):
+                    result = CliRunner().invoke(cli, ['queries'])
+
+        self.assertEquals(0, result.exit_code)
+        self.assertIn('SELECT * FROM user WHERE id = ?', result.output)
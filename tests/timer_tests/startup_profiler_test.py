@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import builtins
+import tempfile
+from unittest import mock
+from nose.plugins.attrib import attr
+from tests.base_testcase import BoilerTestCase
+
+from click.testing import CliRunner
+from boiler.cli.boiler import cli
+from boiler.timer import startup_profiler
+from boiler.timer.startup_profiler import StartupProfiler
+
+
+@attr('kernel', 'timer', 'startup_profiler')
+class StartupProfilerTest(BoilerTestCase):
+    """ Startup profiler tests """
+
+    def report(self, wall, phases):
+        """ Make a report with given phase timings """
+        entries = []
+        for path, ms in phases.items():
+            entries.append(dict(
+                path=path,
+                depth=path.count(' > '),
+                wall_ms=ms,
+                import_ms=ms,
+                modules=1
+            ))
+        return dict(
+            pid=1,
+            python='3',
+            time=0,
+            wall_ms=wall,
+            import_ms=wall,
+            modules=1,
+            phases=entries
+        )
+
+    def test_phases_are_noop_when_disabled(self):
+        """ Nothing is recorded unless profiler is enabled """
+        profiler = StartupProfiler()
+        with profiler.phase('create_app'):
+            pass
+        self.assertEquals([], profiler.report()['phases'])
+
+    def test_record_nested_phases_and_imports(self):
+        """ Recording nested phases with their import time """
+        sys.modules.pop('colorsys', None)
+        profiler = StartupProfiler()
+        profiler.enable()
+        try:
+            with profiler.phase('app'):
+                with profiler.phase('add_feature'):
+                    __import__('colorsys')
+        finally:
+            profiler.disable()
+
+        outer, inner = profiler.report()['phases']
+        self.assertEquals('app > add_feature', inner['path'])
+        self.assertEquals(1, inner['depth'])
+        self.assertEquals(1, inner['modules'])
+        self.assertTrue(inner['import_ms'] > 0)
+        self.assertEquals(inner['import_ms'], outer['import_ms'])
+        self.assertTrue(outer['wall_ms'] >= inner['wall_ms'])
+
+    def test_disable_restores_import(self):
+        """ Builtin import is restored when profiler is disabled """
+        original = builtins.__import__
+        profiler = StartupProfiler()
+        profiler.enable()
+        self.assertIsNot(original, builtins.__import__)
+        profiler.disable()
+        self.assertIs(original, builtins.__import__)
+
+    def test_profiled_decorator(self):
+        """ Decorated bootstrap functions are recorded as phases """
+        @startup_profiler.profiled
+        def add_feature(app):
+            return app
+
+        startup_profiler.profiler.enable()
+        try:
+            self.assertEquals('app', add_feature('app'))
+        finally:
+            startup_profiler.profiler.disable()
+
+        phases = startup_profiler.profiler.report()['phases']
+        self.assertEquals(['add_feature'], [p['path'] for p in phases])
+
+    def test_aggregate_and_compare_runs(self):
+        """ Runs are aggregated by median and compared to previous one """
+        reports = [
+            self.report(10, {'app': 10, 'app > add_orm': 8}),
+            self.report(30, {'app': 30, 'app > add_orm': 2}),
+            self.report(20, {'app': 20, 'app > add_orm': 5}),
+        ]
+        report = startup_profiler.aggregate(reports)
+        self.assertEquals(20, report['wall_ms'])
+        self.assertEquals(3, report['runs'])
+        self.assertEquals(5, report['phases'][1]['wall_ms'])
+
+        previous = self.report(15, {'app': 15})
+        report = startup_profiler.compare(report, previous)
+        self.assertEquals(5, report['delta_ms'])
+        self.assertEquals(5, report['phases'][0]['delta_ms'])
+        self.assertIsNone(report['phases'][1]['delta_ms'])
+
+    def test_save_and_read_last_report(self):
+        """ Saving reports to compare with later """
+        with tempfile.TemporaryDirectory() as path:
+            self.assertIsNone(startup_profiler.last_report(path))
+            report = self.report(10, {'app': 10})
+            startup_profiler.save_report(report, path)
+            self.assertEquals(report, startup_profiler.last_report(path))
+
+    def test_cli_shows_startup_profile(self):
+        """ Showing startup profile from cli """
+        output = 'noise\n' + json.dumps(self.report(12, {'create_app': 3}))
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with mock.patch(
+                'subprocess.check_output',
+                return_value=output.encode()
+            ):
+                args = ['startup-profile', '--app', 'app', '--runs', '2']
+                result = runner.invoke(cli, args)
+            saved = os.listdir(os.path.join('var', 'data', 'startup-profiles'))
+
+        self.assertEquals(0, result.exit_code)
+        self.assertIn('create_app', result.output)
+        self.assertIn('total (2 runs)', result.output)
+        self.assertEquals(1, len(saved))